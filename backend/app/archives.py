@@ -0,0 +1,124 @@
+"""Expansion of uploaded zip / tar(.gz) archives into scan files.
+
+Members are read one at a time (tar archives strictly as a stream), so only
+the member being handed out is in memory. Limits guard against archive
+bombs: number of members, bytes per member and total expanded bytes are
+checked against both the declared sizes and what is actually read.
+"""
+from __future__ import annotations
+
+import posixpath
+import tarfile
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
+
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz")
+
+
+class ArchiveRejected(Exception):
+    """The archive is malformed or exceeds an expansion limit."""
+
+
+@dataclass(frozen=True)
+class ArchiveLimits:
+    max_entries: int
+    max_entry_bytes: int
+    max_total_bytes: int
+
+
+def is_archive(filename: Optional[str]) -> bool:
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def member_name(raw: str) -> Optional[str]:
+    """Normalized relative path of a member, or None for entries that are never code."""
+    name = posixpath.normpath(raw.replace("\\", "/")).lstrip("/")
+    parts = name.split("/")
+    if name in ("", ".") or ".." in parts:
+        return None
+    # macOS resource forks and dotfiles (.git/, .DS_Store, ...)
+    if parts[0] == "__MACOSX" or any(p.startswith(".") for p in parts):
+        return None
+    return name
+
+
+class _Budget:
+    def __init__(self, limits: ArchiveLimits) -> None:
+        self.limits = limits
+        self.entries = 0
+        self.total = 0
+
+    def entry(self) -> None:
+        self.entries += 1
+        if self.entries > self.limits.max_entries:
+            raise ArchiveRejected(f"Archive has more than {self.limits.max_entries} entries")
+
+    def check_declared(self, name: str, size: int) -> None:
+        if size > self.limits.max_entry_bytes:
+            raise ArchiveRejected(f"{name} expands beyond {self.limits.max_entry_bytes} bytes")
+        if self.total + size > self.limits.max_total_bytes:
+            raise ArchiveRejected(f"Archive expands beyond {self.limits.max_total_bytes} bytes")
+
+    def read(self, name: str, stream: BinaryIO) -> bytes:
+        # Declared sizes can lie: never read more than the limits allow.
+        data = stream.read(self.limits.max_entry_bytes + 1)
+        self.check_declared(name, len(data))
+        self.total += len(data)
+        return data
+
+
+def _iter_zip(fileobj: BinaryIO, accept: Callable[[str], bool], budget: _Budget) -> Iterator[Tuple[str, bytes]]:
+    try:
+        zf = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        raise ArchiveRejected(f"Invalid zip archive: {e}") from e
+    with zf:
+        for info in zf.infolist():
+            budget.entry()
+            if info.is_dir():
+                continue
+            name = member_name(info.filename)
+            if name is None or not accept(name):
+                continue
+            budget.check_declared(name, info.file_size)
+            with zf.open(info) as stream:
+                yield name, budget.read(name, stream)
+
+
+def _iter_tar(fileobj: BinaryIO, accept: Callable[[str], bool], budget: _Budget) -> Iterator[Tuple[str, bytes]]:
+    try:
+        # "r|*": sequential stream, transparently gunzipped; no seeking.
+        tf = tarfile.open(fileobj=fileobj, mode="r|*")
+    except tarfile.TarError as e:
+        raise ArchiveRejected(f"Invalid tar archive: {e}") from e
+    with tf:
+        try:
+            for info in tf:
+                budget.entry()
+                if not info.isfile():
+                    continue
+                name = member_name(info.name)
+                if name is None or not accept(name):
+                    continue
+                budget.check_declared(name, info.size)
+                stream = tf.extractfile(info)
+                if stream is not None:
+                    yield name, budget.read(name, stream)
+        except (tarfile.TarError, EOFError, OSError) as e:
+            raise ArchiveRejected(f"Invalid tar archive: {e}") from e
+
+
+def iter_archive_members(
+    fileobj: BinaryIO,
+    filename: str,
+    *,
+    accept: Callable[[str], bool],
+    limits: ArchiveLimits,
+) -> Iterator[Tuple[str, bytes]]:
+    """Yield (relative path, content) for each regular member that ``accept`` keeps."""
+    budget = _Budget(limits)
+    if filename.lower().endswith(".zip"):
+        return _iter_zip(fileobj, accept, budget)
+    return _iter_tar(fileobj, accept, budget)
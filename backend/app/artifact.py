@@ -0,0 +1,112 @@
+"""Compact binary normalized-file artifact (one per checksum, cached in Redis).
+
+Layout (little endian), every section readable zero-copy with numpy.frombuffer:
+
+    header        32 bytes  magic "PCNA", version, flags, k, window,
+                            n_tokens, n_unique, n_fingerprints
+    unique_hashes uint64[n_unique]       sorted stable hashes of distinct tokens
+    fp_hashes     uint64[n_fingerprints] winnowed k-gram hashes (optional)
+    token_ids     uint16[n_tokens]       index of each token in unique_hashes
+                                         (uint32 with FLAG_WIDE_IDS)
+
+The 8-byte sections come first so every array stays naturally aligned. Only
+what a reader uses is stored: line offsets and fingerprint positions were
+dropped in version 2. ARTIFACT_VERSION is part of the Redis key: bumping it
+makes old entries plain cache misses instead of decode errors.
+"""
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+
+import numpy as np
+
+from .fingerprinting import kgram_hashes, token_ids, winnow_hashes
+from .similarity import tokenize
+
+
+ARTIFACT_VERSION = 2
+FLAG_FINGERPRINTS = 0x1
+FLAG_WIDE_IDS = 0x2
+
+_MAGIC = b"PCNA"
+_HEADER = struct.Struct("<4sHHHHIIIII")
+
+
+@dataclass(frozen=True)
+class NormalizedArtifact:
+    version: int
+    k: int
+    window: int
+    unique_hashes: np.ndarray
+    fp_hashes: np.ndarray
+    token_ids: np.ndarray
+
+    @property
+    def has_fingerprints(self) -> bool:
+        return self.k > 0
+
+    @property
+    def token_hashes(self) -> np.ndarray:
+        return self.unique_hashes[self.token_ids]
+
+
+def build_artifact(normalized: str, *, k: int, window: int, with_fingerprints: bool = True) -> bytes:
+    hashes = token_ids(tokenize(normalized))
+    unique_hashes, inverse = np.unique(hashes, return_inverse=True)
+
+    flags = 0
+    id_dtype = "<u2"
+    if len(unique_hashes) > 0xFFFF:
+        flags |= FLAG_WIDE_IDS
+        id_dtype = "<u4"
+    fp_hashes = np.zeros(0, dtype=np.uint64)
+    if with_fingerprints:
+        flags |= FLAG_FINGERPRINTS
+        _, fp_hashes = winnow_hashes(kgram_hashes(hashes, k), window)
+    else:
+        k = window = 0
+
+    header = _HEADER.pack(
+        _MAGIC,
+        ARTIFACT_VERSION,
+        flags,
+        k,
+        window,
+        len(hashes),
+        len(unique_hashes),
+        len(fp_hashes),
+        0,
+        0,
+    )
+    return b"".join(
+        (
+            header,
+            unique_hashes.astype("<u8", copy=False).tobytes(),
+            fp_hashes.astype("<u8", copy=False).tobytes(),
+            inverse.astype(id_dtype).tobytes(),
+        )
+    )
+
+
+def read_artifact(data: bytes) -> NormalizedArtifact:
+    """Decode an artifact; arrays are read-only views into ``data``."""
+    magic, version, flags, k, window, n_tokens, n_unique, n_fp, _, _ = _HEADER.unpack_from(data)
+    if magic != _MAGIC:
+        raise ValueError("Not a normalized artifact")
+    if version != ARTIFACT_VERSION:
+        raise ValueError(f"Unsupported artifact version {version}")
+
+    off = _HEADER.size
+    sections = {}
+    for name, dtype, count in (
+        ("unique_hashes", "<u8", n_unique),
+        ("fp_hashes", "<u8", n_fp),
+        ("token_ids", "<u4" if flags & FLAG_WIDE_IDS else "<u2", n_tokens),
+    ):
+        sections[name] = np.frombuffer(data, dtype=dtype, count=count, offset=off)
+        off += sections[name].nbytes
+
+    if not flags & FLAG_FINGERPRINTS:
+        k = window = 0
+    return NormalizedArtifact(version=version, k=k, window=window, **sections)
@@ -18,6 +18,26 @@ class Settings(BaseSettings):
     minio_secret_key: str = "minio123"
     minio_bucket: str = "plagcode-uploads"
     minio_secure: bool = False
+    # Thread pool + connection pool size for MinIO calls, and how many
+    # objects one scan uploads/downloads concurrently.
+    minio_max_workers: int = 16
+    minio_transfer_concurrency: int = 8
+    # Uploads stream to MinIO in parts of this size (multipart above it).
+    minio_part_size: int = 16 * 1024 * 1024
+    # Blob GC (app.workers.blob_gc): unreferenced content-addressed blobs
+    # older than grace_s are deleted every interval_s.
+    blob_gc_interval_s: int = 3600
+    blob_gc_grace_s: int = 24 * 3600
+    blob_gc_batch_size: int = 1000
+
+    # Upload limits of POST /api/scan: per file and per request body.
+    # nginx/default.conf caps /api/scan bodies at the same 512 MB.
+    upload_max_file_bytes: int = 20 * 1024 * 1024
+    upload_max_request_bytes: int = 512 * 1024 * 1024
+    # zip / tar.gz uploads: members beyond these limits reject the archive
+    # (each member is also capped at upload_max_file_bytes).
+    archive_max_entries: int = 20000
+    archive_max_total_bytes: int = 1024 * 1024 * 1024
 
     # Behavior
     plagcode_log_level: str = "INFO"
@@ -25,8 +45,107 @@ class Settings(BaseSettings):
     # Worker
     worker_group_id: str = "plagcode-worker"
 
+    # Candidate retrieval (MinHash + LSH banding).
+    # Scans with fewer files than lsh_min_files keep exhaustive all-pairs
+    # generation unless their options ask for "candidate_strategy": "lsh".
+    # A pair with token-set Jaccard s becomes a candidate with probability
+    # 1 - (1 - s**rows)**bands; pairs that are not candidates are never
+    # scored. bands * rows must not exceed minhash_num_perm. The threshold
+    # ~(1/bands)**(1/rows) should sit below the UI's "medium" score (40):
+    #   bands x rows   threshold   recall at s = 0.2 / 0.3 / 0.4 / 0.5
+    #   42 x 3         0.29        29% / 68% / 94% / 99.6%   (default)
+    #   32 x 4         0.42         5% / 23% / 56% / 87%
+    #   64 x 2         0.13        93% / 99.8% / 100% / 100%  (prunes least)
+    minhash_num_perm: int = 128
+    lsh_bands: int = 42
+    lsh_rows: int = 3
+    lsh_min_files: int = 500
+
+    # Candidate emission: pairs are sent as code.candidates.block events of
+    # up to candidate_block_size pairs (1 = one code.candidates per pair) and
+    # about candidate_block_max_bytes of JSON (below the producer's 1 MB
+    # max_request_size), with at most kafka_max_in_flight unacknowledged
+    # sends at a time.
+    candidate_block_size: int = 256
+    candidate_block_max_bytes: int = 512 * 1024
+    kafka_max_in_flight: int = 64
+    # Kafka wire format. kafka_compression_type compresses producer batches
+    # (none, gzip, lz4, zstd or snappy; consumers decompress transparently).
+    # kafka_envelope_format "msgpack" sends compact binary envelopes (schema
+    # 2.0) instead of JSON (1.0); consumers decode both, so upgrade them first.
+    kafka_compression_type: str = "zstd"
+    kafka_envelope_format: str = "json"
+    # Group files with identical normalized text: each class is scored once
+    # against every other class, members of one class score 100 directly.
+    dedup_equivalent_files: bool = True
+
+    # Scoring: "scan" scores a whole scan in one sparse matrix product,
+    # "pair" scores one code.candidates event at a time, "auto" uses scan
+    # scoring up to scan_scoring_max_files files.
+    scoring_mode: str = "auto"
+    scan_scoring_max_files: int = 500
+    # Thresholded join: with min_score > 0 (or the "min_score" scan option)
+    # only pairs scoring >= min_score percent are computed and stored, found
+    # with prefix/length filtering; the rest are reported as counts.
+    min_score: float = 0.0
+
+    # Scoring worker micro-batches: up to max_records candidates per
+    # consumer.getmany(), waiting at most max_wait_ms for a batch to fill.
+    scoring_batch_max_records: int = 500
+    scoring_batch_max_wait_ms: int = 200
+
+    # Live results: scorers keep each scan's top-k pairs and a score
+    # histogram in Redis, served by the results endpoint while the scan runs
+    # and after it is DONE.
+    live_results_top_k: int = 5000
+    live_results_ttl_s: int = 7 * 24 * 3600
+
+    # Results API: max page size of /pairs and batch size of the NDJSON stream.
+    results_page_max: int = 1000
+    results_stream_batch: int = 2000
+    # Rows fetched per server-side cursor round trip (and per Parquet row group) in exports.
+    export_batch_size: int = 5000
+
+    # Response cache for finished scans (results JSON, file contents up to
+    # max_bytes), served with strong ETags; max_age_s goes into Cache-Control
+    # so a fronting proxy can cache too.
+    response_cache_ttl_s: int = 7 * 24 * 3600
+    response_cache_max_bytes: int = 2 * 1024 * 1024
+    response_cache_max_age_s: int = 3600
+
+    # Scan logs: per-file lines are buffered and bulk-inserted every
+    # flush_lines lines / flush_interval_s seconds; a finished scan keeps its
+    # newest max_lines lines.
+    scan_log_flush_lines: int = 100
+    scan_log_flush_interval_s: float = 2.0
+    scan_log_max_lines: int = 1000
+
+    # SSE progress stream: comment line sent when a scan is quiet this long.
+    scan_events_keepalive_s: float = 15.0
+
+    # In-process LRU of decoded feature sets in the scoring worker.
+    feature_cache_max_mb: int = 256
+    feature_cache_stats_interval_s: float = 60.0
+
+    # Scoring algorithm: "jaccard" (token sets) or "winnowing" (k-gram
+    # fingerprints). Scans may override it with the "algorithm" option.
+    scoring_algorithm: str = "jaccard"
+    winnow_k: int = 25
+    winnow_window: int = 4
+
+    # Cross-scan matching against previously indexed submissions.
+    # Every scan's fingerprints are indexed; historical_top_k > 0 (or the
+    # "historical_top_k" scan option) also pairs each file with its top-k
+    # historical matches. Posting lists are capped, and hashes present in
+    # more than fingerprint_stop_df checksums are ignored as boilerplate.
+    historical_top_k: int = 0
+    historical_min_shared: int = 3
+    fingerprint_max_postings: int = 256
+    fingerprint_stop_df: int = 128
+
     # Topics
     topic_submitted: str = "code.submitted"
+    topic_normalize: str = "code.normalize"
     topic_normalized: str = "code.normalized"
     topic_candidates: str = "code.candidates"
     topic_scored: str = "code.scored"
@@ -72,16 +72,190 @@ DDL_STATEMENTS = [
     """,
     "CREATE INDEX IF NOT EXISTS idx_alerts_scan_id ON alerts(scan_id);",
     "CREATE INDEX IF NOT EXISTS idx_alerts_created_at ON alerts(created_at);",
+    # 002: cross-scan inverted fingerprint index
+    """
+    CREATE TABLE IF NOT EXISTS fingerprint_df (
+      hash BIGINT PRIMARY KEY,
+      df INTEGER NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fingerprint_postings (
+      hash BIGINT NOT NULL,
+      checksum TEXT NOT NULL,
+      PRIMARY KEY (hash, checksum)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fingerprint_indexed (
+      checksum TEXT PRIMARY KEY,
+      indexed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+    """,
+    # 003: atomic per-scan progress counters
+    "ALTER TABLE scans ADD COLUMN IF NOT EXISTS files_total INTEGER NOT NULL DEFAULT 0;",
+    "ALTER TABLE scans ADD COLUMN IF NOT EXISTS files_normalized INTEGER NOT NULL DEFAULT 0;",
+    "ALTER TABLE scans ADD COLUMN IF NOT EXISTS pairs_total INTEGER;",
+    "ALTER TABLE scans ADD COLUMN IF NOT EXISTS pairs_scored INTEGER NOT NULL DEFAULT 0;",
+    # 004: normalized-text checksum (equivalence classes of identical files)
+    "ALTER TABLE files ADD COLUMN IF NOT EXISTS norm_checksum TEXT;",
+    # 005: notification functions/triggers are in VERSIONED_DDL_STATEMENTS
+    # 006: append-only scan_logs (replaces params_json.logs)
+    """
+    CREATE TABLE IF NOT EXISTS scan_logs (
+      id BIGSERIAL PRIMARY KEY,
+      scan_id UUID NOT NULL REFERENCES scans(scan_id) ON DELETE CASCADE,
+      created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      message TEXT NOT NULL
+    );
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_scan_logs_scan_id_id ON scan_logs(scan_id, id);",
+    # 007: per-scan summary rows for the history list
+    """
+    CREATE TABLE IF NOT EXISTS scan_summaries (
+      scan_id UUID PRIMARY KEY REFERENCES scans(scan_id) ON DELETE CASCADE,
+      created_at TIMESTAMPTZ NOT NULL,
+      file_count INTEGER NOT NULL DEFAULT 0,
+      pair_count INTEGER,
+      top_similarity DOUBLE PRECISION NOT NULL DEFAULT 0,
+      high_risk_count INTEGER NOT NULL DEFAULT 0,
+      runtime_ms INTEGER NOT NULL DEFAULT 0,
+      finalized_at TIMESTAMPTZ
+    );
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_scan_summaries_created_at ON scan_summaries(created_at DESC)
+    INCLUDE (scan_id, file_count, pair_count, top_similarity, high_risk_count, runtime_ms);
+    """,
+    # 008: keyset pagination of results by (score, id)
+    "CREATE INDEX IF NOT EXISTS idx_results_scan_score_id ON results(scan_id, score DESC, id DESC);",
+    # 009: content-addressed uploads (blob GC looks files up by object_key)
+    "CREATE INDEX IF NOT EXISTS idx_files_object_key ON files(object_key);",
 ]
 
+# Status changes of a scan (LISTEN scan_events); log lines notify from scan_logs.
+_NOTIFY_SCAN_EVENT_FN = """
+CREATE OR REPLACE FUNCTION notify_scan_event() RETURNS trigger AS $$
+BEGIN
+  IF NEW.status IS DISTINCT FROM OLD.status OR NEW.progress IS DISTINCT FROM OLD.progress THEN
+    PERFORM pg_notify('scan_events', json_build_object(
+      'scan_id', NEW.scan_id, 'type', 'status', 'status', NEW.status, 'progress', NEW.progress
+    )::text);
+  END IF;
+  RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+"""
+
+# Function / trigger DDL, run only when its version is first recorded (before
+# that version's backfills). Each function has one, current, definition:
+# 006 re-runs it so databases created at 005 drop the params_json.logs body.
+VERSIONED_DDL_STATEMENTS = {
+    "005_scan_events": [
+        _NOTIFY_SCAN_EVENT_FN,
+        """
+        CREATE OR REPLACE TRIGGER trg_scans_notify
+        AFTER UPDATE ON scans
+        FOR EACH ROW EXECUTE FUNCTION notify_scan_event();
+        """,
+    ],
+    "006_scan_logs": [
+        _NOTIFY_SCAN_EVENT_FN,
+        """
+        CREATE OR REPLACE FUNCTION notify_scan_log() RETURNS trigger AS $$
+        BEGIN
+          PERFORM pg_notify('scan_events', json_build_object(
+            'scan_id', NEW.scan_id, 'type', 'log', 'id', NEW.id,
+            'time', to_char(NEW.created_at, 'HH24:MI:SS'),
+            'message', left(NEW.message, 2000)
+          )::text);
+          RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql;
+        """,
+        """
+        CREATE OR REPLACE TRIGGER trg_scan_logs_notify
+        AFTER INSERT ON scan_logs
+        FOR EACH ROW EXECUTE FUNCTION notify_scan_log();
+        """,
+    ],
+}
+
+MIGRATION_VERSIONS = [
+    "001_init",
+    "002_fingerprint_index",
+    "003_scan_counters",
+    "004_norm_checksum",
+    "005_scan_events",
+    "006_scan_logs",
+    "007_scan_summaries",
+    "008_results_keyset",
+    "009_content_addressed_blobs",
+]
+
+# One-off data migrations, run only when their version is first recorded.
+BACKFILL_STATEMENTS = {
+    "003_scan_counters": [
+        """
+        UPDATE scans s
+        SET
+          files_total = (SELECT COUNT(*) FROM files f WHERE f.scan_id = s.scan_id),
+          files_normalized = (
+            SELECT COUNT(*) FROM files f WHERE f.scan_id = s.scan_id AND f.normalized_at IS NOT NULL
+          ),
+          pairs_total = NULLIF(s.params_json->>'total_pairs','')::int,
+          pairs_scored = (SELECT COUNT(*) FROM results r WHERE r.scan_id = s.scan_id)
+        """,
+    ],
+    "006_scan_logs": [
+        # Old entries only kept HH24:MI:SS: date them on the scan's creation day.
+        """
+        INSERT INTO scan_logs(scan_id, created_at, message)
+        SELECT s.scan_id, s.created_at::date + (l.entry->>'time')::time, l.entry->>'message'
+        FROM scans s
+        CROSS JOIN LATERAL jsonb_array_elements(
+          CASE WHEN jsonb_typeof(s.params_json->'logs') = 'array' THEN s.params_json->'logs' ELSE '[]'::jsonb END
+        ) WITH ORDINALITY AS l(entry, n)
+        ORDER BY s.scan_id, l.n
+        """,
+        "UPDATE scans SET params_json = params_json - 'logs' WHERE params_json->'logs' IS NOT NULL",
+    ],
+    "007_scan_summaries": [
+        """
+        INSERT INTO scan_summaries(
+          scan_id, created_at, file_count, pair_count, top_similarity, high_risk_count, runtime_ms, finalized_at
+        )
+        SELECT
+          s.scan_id,
+          s.created_at,
+          s.files_total,
+          s.pairs_total,
+          COALESCE(r.top_similarity, 0),
+          COALESCE(r.high_risk_count, 0),
+          COALESCE(NULLIF(s.params_json->>'runtime_ms','')::int, 0),
+          CASE WHEN s.status IN ('DONE', 'FAILED') THEN NOW() END
+        FROM scans s
+        LEFT JOIN LATERAL (
+          SELECT MAX(score) AS top_similarity, COUNT(*) FILTER (WHERE score > 70) AS high_risk_count
+          FROM results WHERE scan_id = s.scan_id
+        ) r ON TRUE
+        ON CONFLICT (scan_id) DO NOTHING
+        """,
+    ],
+}
+
 
 async def ensure_schema(engine: AsyncEngine) -> None:
     async with engine.begin() as conn:
         for stmt in DDL_STATEMENTS:
             await conn.execute(text(stmt))
-        await conn.execute(
-            text(
-                "INSERT INTO schema_migrations(version) VALUES (:v) ON CONFLICT (version) DO NOTHING"
-            ),
-            {"v": "001_init"},
-        )
+        for version in MIGRATION_VERSIONS:
+            res = await conn.execute(
+                text(
+                    "INSERT INTO schema_migrations(version) VALUES (:v) ON CONFLICT (version) DO NOTHING RETURNING version"
+                ),
+                {"v": version},
+            )
+            if res.first() is not None:
+                for stmt in VERSIONED_DDL_STATEMENTS.get(version, []) + BACKFILL_STATEMENTS.get(version, []):
+                    await conn.execute(text(stmt))
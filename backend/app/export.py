@@ -0,0 +1,139 @@
+"""Streaming encoders for result exports (CSV, NDJSON, Parquet).
+
+Each encoder consumes an async iterator of row batches (as produced by
+``repository.iter_results_export``) and yields encoded chunks, so an export
+holds one batch in memory regardless of how many pairs the scan has.
+pyarrow is only needed for Parquet and is imported on first use, so API
+startup does not pay for it.
+"""
+from __future__ import annotations
+
+import csv
+import io
+import json
+from typing import Any, AsyncIterator, Dict, List, Sequence
+
+
+EXPORT_COLUMNS = [
+    "file_a_id",
+    "file_a",
+    "language_a",
+    "size_a",
+    "checksum_a",
+    "file_b_id",
+    "file_b",
+    "language_b",
+    "size_b",
+    "checksum_b",
+    "score",
+    "label",
+]
+
+EXPORT_MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+
+def export_columns(with_details: bool) -> List[str]:
+    return EXPORT_COLUMNS + ["details"] if with_details else list(EXPORT_COLUMNS)
+
+
+def _label(score: float) -> str:
+    return "high" if score > 70 else "medium" if score > 40 else "low"
+
+
+def export_row(row: Dict[str, Any], with_details: bool) -> Dict[str, Any]:
+    out = {c: row[c] for c in EXPORT_COLUMNS if c != "label"}
+    out["score"] = float(row["score"])
+    out["label"] = _label(out["score"])
+    if with_details:
+        out["details"] = json.dumps(row.get("details_json") or {}, separators=(",", ":"))
+    return out
+
+
+async def csv_chunks(batches: AsyncIterator[Sequence[Dict[str, Any]]], *, with_details: bool) -> AsyncIterator[bytes]:
+    columns = export_columns(with_details)
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=columns, extrasaction="ignore")
+    writer.writeheader()
+    async for batch in batches:
+        writer.writerows(export_row(r, with_details) for r in batch)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    tail = buf.getvalue()
+    if tail:
+        yield tail.encode("utf-8")
+
+
+async def ndjson_chunks(batches: AsyncIterator[Sequence[Dict[str, Any]]], *, with_details: bool) -> AsyncIterator[bytes]:
+    async for batch in batches:
+        yield "".join(json.dumps(export_row(r, with_details)) + "\n" for r in batch).encode("utf-8")
+
+
+class _ChunkSink:
+    """Write-only file object that hands pyarrow's output back in pieces."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        b = bytes(data)
+        self._parts.append(b)
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def take(self) -> bytes:
+        out = b"".join(self._parts)
+        self._parts = []
+        return out
+
+
+async def parquet_chunks(batches: AsyncIterator[Sequence[Dict[str, Any]]], *, with_details: bool) -> AsyncIterator[bytes]:
+    """One Parquet row group per batch; the footer comes last."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    fields = [
+        ("file_a_id", pa.int64()),
+        ("file_a", pa.string()),
+        ("language_a", pa.string()),
+        ("size_a", pa.int64()),
+        ("checksum_a", pa.string()),
+        ("file_b_id", pa.int64()),
+        ("file_b", pa.string()),
+        ("language_b", pa.string()),
+        ("size_b", pa.int64()),
+        ("checksum_b", pa.string()),
+        ("score", pa.float64()),
+        ("label", pa.string()),
+    ]
+    if with_details:
+        fields.append(("details", pa.string()))
+    schema = pa.schema(fields)
+
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    try:
+        async for batch in batches:
+            rows = [export_row(r, with_details) for r in batch]
+            writer.write_table(pa.Table.from_pylist(rows, schema=schema))
+            chunk = sink.take()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    yield sink.take()
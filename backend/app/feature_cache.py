@@ -0,0 +1,64 @@
+"""Bounded in-process LRU cache of decoded per-checksum features.
+
+The scoring worker sees the same checksum once per pair it appears in; this
+keeps the decoded frozenset around instead of re-fetching and re-parsing it
+from Redis every time.
+"""
+from __future__ import annotations
+
+import sys
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Optional, Tuple
+
+
+def estimate_size(features: FrozenSet[Any]) -> int:
+    # Container + elements; good enough for a memory budget.
+    return sys.getsizeof(features) + sum(sys.getsizeof(x) for x in features)
+
+
+class FeatureCache:
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, Tuple[FrozenSet[Any], int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[FrozenSet[Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: Hashable, features: FrozenSet[Any]) -> None:
+        size = estimate_size(features)
+        if size > self.max_bytes:
+            return
+
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.current_bytes -= old[1]
+        self._entries[key] = (features, size)
+        self.current_bytes += size
+
+        while self.current_bytes > self.max_bytes:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.current_bytes -= evicted_size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
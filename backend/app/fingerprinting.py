@@ -0,0 +1,78 @@
+"""Winnowing fingerprints (k-gram level detection).
+
+Port of ``legacy_archive/plagcode/fingerprinting.winnow`` without the per
+shingle SHA-1 / string joins / O(n*w) window scans:
+
+- tokens are mapped to stable 64-bit integer IDs (``similarity.token_hash``)
+- k-gram hashes are a Karp-Rabin polynomial mod 2**64, computed for all
+  positions at once from a prefix sum (B is odd, hence invertible mod 2**64)
+- winnowing keeps a monotonic deque, so each hash is pushed/popped once
+
+Selection semantics match the legacy implementation: rightmost minimum per
+window, recorded whenever the selected position changes.
+"""
+from __future__ import annotations
+
+from collections import deque
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .similarity import token_hash
+
+
+_BASE = 0x100000001B3  # odd -> invertible mod 2**64
+_BASE_INV = pow(_BASE, -1, 1 << 64)
+
+
+def token_ids(tokens: Sequence[str]) -> np.ndarray:
+    return np.fromiter((token_hash(t) for t in tokens), dtype=np.uint64, count=len(tokens))
+
+
+def _powers(base: int, n: int) -> np.ndarray:
+    steps = np.full(n, base, dtype=np.uint64)
+    steps[0] = 1
+    return np.cumprod(steps, dtype=np.uint64)  # wraps mod 2**64
+
+
+def kgram_hashes(ids: np.ndarray, k: int) -> np.ndarray:
+    """Karp-Rabin hash of every k-gram: sum(ids[i+j] * B**(k-1-j)) mod 2**64."""
+    n = len(ids)
+    if k <= 0 or n < k:
+        return np.zeros(0, dtype=np.uint64)
+    # S[m] = sum_{t<=m} ids[t] * B**-t, so a window is B**(i+k-1) * (S[i+k-1] - S[i-1]).
+    prefix = np.cumsum(ids * _powers(_BASE_INV, n), dtype=np.uint64)
+    prefix = np.concatenate((np.zeros(1, dtype=np.uint64), prefix))
+    window_sums = prefix[k:] - prefix[: n - k + 1]
+    return window_sums * _powers(_BASE, n)[k - 1 :]
+
+
+def winnow_hashes(hashes: np.ndarray, window: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Return (positions uint32, hashes uint64) selected by robust winnowing."""
+    w = max(1, window)
+    values = hashes.tolist()
+    if len(values) < w:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint64)
+
+    positions = []
+    dq: deque = deque()  # indices with strictly increasing hash values
+    last = -1
+    for i, h in enumerate(values):
+        # <= so that ties resolve to the rightmost minimum.
+        while dq and values[dq[-1]] >= h:
+            dq.pop()
+        dq.append(i)
+        if dq[0] <= i - w:
+            dq.popleft()
+        if i >= w - 1 and dq[0] != last:
+            last = dq[0]
+            positions.append(last)
+
+    pos = np.asarray(positions, dtype=np.uint32)
+    return pos, hashes[pos]
+
+
+def as_bigint(hashes: np.ndarray) -> List[int]:
+    """uint64 hashes reinterpreted as signed int64 (Postgres BIGINT)."""
+    return hashes.astype(np.uint64, copy=False).view(np.int64).tolist()
+
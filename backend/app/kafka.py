@@ -2,15 +2,18 @@ from __future__ import annotations
 
 import asyncio
 import hashlib
+import importlib.util
 import logging
 import os
+import re
 import time
 import uuid
 from dataclasses import dataclass
-from typing import Any, AsyncIterator, Dict, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterable, Optional, Sequence, Tuple, Union
 
 import orjson
 from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+from aiokafka import codec as kafka_codec
 
 
 logger = logging.getLogger("plagcode.kafka")
@@ -52,8 +55,118 @@ def dumps(obj: Any) -> bytes:
     return orjson.dumps(obj)
 
 
+# Envelope wire formats, keyed by the schema_version they are stamped with.
+# "1.0" is orjson; "2.0" is COMPACT_MAGIC followed by a msgpack array of the
+# header fields in ENVELOPE_FIELDS order (the payload last), with sha256 hex
+# digests and UUIDs packed as raw bytes. 0xc1 is never valid msgpack nor the
+# start of a JSON object, so consumers tell the formats apart by first byte.
+ENVELOPE_SCHEMA_VERSIONS = {"json": "1.0", "msgpack": "2.0"}
+ENVELOPE_FIELDS = (
+    "schema_version",
+    "event_type",
+    "scan_id",
+    "correlation_id",
+    "idempotency_key",
+    "produced_at_ms",
+    "payload",
+)
+COMPACT_MAGIC = b"\xc1"
+_EXT_SHA256 = 1
+_EXT_UUID = 2
+_SHA256_HEX = re.compile(r"[0-9a-f]{64}")
+_UUID_STR = re.compile(r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}")
+
+
+def msgpack_available() -> bool:
+    return importlib.util.find_spec("msgpack") is not None
+
+
+def _pack_value(obj: Any, ext_type):
+    # Only lowercase canonical forms are packed, so unpacking restores the exact string.
+    if isinstance(obj, str):
+        if len(obj) == 64 and _SHA256_HEX.fullmatch(obj):
+            return ext_type(_EXT_SHA256, bytes.fromhex(obj))
+        if len(obj) == 36 and _UUID_STR.fullmatch(obj):
+            return ext_type(_EXT_UUID, uuid.UUID(obj).bytes)
+        return obj
+    if isinstance(obj, dict):
+        return {k: _pack_value(v, ext_type) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_pack_value(v, ext_type) for v in obj]
+    return obj
+
+
+def _unpack_ext(code: int, data: bytes) -> Any:
+    import msgpack
+
+    if code == _EXT_SHA256:
+        return data.hex()
+    if code == _EXT_UUID:
+        return str(uuid.UUID(bytes=data))
+    return msgpack.ExtType(code, data)
+
+
+def dumps_compact(envelope: Dict[str, Any]) -> bytes:
+    """Schema 2.0 encoding of an envelope (see ENVELOPE_SCHEMA_VERSIONS)."""
+    import msgpack
+
+    header = {**envelope, "schema_version": ENVELOPE_SCHEMA_VERSIONS["msgpack"]}
+    row = [_pack_value(header.get(f), msgpack.ExtType) for f in ENVELOPE_FIELDS]
+    return COMPACT_MAGIC + msgpack.packb(row, use_bin_type=True)
+
+
 def loads(data: bytes) -> Any:
-    return orjson.loads(data)
+    """Decode an envelope in either wire format."""
+    if data[:1] != COMPACT_MAGIC:
+        return orjson.loads(data)
+    import msgpack
+
+    row = msgpack.unpackb(data[1:], raw=False, ext_hook=_unpack_ext, strict_map_key=False)
+    return dict(zip(ENVELOPE_FIELDS, row))
+
+
+def envelope_serializer(envelope_format: str) -> Callable[[Any], bytes]:
+    """value_serializer for the configured format; falls back to JSON without msgpack."""
+    if envelope_format == "json":
+        return dumps
+    if envelope_format != "msgpack":
+        raise ValueError(f"Unknown Kafka envelope format: {envelope_format!r}")
+    if not msgpack_available():
+        logger.warning("msgpack is not installed; sending JSON envelopes instead")
+        return dumps
+
+    def _serialize(value: Any) -> bytes:
+        # Only envelopes have a compact layout; anything else stays JSON.
+        if isinstance(value, dict) and "event_type" in value and "payload" in value:
+            return dumps_compact(value)
+        return dumps(value)
+
+    return _serialize
+
+
+_COMPRESSION_CODECS = {
+    "gzip": kafka_codec.has_gzip,
+    "snappy": kafka_codec.has_snappy,
+    "lz4": kafka_codec.has_lz4,
+    "zstd": kafka_codec.has_zstd,
+}
+
+
+def producer_compression(compression_type: Optional[str]) -> Optional[str]:
+    """Validated compression_type for AIOKafkaProducer (None = uncompressed).
+
+    Every codec's library is pinned in requirements.txt (cramjam for snappy
+    and zstd, lz4 for lz4); a missing one is a broken image, so it fails the
+    producer instead of silently sending uncompressed batches.
+    """
+    name = (compression_type or "").strip().lower()
+    if name in ("", "none"):
+        return None
+    if name not in _COMPRESSION_CODECS:
+        raise ValueError(f"Unknown Kafka compression type: {compression_type!r}")
+    if not _COMPRESSION_CODECS[name]():
+        raise RuntimeError(f"Kafka compression type {name!r} requires a codec library that is not installed")
+    return name
 
 
 @dataclass
@@ -100,13 +213,20 @@ async def _retry_async(
     return await op()
 
 
-async def make_producer(bootstrap_servers: str, client_id: str) -> AIOKafkaProducer:
+async def make_producer(
+    bootstrap_servers: str,
+    client_id: str,
+    *,
+    compression_type: Optional[str] = None,
+    envelope_format: str = "json",
+) -> AIOKafkaProducer:
     base_kwargs = dict(
         bootstrap_servers=bootstrap_servers,
         client_id=client_id,
         acks="all",
         linger_ms=5,
-        value_serializer=dumps,
+        compression_type=producer_compression(compression_type),
+        value_serializer=envelope_serializer(envelope_format),
         key_serializer=lambda k: k.encode("utf-8") if isinstance(k, str) else k,
     )
 
@@ -132,16 +252,41 @@ async def make_producer(bootstrap_servers: str, client_id: str) -> AIOKafkaProdu
     )
 
 
+async def send_many(
+    producer: AIOKafkaProducer,
+    topic: str,
+    messages: Iterable[Tuple[str, Dict[str, Any]]],
+    *,
+    max_in_flight: int = 64,
+) -> int:
+    """Send (key, value) messages pipelined, waiting for all acks before returning.
+
+    At most ``max_in_flight`` sends are unacknowledged at any time. Per-partition
+    order is kept by the producer, so this is a drop-in for a send_and_wait loop.
+    """
+    in_flight = []
+    sent = 0
+    for key, value in messages:
+        in_flight.append(await producer.send(topic, key=key, value=value))
+        sent += 1
+        if len(in_flight) >= max_in_flight:
+            await asyncio.gather(*in_flight)
+            in_flight.clear()
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    return sent
+
+
 async def make_consumer(
     *,
-    topic: str,
+    topic: Union[str, Sequence[str]],
     bootstrap_servers: str,
     group_id: str,
     client_id: str,
 ) -> AIOKafkaConsumer:
     async def _start() -> AIOKafkaConsumer:
         consumer = AIOKafkaConsumer(
-            topic,
+            *([topic] if isinstance(topic, str) else topic),
             bootstrap_servers=bootstrap_servers,
             group_id=group_id,
             client_id=f"{client_id}-{group_id}",
@@ -0,0 +1,106 @@
+"""Per-scan top-k pairs and score histogram, maintained in Redis as results arrive.
+
+- ``scan:{id}:topk``  ZSET  member "a_id:b_id", score = similarity; trimmed to k
+- ``scan:{id}:hist``  HASH  bucket index -> number of scored pairs
+- ``scan:{id}:files`` HASH  file id -> filename, so reads never need Postgres
+
+Writers publish only pairs that were new in Postgres, after their transaction
+committed, so redelivered events don't count twice in the histogram.
+"""
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from .redis_cache import scan_files_key, scan_histogram_key, scan_topk_key
+
+
+logger = logging.getLogger("plagcode.live_results")
+
+HISTOGRAM_BUCKETS = 10
+
+
+def score_bucket(score: float) -> int:
+    # Equal-width buckets over [0, 100]; 100 falls in the last one.
+    return min(HISTOGRAM_BUCKETS - 1, max(0, int(score * HISTOGRAM_BUCKETS // 100)))
+
+
+def histogram_json(counts: Sequence[int]) -> List[Dict[str, Any]]:
+    width = 100 // HISTOGRAM_BUCKETS
+    return [{"min": i * width, "max": (i + 1) * width, "count": int(c)} for i, c in enumerate(counts)]
+
+
+async def publish_file_names(redis_client, scan_id: str, names: Mapping[int, str], *, ttl_s: int) -> None:
+    if not names:
+        return
+    key = scan_files_key(scan_id)
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.hset(key, mapping={str(k): v for k, v in names.items()})
+        pipe.expire(key, ttl_s)
+        await pipe.execute()
+
+
+async def publish_results(
+    redis_client,
+    scan_id: str,
+    rows: Sequence[Tuple[int, int, float]],
+    *,
+    top_k: int,
+    ttl_s: int,
+) -> None:
+    """Merge newly scored (a, b, score) pairs into the scan's top-k and histogram."""
+    if not rows:
+        return
+    topk = scan_topk_key(scan_id)
+    hist = scan_histogram_key(scan_id)
+
+    # Only rows that can still enter the top-k are sent; the ZSET drops the rest anyway.
+    best = sorted(rows, key=lambda r: r[2], reverse=True)[:top_k]
+    buckets = Counter(score_bucket(r[2]) for r in rows)
+
+    async with redis_client.pipeline(transaction=True) as pipe:
+        pipe.zadd(topk, {f"{a}:{b}": score for a, b, score in best})
+        pipe.zremrangebyrank(topk, 0, -(top_k + 1))
+        for bucket, n in buckets.items():
+            pipe.hincrby(hist, str(bucket), n)
+        pipe.expire(topk, ttl_s)
+        pipe.expire(hist, ttl_s)
+        await pipe.execute()
+
+
+async def publish_new_results(
+    redis_client,
+    new_rows: Mapping[str, Sequence[Tuple[int, int, float]]],
+    *,
+    top_k: int,
+    ttl_s: int,
+) -> None:
+    """publish_results per scan; Redis trouble is logged, never fails the caller."""
+    for scan_id, rows in new_rows.items():
+        try:
+            await publish_results(redis_client, scan_id, rows, top_k=top_k, ttl_s=ttl_s)
+        except Exception:
+            logger.exception("Failed to publish live results for scan %s", scan_id)
+
+
+async def read_live_results(redis_client, scan_id: str, *, limit: int) -> Optional[Dict[str, Any]]:
+    """Top pairs (with filenames) and histogram, or None when nothing was published."""
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.zrevrange(scan_topk_key(scan_id), 0, limit - 1, withscores=True)
+        pipe.hgetall(scan_histogram_key(scan_id))
+        pipe.hgetall(scan_files_key(scan_id))
+        top, hist, files = await pipe.execute()
+    if not hist or not files:
+        return None
+
+    names = {k.decode("utf-8"): v.decode("utf-8") for k, v in files.items()}
+    counts = [0] * HISTOGRAM_BUCKETS
+    for bucket, n in hist.items():
+        counts[int(bucket)] = int(n)
+
+    pairs = []
+    for member, score in top:
+        a_id, b_id = member.decode("ascii").split(":")
+        pairs.append({"file_a": names.get(a_id, a_id), "file_b": names.get(b_id, b_id), "score": float(score)})
+    return {"pairs": pairs, "histogram": counts, "n_pairs": sum(counts)}
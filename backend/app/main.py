@@ -1,38 +1,60 @@
 from __future__ import annotations
 
-import hashlib
+import asyncio
+import base64
+import json
 import logging
+import hashlib
 import mimetypes
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from sqlalchemy import text
 
+from .archives import ArchiveLimits, ArchiveRejected, is_archive, iter_archive_members
 from .config import get_settings
 from .db import ensure_schema, make_engine, make_sessionmaker
+from .export import EXPORT_MEDIA_TYPES, csv_chunks, ndjson_chunks, parquet_chunks
 from .kafka import make_envelope, make_producer, new_correlation_id, stable_sha256_hex
+from .live_results import histogram_json, read_live_results
 from .logging_utils import configure_logging
-from .minio_client import MinioConfig, ensure_bucket, get_bytes, make_client, put_bytes
+from .minio_client import AsyncMinio, MinioConfig, blob_object_key, ensure_bucket, make_client
+from .redis_cache import make_redis
+from .response_cache import build_cached, etag_matches, get_cached, held_etag, not_modified, put_cached, to_response
+from .scan_events import ScanEventHub
+from .uploads import FileTooLarge, UploadSizeLimitMiddleware, hash_file
 from .repository import (
+    LABEL_SCORE_RANGES,
     append_scan_log,
-    create_scan,
+    create_scan_with_files,
     get_file_by_scan_and_name,
     get_scan,
     insert_alert,
-    insert_file,
+    iter_results_export,
     list_scans_summary,
     list_alerts,
-    list_files_for_scan,
+    list_scan_logs,
+    list_results_page,
     list_results_pairs_for_scan,
+    results_stats,
+    score_histogram,
 )
 
 logger = logging.getLogger("plagcode.api")
 
 app = FastAPI(title="PlagCode API", version="2.0")
 
+# Added first so CORS wraps it: browsers need CORS headers to read a 413.
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_bytes=get_settings().upload_max_request_bytes,
+    paths=["/api/scan"],
+)
+
 # Enable CORS (keep existing dev origins)
 app.add_middleware(
     CORSMiddleware,
@@ -76,7 +98,12 @@ async def _startup() -> None:
 
     SessionLocal = make_sessionmaker(engine)
 
-    producer = await make_producer(s.kafka_bootstrap_servers, s.kafka_client_id)
+    producer = await make_producer(
+        s.kafka_bootstrap_servers,
+        s.kafka_client_id,
+        compression_type=s.kafka_compression_type,
+        envelope_format=s.kafka_envelope_format,
+    )
 
     minio_cfg = MinioConfig(
         endpoint=s.minio_endpoint,
@@ -84,6 +111,7 @@ async def _startup() -> None:
         secret_key=s.minio_secret_key,
         secure=s.minio_secure,
         bucket=s.minio_bucket,
+        max_pool_connections=s.minio_max_workers,
     )
     minio_client = make_client(minio_cfg)
     # If MinIO isn't ready, the dedicated minio-init will handle it; but we try anyway.
@@ -97,10 +125,18 @@ async def _startup() -> None:
     app.state.SessionLocal = SessionLocal
     app.state.producer = producer
     app.state.minio = minio_client
+    app.state.storage = AsyncMinio(minio_client, max_workers=s.minio_max_workers)
+    app.state.redis = make_redis(s.redis_url)
+    app.state.scan_events = ScanEventHub(s.postgres_dsn)
+    app.state.scan_events.start()
 
 
 @app.on_event("shutdown")
 async def _shutdown() -> None:
+    scan_events = getattr(app.state, "scan_events", None)
+    if scan_events is not None:
+        await scan_events.stop()
+
     producer = getattr(app.state, "producer", None)
     if producer is not None:
         await producer.stop()
@@ -109,94 +145,196 @@ async def _shutdown() -> None:
     if engine is not None:
         await engine.dispose()
 
+    storage = getattr(app.state, "storage", None)
+    if storage is not None:
+        storage.close()
+
+    redis_client = getattr(app.state, "redis", None)
+    if redis_client is not None:
+        await redis_client.aclose()
+
 
 @app.post("/api/scan")
-async def start_scan(files: List[UploadFile] = File(...), options: str = None) -> Dict[str, Any]:
+async def start_scan(files: List[UploadFile] = File(...), options: Optional[str] = Form(None)) -> Dict[str, Any]:
     """Upload endpoint (stateless orchestrator).
 
     - stores objects in MinIO
     - creates scan/files records in Postgres
     - emits code.submitted to Kafka
     """
-    if len(files) < 2:
-        raise HTTPException(status_code=400, detail="Upload at least 2 files")
+    s = app.state.settings
+    archives = [f for f in files if is_archive(f.filename)]
+    if len(files) < 2 and not archives:
+        raise HTTPException(status_code=400, detail="Upload at least 2 files (or one zip/tar.gz archive)")
+    max_file = s.upload_max_file_bytes
+    too_big = [f.filename for f in files if not is_archive(f.filename) and f.size is not None and f.size > max_file]
+    if too_big:
+        raise HTTPException(status_code=413, detail=f"Files exceed {max_file} bytes: {', '.join(too_big[:10])}")
 
     scan_id = str(uuid.uuid4())
     correlation_id = new_correlation_id()
-    s = app.state.settings
 
     params: Dict[str, Any] = {
         "options": options,
-        "logs": [],
         "correlation_id": correlation_id,
         "created_at_iso": datetime.utcnow().isoformat() + "Z",
     }
 
-    stored_files: List[Dict[str, Any]] = []
-
-    async with app.state.SessionLocal() as session:
-        try:
-            await create_scan(session, scan_id=scan_id, status="PENDING", params=params)
-            await append_scan_log(session, scan_id=scan_id, message="Scan created (PENDING)")
-
-            # Save uploaded files into MinIO + DB
-            for f in files:
-                raw = await f.read()
-                size = len(raw)
-                checksum = hashlib.sha256(raw).hexdigest()
-
-                object_key = f"{scan_id}/{uuid.uuid4()}__{f.filename}"
-                content_type = f.content_type or mimetypes.guess_type(f.filename)[0] or "text/plain"
-
-                put_bytes(
-                    client=app.state.minio,
+    # Save uploaded files into MinIO (concurrently, bounded), then record them
+    # in one short transaction.
+    sem = asyncio.Semaphore(s.minio_transfer_concurrency)
+
+    # Content-addressed: one blob per checksum, shared across files and scans.
+    # Identical contents within this request are checked and uploaded once. A
+    # reused blob is touched (its last_modified refreshed) so the blob GC's
+    # grace period protects it until the files rows below commit.
+    blob_tasks: Dict[str, asyncio.Task] = {}
+    blob_stats = {"uploaded": 0, "reused": 0}
+
+    async def _ensure_blob(object_key: str, put) -> None:
+        if await app.state.storage.touch(bucket=s.minio_bucket, object_key=object_key):
+            blob_stats["reused"] += 1
+            return
+        await put(object_key)
+        blob_stats["uploaded"] += 1
+
+    async def _blob(checksum: str, put) -> str:
+        object_key = blob_object_key(checksum)
+        task = blob_tasks.get(checksum)
+        if task is None:
+            task = blob_tasks[checksum] = asyncio.ensure_future(_ensure_blob(object_key, put))
+        await task
+        return object_key
+
+    async def _store(f: UploadFile) -> Dict[str, Any]:
+        async with sem:
+            content_type = f.content_type or mimetypes.guess_type(f.filename)[0] or "text/plain"
+            # The part is spooled by the form parser: hash it there first (the
+            # checksum names the blob), then stream it up only if the blob is new.
+            # A new blob is read twice from the spool (hash, then PUT); a known
+            # one is never sent, which is what pays for that second read.
+            await f.seek(0)
+            checksum, size = await asyncio.to_thread(hash_file, f.file, max_bytes=s.upload_max_file_bytes)
+
+            async def _put(object_key: str) -> None:
+                await f.seek(0)
+                await app.state.storage.put_stream(
                     bucket=s.minio_bucket,
                     object_key=object_key,
-                    data=raw,
+                    stream=f.file,
+                    length=size,
                     content_type=content_type,
+                    part_size=s.minio_part_size,
                 )
 
-                language = _language_from_filename(f.filename)
+            return {
+                "filename": f.filename,
+                "object_key": await _blob(checksum, _put),
+                "checksum": checksum,
+                "language": _language_from_filename(f.filename),
+                "size": size,
+            }
 
-                file_id = await insert_file(
-                    session,
-                    scan_id=scan_id,
-                    filename=f.filename,
+    async def _store_member(name: str, data: bytes) -> Dict[str, Any]:
+        # The caller acquired `sem` before extracting `data`; release it once uploaded.
+        try:
+            async def _put(object_key: str) -> None:
+                await app.state.storage.put_bytes(
+                    bucket=s.minio_bucket,
                     object_key=object_key,
-                    checksum=checksum,
-                    language=language,
-                    size=size,
+                    data=data,
+                    content_type=mimetypes.guess_type(name)[0] or "text/plain",
                 )
 
-                stored_files.append(
-                    {
-                        "file_id": file_id,
-                        "filename": f.filename,
-                        "object_key": object_key,
-                        "checksum": checksum,
-                        "language": language,
-                        "size": size,
-                    }
-                )
+            checksum = hashlib.sha256(data).hexdigest()
+            return {
+                "filename": name,
+                "object_key": await _blob(checksum, _put),
+                "checksum": checksum,
+                "language": _language_from_filename(name),
+                "size": len(data),
+            }
+        finally:
+            sem.release()
+
+    async def _expand(f: UploadFile) -> List[Dict[str, Any]]:
+        members = iter_archive_members(
+            f.file,
+            f.filename,
+            accept=lambda name: _language_from_filename(name) is not None,
+            limits=ArchiveLimits(
+                max_entries=s.archive_max_entries,
+                max_entry_bytes=s.upload_max_file_bytes,
+                max_total_bytes=s.archive_max_total_bytes,
+            ),
+        )
+        # Members are extracted one at a time off the event loop; at most
+        # minio_transfer_concurrency of them are held while uploading.
+        tasks: List[asyncio.Task] = []
+        try:
+            while True:
+                await sem.acquire()
+                try:
+                    member = await asyncio.to_thread(next, members, None)
+                except BaseException:
+                    sem.release()
+                    raise
+                if member is None:
+                    sem.release()
+                    break
+                tasks.append(asyncio.create_task(_store_member(*member)))
+        except BaseException:
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        return list(await asyncio.gather(*tasks))
+
+    try:
+        uploaded: List[Dict[str, Any]] = []
+        for group in await asyncio.gather(
+            *(_expand(f) for f in archives),
+            *(_store(f) for f in files if not is_archive(f.filename)),
+        ):
+            uploaded.extend(group if isinstance(group, list) else [group])
+        if len(uploaded) < 2:
+            raise HTTPException(status_code=400, detail="Upload at least 2 source files")
 
-            await append_scan_log(session, scan_id=scan_id, message=f"Uploaded {len(stored_files)} file(s) to MinIO")
+        async with app.state.SessionLocal() as session:
+            file_ids = await create_scan_with_files(
+                session,
+                scan_id=scan_id,
+                status="PENDING",
+                params=params,
+                files=uploaded,
+                log_messages=[
+                    "Scan created (PENDING)",
+                    f"Uploaded {len(uploaded)} file(s) to MinIO "
+                    f"({blob_stats['uploaded']} new, {blob_stats['reused']} already stored)",
+                ],
+            )
             await session.commit()
-        except Exception as e:
-            await session.rollback()
-            # Best-effort alert
-            try:
+        stored_files = [{"file_id": file_id, **item} for file_id, item in zip(file_ids, uploaded)]
+    except Exception as e:
+        # Best-effort alert
+        try:
+            async with app.state.SessionLocal() as session:
                 await insert_alert(
                     session,
                     scan_id=scan_id,
                     service="api",
                     error_code="UPLOAD_FAILED",
-                    message=str(e),
+                    message=str(getattr(e, "detail", e)),
                     payload={"scan_id": scan_id},
                 )
                 await session.commit()
-            except Exception:
-                pass
-            raise
+        except Exception:
+            pass
+        if isinstance(e, FileTooLarge):
+            raise HTTPException(status_code=413, detail=str(e))
+        if isinstance(e, ArchiveRejected):
+            raise HTTPException(status_code=400, detail=str(e))
+        raise
 
     # Produce code.submitted
     payload = {
@@ -243,68 +381,329 @@ def _status_complete(status: str) -> bool:
 
 
 @app.get("/api/scan/{scan_id}/status")
-async def get_scan_status(scan_id: str) -> Dict[str, Any]:
+async def get_scan_status(scan_id: str, after: Optional[int] = None, limit: int = 500) -> Dict[str, Any]:
+    """Status plus log lines; pass the returned ``cursor`` as ``after`` to get only newer lines."""
+    limit = max(1, min(limit, 5000))
     async with app.state.SessionLocal() as session:
         scan = await get_scan(session, scan_id)
         if not scan:
             raise HTTPException(status_code=404, detail="Scan not found")
 
-        params = scan.get("params_json") or {}
-        logs = params.get("logs") or []
+        logs = await list_scan_logs(session, scan_id=scan_id, after_id=after, limit=limit)
 
         return {
             "status": scan["status"],
             "progress": scan["progress"],
             "logs": logs,
+            "cursor": logs[-1]["id"] if logs else after,
             "complete": _status_complete(scan["status"]),
         }
 
 
+def _sse(event: str, data: Dict[str, Any], event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def _status_event(status: str, progress: int) -> str:
+    return _sse("status", {"status": status, "progress": progress, "complete": _status_complete(status)})
+
+
+@app.get("/api/scan/{scan_id}/events")
+async def stream_scan_events(scan_id: str, request: Request) -> StreamingResponse:
+    """Server-Sent Events: status/progress changes and new log lines of a scan.
+
+    Log events carry their scan_logs id as event id; a reconnecting client
+    sends it back as Last-Event-ID (or ?last_event_id=) and only gets newer
+    lines. The stream ends once the scan is DONE or FAILED.
+    """
+    raw_last_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id") or "0"
+    try:
+        last_id = max(0, int(raw_last_id))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    hub: ScanEventHub = app.state.scan_events
+    # Subscribe before the snapshot so nothing committed in between is missed.
+    queue = hub.subscribe(scan_id)
+    try:
+        async with app.state.SessionLocal() as session:
+            scan = await get_scan(session, scan_id)
+            logs = await list_scan_logs(session, scan_id=scan_id, after_id=last_id or None) if scan else []
+    except Exception:
+        hub.unsubscribe(scan_id, queue)
+        raise
+    if not scan:
+        hub.unsubscribe(scan_id, queue)
+        raise HTTPException(status_code=404, detail="Scan not found")
+
+    keepalive_s = app.state.settings.scan_events_keepalive_s
+
+    async def _events():
+        try:
+            yield "retry: 2000\n\n"
+            yield _status_event(scan["status"], scan["progress"])
+            # Ids are allocated before commit, so a line can be notified after one
+            # with a higher id: dedupe against the snapshot rather than by order.
+            snapshot_ids = {entry["id"] for entry in logs}
+            for entry in logs:
+                yield _sse("log", {"time": entry["time"], "message": entry["message"]}, entry["id"])
+
+            complete = _status_complete(scan["status"])
+            while True:
+                try:
+                    # Once complete, only drain what the final transaction notified.
+                    event = await asyncio.wait_for(queue.get(), timeout=0.5 if complete else keepalive_s)
+                except asyncio.TimeoutError:
+                    if complete or await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+
+                kind = event.get("type")
+                if kind == "log":
+                    event_id = int(event["id"])
+                    if event_id in snapshot_ids or event_id <= last_id:
+                        continue
+                    yield _sse("log", {"time": event.get("time"), "message": event.get("message")}, event_id)
+                elif kind == "status":
+                    complete = complete or _status_complete(event["status"])
+                    yield _status_event(event["status"], event["progress"])
+                elif kind == "reconnect":
+                    return
+        finally:
+            hub.unsubscribe(scan_id, queue)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _label_for(score: float) -> str:
+    return "high" if score > 70 else "medium" if score > 40 else "low"
+
+
+def _pair_json(p: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "file_a": p["file_a"],
+        "file_b": p["file_b"],
+        "similarity": round(float(p["score"]), 1),
+        "label": _label_for(float(p["score"])),
+        "overlap_spans": (p.get("details_json") or {}).get("overlap_spans", []),
+    }
+
+
+async def _live_results(scan: Dict[str, Any], limit: int) -> Optional[Dict[str, Any]]:
+    """Top-k pairs from Redis; None when missing or (for a DONE scan) behind Postgres."""
+    try:
+        live = await read_live_results(app.state.redis, str(scan["scan_id"]), limit=limit)
+    except Exception:
+        logger.warning("Live results unavailable for scan %s", scan["scan_id"], exc_info=True)
+        return None
+    if live is None or scan["status"] != "DONE":
+        return live
+
+    # Every stored result row must have reached the histogram, else use Postgres.
+    params = scan.get("params_json") or {}
+    expected = int(scan.get("pairs_scored") or 0) - int((params.get("threshold_join") or {}).get("pairs_below", 0))
+    return live if live["n_pairs"] >= expected else None
+
+
+def _immutable_cache_control() -> str:
+    return f"public, max-age={app.state.settings.response_cache_max_age_s}"
+
+
 @app.get("/api/scan/{scan_id}/results")
-async def get_scan_results(scan_id: str) -> Dict[str, Any]:
+async def get_scan_results(scan_id: str, request: Request) -> Any:
+    """Top-k pairs and meta; once DONE the serialized payload is cached with an ETag."""
+    s = app.state.settings
+    cached = await get_cached(app.state.redis, scan_id, "results")
+    if cached is not None:
+        return to_response(request, cached, cache_control=_immutable_cache_control())
+
     async with app.state.SessionLocal() as session:
         scan = await get_scan(session, scan_id)
         if not scan:
             raise HTTPException(status_code=404, detail="Scan not found")
 
-        if scan["status"] != "DONE":
+        params = scan.get("params_json") or {}
+        done = scan["status"] == "DONE"
+        live = await _live_results(scan, s.live_results_top_k)
+
+        if live is not None:
+            histogram = live["histogram"]
+            pairs = live["pairs"]
+        elif done:
+            pairs = await list_results_pairs_for_scan(session, scan_id=scan_id, limit=s.live_results_top_k)
+            histogram = await score_histogram(session, scan_id=scan_id)
+        else:
             return {"status": "processing"}
 
-        files = await list_files_for_scan(session, scan_id=scan_id)
-        pairs = await list_results_pairs_for_scan(session, scan_id=scan_id)
+        meta = {
+            "n_files": int(scan.get("files_total") or 0),
+            "n_pairs": sum(histogram),
+            # runtime_ms is kept for UI; we store approximate in params_json if available
+            "runtime_ms": int(params.get("runtime_ms", 0) or 0),
+            "histogram": histogram_json(histogram),
+        }
+        threshold_join = params.get("threshold_join")
+        if threshold_join:
+            # Thresholded scans only store pairs >= min_score; the rest are counts.
+            meta["min_score"] = threshold_join.get("min_score")
+            meta["n_pairs_below_threshold"] = threshold_join.get("pairs_below", 0)
+
+        out: Dict[str, Any] = {
+            "meta": meta,
+            "pairs": [_pair_json(p) for p in pairs],
+        }
+        if done:
+            meta["stats"] = await results_stats(session, scan_id=scan_id)
+        # The top-k is a preview; complete, filterable lists come from /pairs.
+        meta["truncated"] = meta["n_pairs"] > len(out["pairs"])
+        if not done:
+            # Partial, live-updating top-k while the scan is still scoring.
+            out["status"] = "processing"
+            out["partial"] = True
+            out["progress"] = scan["progress"]
+            return out
 
-        def label_for(score: float) -> str:
-            return "high" if score > 70 else "medium" if score > 40 else "low"
+    cached = build_cached(json.dumps(out, separators=(",", ":")).encode("utf-8"))
+    await put_cached(app.state.redis, scan_id, "results", cached, ttl_s=s.response_cache_ttl_s)
+    return to_response(request, cached, cache_control=_immutable_cache_control())
 
-        return {
-            "meta": {
-                "n_files": len(files),
-                "n_pairs": len(pairs),
-                # runtime_ms is kept for UI; we store approximate in params_json if available
-                "runtime_ms": int((scan.get("params_json") or {}).get("runtime_ms", 0) or 0),
-            },
-            "pairs": [
-                {
-                    "file_a": p["file_a"],
-                    "file_b": p["file_b"],
-                    "similarity": round(float(p["score"]), 1),
-                    "label": label_for(float(p["score"])),
-                    "overlap_spans": (p.get("details_json") or {}).get("overlap_spans", []),
-                }
-                for p in pairs
-            ],
+
+def _encode_cursor(row: Dict[str, Any]) -> str:
+    raw = json.dumps([float(row["score"]), int(row["id"])]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, row_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(score), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _pairs_filters(min_score: Optional[float], label: Optional[str], q: Optional[str]) -> Dict[str, Any]:
+    if label is not None and label not in LABEL_SCORE_RANGES:
+        raise HTTPException(status_code=400, detail=f"label must be one of {sorted(LABEL_SCORE_RANGES)}")
+    return {"min_score": min_score, "label": label, "search": (q or "").strip() or None}
+
+
+async def _require_scan(session, scan_id: str) -> Dict[str, Any]:
+    scan = await get_scan(session, scan_id)
+    if not scan:
+        raise HTTPException(status_code=404, detail="Scan not found")
+    return scan
+
+
+@app.get("/api/scan/{scan_id}/pairs")
+async def list_scan_pairs(
+    scan_id: str,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    min_score: Optional[float] = None,
+    label: Optional[str] = None,
+    q: Optional[str] = None,
+    stats: bool = False,
+) -> Dict[str, Any]:
+    """Filtered result pairs by descending score, one keyset page at a time.
+
+    Pass ``next_cursor`` back as ``cursor`` for the following page; it is
+    null on the last one. ``stats=true`` adds SQL aggregates over the filter.
+    """
+    s = app.state.settings
+    limit = max(1, min(limit, s.results_page_max))
+    filters = _pairs_filters(min_score, label, q)
+    after = _decode_cursor(cursor) if cursor else None
+    async with app.state.SessionLocal() as session:
+        await _require_scan(session, scan_id)
+        rows = await list_results_page(session, scan_id=scan_id, after=after, limit=limit, **filters)
+        out: Dict[str, Any] = {
+            "pairs": [_pair_json(r) for r in rows],
+            "next_cursor": _encode_cursor(rows[-1]) if len(rows) == limit else None,
         }
+        if stats:
+            out["stats"] = await results_stats(session, scan_id=scan_id, **filters)
+    return out
+
+
+@app.get("/api/scan/{scan_id}/pairs.ndjson")
+async def stream_scan_pairs(
+    scan_id: str,
+    min_score: Optional[float] = None,
+    label: Optional[str] = None,
+    q: Optional[str] = None,
+) -> StreamingResponse:
+    """Every pair matching the filters as newline-delimited JSON, fetched in keyset batches."""
+    batch = app.state.settings.results_stream_batch
+    filters = _pairs_filters(min_score, label, q)
+    async with app.state.SessionLocal() as session:
+        await _require_scan(session, scan_id)
+
+    async def _lines():
+        after: Optional[Tuple[float, int]] = None
+        async with app.state.SessionLocal() as session:
+            while True:
+                rows = await list_results_page(session, scan_id=scan_id, after=after, limit=batch, **filters)
+                if rows:
+                    yield "".join(json.dumps(_pair_json(r)) + "\n" for r in rows)
+                if len(rows) < batch:
+                    return
+                after = (float(rows[-1]["score"]), int(rows[-1]["id"]))
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+
+_EXPORT_ENCODERS = {"csv": csv_chunks, "ndjson": ndjson_chunks, "parquet": parquet_chunks}
+
+
+@app.get("/api/scan/{scan_id}/export")
+async def export_scan_results(scan_id: str, format: str = "csv", details: bool = False) -> StreamingResponse:
+    """All pairs with file metadata as CSV, NDJSON or Parquet, streamed from a DB cursor."""
+    encoder = _EXPORT_ENCODERS.get(format)
+    if encoder is None:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(_EXPORT_ENCODERS)}")
+    batch_size = app.state.settings.export_batch_size
+    async with app.state.SessionLocal() as session:
+        await _require_scan(session, scan_id)
+
+    async def _chunks():
+        async with app.state.SessionLocal() as session:
+            batches = iter_results_export(session, scan_id=scan_id, with_details=details, batch_size=batch_size)
+            async for chunk in encoder(batches, with_details=details):
+                yield chunk
+
+    return StreamingResponse(
+        _chunks(),
+        media_type=EXPORT_MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="plagcode-{scan_id}.{format}"'},
+    )
 
 
 @app.get("/api/files/{scan_id}/{filename}")
-async def get_file_content(scan_id: str, filename: str) -> Dict[str, Any]:
+async def get_file_content(scan_id: str, filename: str, request: Request) -> Response:
+    """File content as JSON; the ETag derives from the stored checksum, so 304s skip MinIO."""
     s = app.state.settings
     async with app.state.SessionLocal() as session:
         f = await get_file_by_scan_and_name(session, scan_id=scan_id, filename=filename)
         if not f:
             raise HTTPException(status_code=404, detail="File not found")
 
-    data = get_bytes(client=app.state.minio, bucket=s.minio_bucket, object_key=f["object_key"])
+    etag = f'"file-{f["checksum"][:32]}"'
+    cache_control = _immutable_cache_control()
+    if etag_matches(request, etag):
+        return not_modified(held_etag(request, etag), cache_control)
+
+    name = f"file:{f['checksum']}"
+    cached = await get_cached(app.state.redis, scan_id, name)
+    if cached is not None:
+        return to_response(request, cached, cache_control=cache_control)
+
+    data = await app.state.storage.get_bytes(bucket=s.minio_bucket, object_key=f["object_key"])
 
     # Best-effort decode
     try:
@@ -312,7 +711,10 @@ async def get_file_content(scan_id: str, filename: str) -> Dict[str, Any]:
     except UnicodeDecodeError:
         content = data.decode("latin-1", errors="replace")
 
-    return {"content": content}
+    cached = build_cached(json.dumps({"content": content}).encode("utf-8"), etag=etag)
+    if len(cached.body) <= s.response_cache_max_bytes:
+        await put_cached(app.state.redis, scan_id, name, cached, ttl_s=s.response_cache_ttl_s)
+    return to_response(request, cached, cache_control=cache_control)
 
 
 # New schema-aligned endpoints (aliases over the same DB source of truth)
@@ -322,8 +724,8 @@ async def get_scan_status_v2(scan_id: str) -> Dict[str, Any]:
 
 
 @app.get("/scans/{scan_id}/results")
-async def get_scan_results_v2(scan_id: str) -> Dict[str, Any]:
-    return await get_scan_results(scan_id)
+async def get_scan_results_v2(scan_id: str, request: Request) -> Any:
+    return await get_scan_results(scan_id, request)
 
 
 @app.get("/alerts")
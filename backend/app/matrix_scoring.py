@@ -0,0 +1,52 @@
+"""Scan-level scoring: all pairwise Jaccard scores from one sparse product.
+
+Each file's distinct tokens become one row of a binary CSR incidence matrix
+(files x vocabulary). ``A @ A.T`` then holds every pairwise intersection size
+and unions follow from the row cardinalities. Scores are bit-for-bit equal to
+``similarity.jaccard_percent`` on the same token lists.
+"""
+from __future__ import annotations
+
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+
+
+def incidence_matrix(token_lists: Sequence[Iterable[Hashable]]) -> csr_matrix:
+    vocab: Dict[Hashable, int] = {}
+    indices: List[int] = []
+    indptr = np.zeros(len(token_lists) + 1, dtype=np.int64)
+    for row, tokens in enumerate(token_lists):
+        ids = {vocab.setdefault(t, len(vocab)) for t in tokens}
+        indices.extend(ids)
+        indptr[row + 1] = len(indices)
+
+    data = np.ones(len(indices), dtype=np.int32)
+    return csr_matrix(
+        (data, np.asarray(indices, dtype=np.int64), indptr),
+        shape=(len(token_lists), len(vocab)),
+    )
+
+
+def jaccard_matrix_percent(token_lists: Sequence[Iterable[Hashable]], *, empty_score: float = 100.0) -> np.ndarray:
+    """n x n matrix of Jaccard percentages (float64).
+
+    Two empty sets score empty_score, as in ``similarity.jaccard_percent_sets``.
+    """
+    a = incidence_matrix(token_lists)
+    inter = (a @ a.T).toarray().astype(np.int64)
+    sizes = np.diff(a.indptr)
+    union = sizes[:, None] + sizes[None, :] - inter
+
+    scores = np.zeros(inter.shape, dtype=np.float64)
+    nonzero = union > 0
+    scores[nonzero] = (inter[nonzero] / union[nonzero]) * 100.0
+    scores[~nonzero] = empty_score
+    return scores
+
+
+def upper_triangle_pairs(scores: np.ndarray) -> List[Tuple[int, int, float]]:
+    """(i, j, score) for every i < j."""
+    ii, jj = np.triu_indices(scores.shape[0], k=1)
+    return list(zip(ii.tolist(), jj.tolist(), scores[ii, jj].tolist()))
@@ -0,0 +1,86 @@
+"""MinHash signatures + LSH banding used by candidate retrieval.
+
+Signatures are computed once per checksum (normalizer) and cached in Redis.
+A scan then picks how many bands/rows of the signature it uses, so the same
+cached signature serves every band/row configuration up to ``num_perm``.
+"""
+from __future__ import annotations
+
+from collections import defaultdict
+from itertools import combinations
+from typing import Dict, Hashable, List, Set, Tuple
+
+import numpy as np
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_SEED = 1
+
+
+def _permutations(num_perm: int) -> Tuple[np.ndarray, np.ndarray]:
+    # a, b < 2**32 keeps (hv * a + b) below 2**64 for 32-bit hv: no uint64 wrap.
+    gen = np.random.RandomState(_SEED)
+    a = gen.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+    b = gen.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+_PERM_CACHE: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def minhash_signature_from_hashes(hashes: np.ndarray, num_perm: int = 128) -> np.ndarray:
+    """uint32 MinHash signature of a token *set*, given as its distinct ``token_hash`` values."""
+    perms = _PERM_CACHE.get(num_perm)
+    if perms is None:
+        perms = _PERM_CACHE[num_perm] = _permutations(num_perm)
+    a, b = perms
+
+    if len(hashes) == 0:
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint32)
+
+    hv = hashes.astype(np.uint64) & _MAX_HASH
+    phv = ((hv[:, None] * a[None, :] + b[None, :]) % _MERSENNE_PRIME) & _MAX_HASH
+    return phv.min(axis=0).astype(np.uint32)
+
+
+def signature_to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4", copy=False).tobytes()
+
+
+def signature_from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+
+class LSHIndex:
+    """In-memory banding index over MinHash signatures.
+
+    Two keys become candidates when all ``rows`` values of at least one band
+    are equal. With b bands of r rows, the collision probability for Jaccard
+    similarity s is 1 - (1 - s**r)**b.
+    """
+
+    def __init__(self, *, bands: int, rows: int) -> None:
+        if bands < 1 or rows < 1:
+            raise ValueError("bands and rows must be >= 1")
+        self.bands = bands
+        self.rows = rows
+        self._buckets: Dict[Tuple[int, bytes], List[Hashable]] = defaultdict(list)
+
+    def insert(self, key: Hashable, signature: np.ndarray) -> None:
+        needed = self.bands * self.rows
+        if len(signature) < needed:
+            raise ValueError(f"Signature has {len(signature)} values, LSH needs {needed}")
+        sig = np.ascontiguousarray(signature[:needed])
+        for band in range(self.bands):
+            chunk = sig[band * self.rows : (band + 1) * self.rows]
+            self._buckets[(band, chunk.tobytes())].append(key)
+
+    def candidate_pairs(self) -> Set[Tuple[Hashable, Hashable]]:
+        pairs: Set[Tuple[Hashable, Hashable]] = set()
+        for keys in self._buckets.values():
+            if len(keys) < 2:
+                continue
+            for ka, kb in combinations(keys, 2):
+                pairs.add((ka, kb) if ka <= kb else (kb, ka))
+        return pairs
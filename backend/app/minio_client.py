@@ -1,10 +1,28 @@
 from __future__ import annotations
 
+import asyncio
+import functools
 import io
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional
+from datetime import datetime
+from typing import AsyncIterator, Iterator, List, Optional, Sequence, Tuple
 
+import certifi
+import urllib3
 from minio import Minio
+from minio.commonconfig import REPLACE, CopySource
+from minio.deleteobjects import DeleteObject
+from minio.error import S3Error
+
+
+# Uploads are stored once per content: blobs/sha256/<first 2 hex>/<sha256>.
+BLOB_PREFIX = "blobs/sha256/"
+
+
+def blob_object_key(checksum: str) -> str:
+    return f"{BLOB_PREFIX}{checksum[:2]}/{checksum}"
 
 
 @dataclass
@@ -14,14 +32,26 @@ class MinioConfig:
     secret_key: str
     secure: bool = False
     bucket: str = "plagcode-uploads"
+    # Size of the shared urllib3 connection pool (None keeps the minio default).
+    max_pool_connections: Optional[int] = None
 
 
 def make_client(cfg: MinioConfig) -> Minio:
+    http_client = None
+    if cfg.max_pool_connections:
+        http_client = urllib3.PoolManager(
+            maxsize=cfg.max_pool_connections,
+            cert_reqs="CERT_REQUIRED",
+            ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+            timeout=urllib3.Timeout(connect=10, read=300),
+            retries=urllib3.Retry(total=5, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504]),
+        )
     return Minio(
         cfg.endpoint,
         access_key=cfg.access_key,
         secret_key=cfg.secret_key,
         secure=cfg.secure,
+        http_client=http_client,
     )
 
 
@@ -47,6 +77,75 @@ def put_bytes(
     )
 
 
+def put_stream(
+    *,
+    client: Minio,
+    bucket: str,
+    object_key: str,
+    stream,
+    length: int = -1,
+    content_type: str = "application/octet-stream",
+    part_size: int = 0,
+) -> None:
+    """Upload from a file-like ``stream``; large or unknown-length objects go up as multipart."""
+    client.put_object(
+        bucket,
+        object_key,
+        stream,
+        length=length,
+        content_type=content_type,
+        part_size=part_size,
+    )
+
+
+def _missing(e: S3Error) -> bool:
+    return e.code in ("NoSuchKey", "NoSuchObject")
+
+
+def object_last_modified(*, client: Minio, bucket: str, object_key: str) -> Optional[datetime]:
+    """The object's last_modified, or None if it does not exist."""
+    try:
+        return client.stat_object(bucket, object_key).last_modified
+    except S3Error as e:
+        if _missing(e):
+            return None
+        raise
+
+
+def touch_object(*, client: Minio, bucket: str, object_key: str) -> bool:
+    """Refresh an object's last_modified with a server-side copy onto itself.
+
+    Returns False if the object does not exist. Reusing a blob touches it, so
+    the blob GC's grace period covers it until the referencing rows commit.
+    """
+    try:
+        stat = client.stat_object(bucket, object_key)
+        # S3 only allows copying an object onto itself when metadata is replaced.
+        client.copy_object(
+            bucket,
+            object_key,
+            CopySource(bucket, object_key),
+            metadata={"Content-Type": stat.content_type or "application/octet-stream"},
+            metadata_directive=REPLACE,
+        )
+    except S3Error as e:
+        if _missing(e):
+            return False
+        raise
+    return True
+
+
+def iter_objects(*, client: Minio, bucket: str, prefix: str) -> Iterator[Tuple[str, Optional[datetime]]]:
+    for obj in client.list_objects(bucket, prefix=prefix, recursive=True):
+        yield obj.object_name, obj.last_modified
+
+
+def remove_objects(*, client: Minio, bucket: str, object_keys: Sequence[str]) -> List[str]:
+    """Bulk delete; returns the keys that failed."""
+    errors = client.remove_objects(bucket, [DeleteObject(k) for k in object_keys])
+    return [e.name for e in errors]
+
+
 def get_bytes(*, client: Minio, bucket: str, object_key: str) -> bytes:
     resp = client.get_object(bucket, object_key)
     try:
@@ -54,3 +153,90 @@ def get_bytes(*, client: Minio, bucket: str, object_key: str) -> bytes:
     finally:
         resp.close()
         resp.release_conn()
+
+
+class AsyncMinio:
+    """Async facade over the (thread-safe) synchronous Minio client.
+
+    Calls run on a bounded thread pool so they never block the event loop;
+    max_workers also bounds how many requests are in flight at once, and
+    should match MinioConfig.max_pool_connections.
+    """
+
+    def __init__(self, client: Minio, *, max_workers: int) -> None:
+        self.client = client
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="minio")
+
+    async def _run(self, fn, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, **kwargs))
+
+    async def put_bytes(
+        self,
+        *,
+        bucket: str,
+        object_key: str,
+        data: bytes,
+        content_type: str = "application/octet-stream",
+    ) -> None:
+        await self._run(
+            put_bytes,
+            client=self.client,
+            bucket=bucket,
+            object_key=object_key,
+            data=data,
+            content_type=content_type,
+        )
+
+    async def put_stream(
+        self,
+        *,
+        bucket: str,
+        object_key: str,
+        stream,
+        length: int = -1,
+        content_type: str = "application/octet-stream",
+        part_size: int = 0,
+    ) -> None:
+        await self._run(
+            put_stream,
+            client=self.client,
+            bucket=bucket,
+            object_key=object_key,
+            stream=stream,
+            length=length,
+            content_type=content_type,
+            part_size=part_size,
+        )
+
+    async def get_bytes(self, *, bucket: str, object_key: str) -> bytes:
+        return await self._run(get_bytes, client=self.client, bucket=bucket, object_key=object_key)
+
+    async def last_modified(self, *, bucket: str, object_key: str) -> Optional[datetime]:
+        return await self._run(object_last_modified, client=self.client, bucket=bucket, object_key=object_key)
+
+    async def touch(self, *, bucket: str, object_key: str) -> bool:
+        return await self._run(touch_object, client=self.client, bucket=bucket, object_key=object_key)
+
+    async def iter_object_batches(
+        self, *, bucket: str, prefix: str, batch_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[str, Optional[datetime]]]]:
+        """(key, last_modified) of every object under prefix, listed page by page off the loop."""
+        it = iter_objects(client=self.client, bucket=bucket, prefix=prefix)
+
+        def _next_batch() -> List[Tuple[str, Optional[datetime]]]:
+            return [item for _, item in zip(range(batch_size), it)]
+
+        while True:
+            batch = await self._run(_next_batch)
+            if not batch:
+                return
+            yield batch
+
+    async def remove_objects(self, *, bucket: str, object_keys: Sequence[str]) -> List[str]:
+        if not object_keys:
+            return []
+        return await self._run(remove_objects, client=self.client, bucket=bucket, object_keys=object_keys)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
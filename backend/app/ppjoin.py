@@ -0,0 +1,99 @@
+"""Thresholded set-similarity self-join (AllPairs / PPJoin filtering).
+
+Returns every pair whose Jaccard percentage is >= ``min_score`` without
+touching the others:
+
+- tokens are re-ranked by global rarity (document frequency), so prefixes
+  hold the rarest tokens and inverted lists stay short
+- records are processed by increasing size; the length filter drops indexed
+  records too small to reach the threshold
+- prefix filter: two sets reaching the threshold share a token within their
+  prefixes, so only prefixes are probed (and only "mid-prefixes" indexed)
+- positional filter: a candidate is dropped as soon as the tokens left after
+  the current positions cannot make up the required overlap
+
+Survivors are verified with ``similarity.jaccard_percent_sets``, so reported
+scores are exactly the ones the regular scorer would produce.
+"""
+from __future__ import annotations
+
+import math
+from collections import Counter, defaultdict
+from typing import AbstractSet, Dict, Hashable, List, Sequence, Tuple
+
+from .similarity import jaccard_percent_sets
+
+
+_EPS = 1e-9
+
+
+def _ceil(x: float) -> int:
+    # Float-safe ceil: bounds must never exclude a pair exactly at the threshold.
+    return math.ceil(x - _EPS)
+
+
+def threshold_join(
+    sets: Sequence[AbstractSet[Hashable]], min_score: float, *, empty_score: float = 100.0
+) -> Tuple[List[Tuple[int, int, float]], int]:
+    """Return ([(i, j, score)] with i < j and score >= min_score, number of pairs verified).
+
+    Two empty sets score empty_score, as in ``similarity.jaccard_percent_sets``.
+    """
+    t = min_score / 100.0
+    if t <= 0:
+        raise ValueError("min_score must be > 0")
+
+    df = Counter(tok for s in sets for tok in s)
+    rank: Dict[Hashable, int] = {tok: r for r, tok in enumerate(sorted(df, key=lambda k: (df[k], k)))}
+    records = [sorted(rank[tok] for tok in s) for s in sets]
+    order = sorted(range(len(sets)), key=lambda i: (len(records[i]), i))
+
+    matches: List[Tuple[int, int, float]] = []
+    verified = 0
+    empties: List[int] = []
+    index: Dict[int, List[Tuple[int, int]]] = defaultdict(list)
+
+    for x in order:
+        rx = records[x]
+        lx = len(rx)
+        if lx == 0:
+            # Empty vs empty scores empty_score, empty vs non-empty 0.
+            if empty_score >= min_score:
+                for y in empties:
+                    verified += 1
+                    matches.append((min(x, y), max(x, y), empty_score))
+            empties.append(x)
+            continue
+
+        min_len = t * lx
+        overlaps: Dict[int, int] = {}
+        probe_prefix = lx - _ceil(t * lx) + 1
+        for i in range(probe_prefix):
+            for y, j in index.get(rx[i], ()):
+                count = overlaps.get(y, 0)
+                if count < 0:
+                    continue
+                ly = len(records[y])
+                if ly < min_len - _EPS:
+                    overlaps[y] = -1
+                    continue
+                alpha = _ceil(t / (1.0 + t) * (lx + ly))
+                if count + 1 + min(lx - i - 1, ly - j - 1) >= alpha:
+                    overlaps[y] = count + 1
+                else:
+                    overlaps[y] = -1
+
+        for y, count in overlaps.items():
+            if count <= 0:
+                continue
+            verified += 1
+            score = jaccard_percent_sets(sets[x], sets[y], empty_score=empty_score)
+            if score >= min_score:
+                matches.append((min(x, y), max(x, y), score))
+
+        index_prefix = lx - _ceil(2.0 * t / (1.0 + t) * lx) + 1
+        for i in range(index_prefix):
+            index[rx[i]].append((x, i))
+
+    matches.sort()
+    return matches, verified
@@ -15,9 +15,32 @@ def make_redis(url: str) -> redis.Redis:
     return redis.from_url(url, decode_responses=False)
 
 
-def norm_key(checksum: str) -> str:
-    return f"norm:{checksum}"
+def norm_checksum_key(checksum: str) -> str:
+    return f"normsum:{checksum}"
 
 
-def tokens_key(checksum: str) -> str:
-    return f"tokens:{checksum}"
+def minhash_key(checksum: str) -> str:
+    return f"minhash:{checksum}"
+
+
+def artifact_key(checksum: str, version: int, k: int, window: int) -> str:
+    # Format version and fingerprint parameters are part of the key: changing
+    # either turns old entries into cache misses.
+    return f"art:v{version}:{k}:{window}:{checksum}"
+
+
+def scan_topk_key(scan_id: str) -> str:
+    return f"scan:{scan_id}:topk"
+
+
+def scan_histogram_key(scan_id: str) -> str:
+    return f"scan:{scan_id}:hist"
+
+
+def scan_files_key(scan_id: str) -> str:
+    return f"scan:{scan_id}:files"
+
+
+def response_key(scan_id: str, name: str) -> str:
+    return f"resp:{scan_id}:{name}"
+
@@ -1,63 +1,100 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
 
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 
 
-async def create_scan(
-    session: AsyncSession,
-    *,
-    scan_id: str,
-    status: str,
-    params: Dict[str, Any],
-) -> None:
-    await session.execute(
-        text(
-            """
-            INSERT INTO scans(scan_id, status, progress, params_json)
-            VALUES (:scan_id, :status, 0, CAST(:params AS jsonb))
-            """
-        ),
-        {"scan_id": scan_id, "status": status, "params": json.dumps(params)},
-    )
+# Scores above this count as high risk in scan summaries (matches the UI's "high" label).
+HIGH_RISK_SCORE = 70
 
+# Result label -> (exclusive lower, inclusive upper) score bound; mirrors the API's labels.
+LABEL_SCORE_RANGES: Dict[str, Tuple[Optional[float], Optional[float]]] = {
+    "high": (70.0, None),
+    "medium": (40.0, 70.0),
+    "low": (None, 40.0),
+}
 
-async def insert_file(
+
+async def create_scan_with_files(
     session: AsyncSession,
     *,
     scan_id: str,
-    filename: str,
-    object_key: str,
-    checksum: str,
-    language: Optional[str],
-    size: int,
-) -> int:
+    status: str,
+    params: Dict[str, Any],
+    files: Sequence[Dict[str, Any]],
+    log_messages: Sequence[str] = (),
+) -> List[int]:
+    """Create a scan with its summary row, initial log lines and files.
+
+    The scan, its summary row, the log lines (in order) and every files row
+    go in a single statement regardless of the number of files. Returns the
+    file ids in input order: they are drawn up front because RETURNING order
+    is unspecified, and object keys are shared by deduplicated files.
+    """
     res = await session.execute(
         text(
             """
-            INSERT INTO files(scan_id, filename, object_key, checksum, language, size)
-            VALUES (:scan_id, :filename, :object_key, :checksum, :language, :size)
-            RETURNING id
+            WITH s AS (
+              INSERT INTO scans(scan_id, status, progress, params_json, files_total)
+              VALUES (:scan_id, :status, 0, CAST(:params AS jsonb), :files_total)
+              RETURNING scan_id, created_at, files_total
+            ),
+            summary AS (
+              INSERT INTO scan_summaries(scan_id, created_at, file_count)
+              SELECT scan_id, created_at, files_total FROM s
+            ),
+            logs AS (
+              INSERT INTO scan_logs(scan_id, message)
+              SELECT s.scan_id, t.message
+              FROM s, unnest(CAST(:messages AS text[])) WITH ORDINALITY AS t(message, n)
+              ORDER BY t.n
+            ),
+            new_files AS (
+              SELECT nextval(pg_get_serial_sequence('files', 'id')) AS id, t.*
+              FROM unnest(
+                CAST(:filename AS text[]),
+                CAST(:object_key AS text[]),
+                CAST(:checksum AS text[]),
+                CAST(:language AS text[]),
+                CAST(:size AS bigint[])
+              ) WITH ORDINALITY AS t(filename, object_key, checksum, language, size, n)
+            ),
+            ins AS (
+              INSERT INTO files(id, scan_id, filename, object_key, checksum, language, size)
+              SELECT f.id, s.scan_id, f.filename, f.object_key, f.checksum, f.language, f.size
+              FROM s, new_files f
+            )
+            SELECT id FROM new_files ORDER BY n
             """
         ),
         {
             "scan_id": scan_id,
-            "filename": filename,
-            "object_key": object_key,
-            "checksum": checksum,
-            "language": language,
-            "size": size,
+            "status": status,
+            "params": json.dumps(params),
+            "files_total": len(files),
+            "messages": list(log_messages),
+            "filename": [f["filename"] for f in files],
+            "object_key": [f["object_key"] for f in files],
+            "checksum": [f["checksum"] for f in files],
+            "language": [f["language"] for f in files],
+            "size": [int(f["size"]) for f in files],
         },
     )
-    return int(res.scalar_one())
+    return [int(i) for i in res.scalars().all()]
 
 
 async def get_scan(session: AsyncSession, scan_id: str) -> Optional[Dict[str, Any]]:
     res = await session.execute(
-        text("SELECT scan_id, created_at, status, progress, params_json FROM scans WHERE scan_id = :scan_id"),
+        text(
+            """
+            SELECT scan_id, created_at, status, progress, params_json, files_total, pairs_total, pairs_scored
+            FROM scans
+            WHERE scan_id = :scan_id
+            """
+        ),
         {"scan_id": scan_id},
     )
     row = res.mappings().first()
@@ -97,63 +134,126 @@ async def update_scan_status_progress(
 
 
 async def append_scan_log(session: AsyncSession, *, scan_id: str, message: str) -> None:
-    # Append into params_json.logs as an array; keep it capped at last ~200 entries.
+    await session.execute(
+        text("INSERT INTO scan_logs(scan_id, message) VALUES (:scan_id, :msg)"),
+        {"scan_id": scan_id, "msg": message},
+    )
+
+
+async def append_scan_logs(session: AsyncSession, *, entries: Sequence[Tuple[str, str]]) -> None:
+    """Insert many (scan_id, message) log lines with one statement, in order."""
+    if not entries:
+        return
     await session.execute(
         text(
             """
-            UPDATE scans
-            SET params_json = jsonb_set(
-              params_json,
-              '{logs}',
-              (
-                COALESCE(params_json->'logs', '[]'::jsonb)
-                                || jsonb_build_array(jsonb_build_object('time', to_char(NOW(), 'HH24:MI:SS'), 'message', CAST(:msg AS text)))
-              )
-            )
-            WHERE scan_id = :scan_id
+            INSERT INTO scan_logs(scan_id, message)
+            SELECT t.scan_id, t.message
+            FROM unnest(CAST(:scan_ids AS uuid[]), CAST(:messages AS text[])) WITH ORDINALITY AS t(scan_id, message, n)
+            ORDER BY t.n
             """
         ),
-        {"scan_id": scan_id, "msg": message},
+        {"scan_ids": [e[0] for e in entries], "messages": [e[1] for e in entries]},
     )
 
 
-async def mark_file_normalized(session: AsyncSession, *, file_id: int) -> None:
-    await session.execute(
-        text("UPDATE files SET normalized_at = NOW() WHERE id = :id AND normalized_at IS NULL"),
-        {"id": file_id},
+async def list_scan_logs(
+    session: AsyncSession,
+    *,
+    scan_id: str,
+    after_id: Optional[int] = None,
+    limit: int = 500,
+) -> List[Dict[str, Any]]:
+    """Log lines in id order: those after ``after_id``, or the latest ``limit`` without a cursor."""
+    params: Dict[str, Any] = {"scan_id": scan_id, "lim": limit}
+    if after_id is not None:
+        params["after_id"] = after_id
+        sql = """
+            SELECT id, to_char(created_at, 'HH24:MI:SS') AS time, message
+            FROM scan_logs
+            WHERE scan_id = :scan_id AND id > :after_id
+            ORDER BY id ASC
+            LIMIT :lim
+            """
+    else:
+        sql = """
+            SELECT * FROM (
+              SELECT id, to_char(created_at, 'HH24:MI:SS') AS time, message
+              FROM scan_logs
+              WHERE scan_id = :scan_id
+              ORDER BY id DESC
+              LIMIT :lim
+            ) latest
+            ORDER BY id ASC
+            """
+    res = await session.execute(text(sql), params)
+    return [dict(r) for r in res.mappings().all()]
+
+
+async def prune_scan_logs(session: AsyncSession, *, scan_id: str, keep: int) -> int:
+    """Retention: delete all but the newest ``keep`` log lines of a scan."""
+    res = await session.execute(
+        text(
+            """
+            DELETE FROM scan_logs
+            WHERE scan_id = :scan_id
+              AND id < (
+                SELECT MIN(id) FROM (
+                  SELECT id FROM scan_logs WHERE scan_id = :scan_id ORDER BY id DESC LIMIT :keep
+                ) newest
+              )
+            """
+        ),
+        {"scan_id": scan_id, "keep": keep},
     )
+    return res.rowcount or 0
 
 
-async def list_files_for_scan(session: AsyncSession, *, scan_id: str) -> List[Dict[str, Any]]:
+async def mark_file_normalized(
+    session: AsyncSession,
+    *,
+    scan_id: str,
+    file_id: int,
+    norm_checksum: Optional[str] = None,
+) -> Tuple[int, int]:
+    """Mark a file normalized and return the scan's (files_total, files_normalized) counters.
+
+    The counter only moves when the file was not normalized yet, so redelivered
+    events are harmless.
+    """
     res = await session.execute(
         text(
             """
-            SELECT id, filename, object_key, checksum, language, size, created_at, normalized_at
-            FROM files
+            WITH f AS (
+              UPDATE files SET normalized_at = NOW(), norm_checksum = :norm_checksum
+              WHERE id = :id AND normalized_at IS NULL
+              RETURNING id
+            )
+            UPDATE scans
+            SET files_normalized = files_normalized + (SELECT COUNT(*) FROM f)
             WHERE scan_id = :scan_id
-            ORDER BY id ASC
+            RETURNING files_total, files_normalized
             """
         ),
-        {"scan_id": scan_id},
+        {"id": file_id, "scan_id": scan_id, "norm_checksum": norm_checksum},
     )
-    return [dict(r) for r in res.mappings().all()]
+    row = res.mappings().one()
+    return int(row["files_total"]), int(row["files_normalized"])
 
 
-async def count_files_normalized(session: AsyncSession, *, scan_id: str) -> Tuple[int, int]:
+async def list_files_for_scan(session: AsyncSession, *, scan_id: str) -> List[Dict[str, Any]]:
     res = await session.execute(
         text(
             """
-            SELECT
-              COUNT(*)::int AS total,
-              COUNT(*) FILTER (WHERE normalized_at IS NOT NULL)::int AS normalized
+            SELECT id, filename, object_key, checksum, norm_checksum, language, size, created_at, normalized_at
             FROM files
             WHERE scan_id = :scan_id
+            ORDER BY id ASC
             """
         ),
         {"scan_id": scan_id},
     )
-    row = res.mappings().one()
-    return int(row["total"]), int(row["normalized"])
+    return [dict(r) for r in res.mappings().all()]
 
 
 async def try_mark_pairs_generated(session: AsyncSession, *, scan_id: str, total_pairs: int) -> bool:
@@ -163,7 +263,8 @@ async def try_mark_pairs_generated(session: AsyncSession, *, scan_id: str, total
             UPDATE scans
             SET params_json = params_json
               || jsonb_build_object('pairs_generated', true)
-                            || jsonb_build_object('total_pairs', CAST(:total_pairs AS int))
+                            || jsonb_build_object('total_pairs', CAST(:total_pairs AS int)),
+              pairs_total = :total_pairs
             WHERE scan_id = :scan_id
               AND COALESCE((params_json->>'pairs_generated')::boolean, false) = false
             RETURNING scan_id
@@ -174,49 +275,141 @@ async def try_mark_pairs_generated(session: AsyncSession, *, scan_id: str, total
     return res.first() is not None
 
 
-async def upsert_result(
+async def upsert_results(
     session: AsyncSession,
     *,
     scan_id: str,
-    file_a_id: int,
-    file_b_id: int,
-    score: float,
-    details: Dict[str, Any],
-) -> None:
+    rows: Sequence[Tuple[int, int, float, Dict[str, Any]]],
+    chunk_size: int = 5000,
+) -> List[Tuple[int, int, float]]:
+    """Upsert scored pairs: one statement per chunk of (a, b, score, details).
+
+    Returns the (a, b, score) pairs that were new (as opposed to re-scored).
+    """
+    inserted: List[Tuple[int, int, float]] = []
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start : start + chunk_size]
+        res = await session.execute(
+            text(
+                """
+                INSERT INTO results(scan_id, file_a_id, file_b_id, score, details_json)
+                SELECT CAST(:scan_id AS uuid), t.a, t.b, t.score, CAST(t.details AS jsonb)
+                FROM unnest(
+                  CAST(:a AS bigint[]),
+                  CAST(:b AS bigint[]),
+                  CAST(:score AS float8[]),
+                  CAST(:details AS text[])
+                ) AS t(a, b, score, details)
+                ON CONFLICT (scan_id, file_a_id, file_b_id)
+                DO UPDATE SET score = EXCLUDED.score, details_json = EXCLUDED.details_json
+                RETURNING file_a_id, file_b_id, score, (xmax = 0) AS inserted
+                """
+            ),
+            {
+                "scan_id": scan_id,
+                "a": [r[0] for r in chunk],
+                "b": [r[1] for r in chunk],
+                "score": [r[2] for r in chunk],
+                "details": [json.dumps(r[3]) for r in chunk],
+            },
+        )
+        inserted.extend(
+            (int(r["file_a_id"]), int(r["file_b_id"]), float(r["score"])) for r in res.mappings() if r["inserted"]
+        )
+    await bump_scan_summary(session, scan_id=scan_id, rows=inserted)
+    return inserted
+
+
+async def bump_scan_summary(session: AsyncSession, *, scan_id: str, rows: Sequence[Tuple[int, int, float]]) -> None:
+    """Fold newly inserted (a, b, score) results into the scan's summary row."""
+    if not rows:
+        return
     await session.execute(
         text(
             """
-            INSERT INTO results(scan_id, file_a_id, file_b_id, score, details_json)
-            VALUES (:scan_id, :a, :b, :score, CAST(:details AS jsonb))
-            ON CONFLICT (scan_id, file_a_id, file_b_id)
-            DO UPDATE SET score = EXCLUDED.score, details_json = EXCLUDED.details_json
+            UPDATE scan_summaries
+            SET
+              top_similarity = GREATEST(top_similarity, :top),
+              high_risk_count = high_risk_count + :high
+            WHERE scan_id = :scan_id
             """
         ),
         {
             "scan_id": scan_id,
-            "a": file_a_id,
-            "b": file_b_id,
-            "score": score,
-            "details": json.dumps(details),
+            "top": max(r[2] for r in rows),
+            "high": sum(1 for r in rows if r[2] > HIGH_RISK_SCORE),
         },
     )
 
 
-async def count_results(session: AsyncSession, *, scan_id: str) -> int:
+async def finalize_scan_summary(session: AsyncSession, *, scan_id: str) -> None:
+    """Recompute a completed scan's summary from its results (exact, once per completion)."""
+    await session.execute(
+        text(
+            """
+            UPDATE scan_summaries ss
+            SET
+              file_count = s.files_total,
+              pair_count = s.pairs_total,
+              top_similarity = COALESCE(r.top_similarity, 0),
+              high_risk_count = COALESCE(r.high_risk_count, 0),
+              runtime_ms = (EXTRACT(EPOCH FROM (NOW() - s.created_at)) * 1000)::int,
+              finalized_at = NOW()
+            FROM scans s,
+            LATERAL (
+              SELECT MAX(score) AS top_similarity, COUNT(*) FILTER (WHERE score > :high) AS high_risk_count
+              FROM results WHERE scan_id = s.scan_id
+            ) r
+            WHERE ss.scan_id = :scan_id AND s.scan_id = ss.scan_id
+            """
+        ),
+        {"scan_id": scan_id, "high": HIGH_RISK_SCORE},
+    )
+
+
+async def add_scored_pairs(session: AsyncSession, *, scan_id: str, n: int) -> Tuple[int, Optional[int]]:
+    """Atomically add n newly scored pairs; returns (pairs_scored, pairs_total).
+
+    Progress (capped at 99 until the scan is marked DONE) is updated in the
+    same statement.
+    """
     res = await session.execute(
-        text("SELECT COUNT(*)::int AS n FROM results WHERE scan_id = :scan_id"),
-        {"scan_id": scan_id},
+        text(
+            """
+            UPDATE scans
+            SET
+              pairs_scored = pairs_scored + :n,
+              progress = CASE
+                WHEN COALESCE(pairs_total, 0) > 0
+                  THEN GREATEST(progress, LEAST(99, ROUND((pairs_scored + :n) * 100.0 / pairs_total)::int))
+                ELSE progress
+              END
+            WHERE scan_id = :scan_id
+            RETURNING pairs_scored, pairs_total
+            """
+        ),
+        {"scan_id": scan_id, "n": n},
     )
-    return int(res.scalar_one())
+    row = res.mappings().one()
+    total = row["pairs_total"]
+    return int(row["pairs_scored"]), int(total) if total is not None else None
 
 
-async def get_total_pairs(session: AsyncSession, *, scan_id: str) -> Optional[int]:
+async def try_record_threshold_join(session: AsyncSession, *, scan_id: str, stats: Dict[str, Any]) -> bool:
+    """Store a scan's thresholded-join aggregates once; False if already recorded (redelivery)."""
     res = await session.execute(
-        text("SELECT NULLIF(params_json->>'total_pairs','')::int AS total_pairs FROM scans WHERE scan_id = :scan_id"),
-        {"scan_id": scan_id},
+        text(
+            """
+            UPDATE scans
+            SET params_json = params_json || jsonb_build_object('threshold_join', CAST(:stats AS jsonb))
+            WHERE scan_id = :scan_id
+              AND params_json->'threshold_join' IS NULL
+            RETURNING scan_id
+            """
+        ),
+        {"scan_id": scan_id, "stats": json.dumps(stats)},
     )
-    val = res.scalar_one_or_none()
-    return int(val) if val is not None else None
+    return res.first() is not None
 
 
 async def try_mark_done_emitted(session: AsyncSession, *, scan_id: str) -> bool:
@@ -226,6 +419,7 @@ async def try_mark_done_emitted(session: AsyncSession, *, scan_id: str) -> bool:
             UPDATE scans
             SET params_json = params_json || jsonb_build_object('done_emitted', true)
             WHERE scan_id = :scan_id
+              AND pairs_scored >= COALESCE(pairs_total, 0)
               AND COALESCE((params_json->>'done_emitted')::boolean, false) = false
             RETURNING scan_id
             """
@@ -235,6 +429,153 @@ async def try_mark_done_emitted(session: AsyncSession, *, scan_id: str) -> bool:
     return res.first() is not None
 
 
+async def index_fingerprints(
+    session: AsyncSession,
+    *,
+    fingerprints: Dict[str, Sequence[int]],
+    max_postings: int,
+) -> int:
+    """Add checksums to the cross-scan inverted index (once per checksum).
+
+    Every hash bumps its document frequency, but a posting is only stored
+    while the hash's list is shorter than max_postings. All checksums go in
+    one statement whose rows are sorted per table (checksum, then hash), so
+    concurrent workers take row locks in the same order. Returns how many
+    checksums were newly indexed.
+    """
+    if not fingerprints:
+        return 0
+    checksums = sorted(fingerprints)
+    idx: List[int] = []
+    hashes: List[int] = []
+    for i, checksum in enumerate(checksums, start=1):
+        distinct = sorted(set(fingerprints[checksum]))
+        idx.extend([i] * len(distinct))
+        hashes.extend(distinct)
+
+    res = await session.execute(
+        text(
+            """
+            WITH claimed AS (
+              INSERT INTO fingerprint_indexed(checksum)
+              SELECT c FROM unnest(CAST(:checksums AS text[])) AS c ORDER BY c
+              ON CONFLICT (checksum) DO NOTHING
+              RETURNING checksum
+            ),
+            new_postings AS (
+              SELECT t.h AS hash, (CAST(:checksums AS text[]))[t.i] AS checksum
+              FROM unnest(CAST(:idx AS int[]), CAST(:hashes AS bigint[])) AS t(i, h)
+              WHERE (CAST(:checksums AS text[]))[t.i] IN (SELECT checksum FROM claimed)
+            ),
+            counts AS (
+              SELECT hash, count(*) AS n FROM new_postings GROUP BY hash
+            ),
+            df AS (
+              INSERT INTO fingerprint_df(hash, df)
+              SELECT hash, n FROM counts ORDER BY hash
+              ON CONFLICT (hash) DO UPDATE SET df = fingerprint_df.df + EXCLUDED.df
+              RETURNING hash, df
+            ),
+            ranked AS (
+              -- df each posting would have seen had the checksums been added one by one
+              SELECT p.hash, p.checksum,
+                     df.df - counts.n + row_number() OVER (PARTITION BY p.hash ORDER BY p.checksum) AS seen_df
+              FROM new_postings p
+              JOIN counts USING (hash)
+              JOIN df USING (hash)
+            ),
+            postings AS (
+              INSERT INTO fingerprint_postings(hash, checksum)
+              SELECT hash, checksum FROM ranked WHERE seen_df <= :max_postings ORDER BY hash, checksum
+              ON CONFLICT (hash, checksum) DO NOTHING
+            )
+            SELECT count(*) FROM claimed
+            """
+        ),
+        {"checksums": checksums, "idx": idx, "hashes": hashes, "max_postings": max_postings},
+    )
+    return int(res.scalar_one())
+
+
+async def find_similar_checksums(
+    session: AsyncSession,
+    *,
+    queries: Dict[str, Sequence[int]],
+    exclude_checksums: Sequence[str],
+    max_df: int,
+    min_shared: int,
+    top_k: int,
+) -> List[Dict[str, Any]]:
+    """Top-k indexed checksums per query checksum, ranked by shared fingerprints.
+
+    Hashes whose document frequency exceeds max_df (boilerplate) are ignored.
+    """
+    q_checksums: List[str] = []
+    q_hashes: List[int] = []
+    for checksum, hashes in queries.items():
+        for h in set(hashes):
+            q_checksums.append(checksum)
+            q_hashes.append(h)
+    if not q_hashes:
+        return []
+
+    res = await session.execute(
+        text(
+            """
+            WITH q AS (
+              SELECT * FROM unnest(CAST(:q_checksums AS text[]), CAST(:q_hashes AS bigint[])) AS t(query, hash)
+            ),
+            m AS (
+              SELECT q.query, p.checksum, COUNT(*)::int AS shared
+              FROM q
+              JOIN fingerprint_df d ON d.hash = q.hash AND d.df <= :max_df
+              JOIN fingerprint_postings p ON p.hash = q.hash
+              WHERE NOT (p.checksum = ANY(CAST(:exclude AS text[])))
+              GROUP BY q.query, p.checksum
+              HAVING COUNT(*) >= :min_shared
+            ),
+            r AS (
+              SELECT m.*, ROW_NUMBER() OVER (PARTITION BY m.query ORDER BY m.shared DESC, m.checksum) AS rn
+              FROM m
+            )
+            SELECT query, checksum, shared FROM r WHERE rn <= :top_k
+            """
+        ),
+        {
+            "q_checksums": q_checksums,
+            "q_hashes": q_hashes,
+            "exclude": list(exclude_checksums),
+            "max_df": max_df,
+            "min_shared": min_shared,
+            "top_k": top_k,
+        },
+    )
+    return [dict(r) for r in res.mappings().all()]
+
+
+async def latest_files_for_checksums(
+    session: AsyncSession,
+    *,
+    checksums: Sequence[str],
+    exclude_scan_id: str,
+) -> List[Dict[str, Any]]:
+    """Most recent file row per checksum from scans other than exclude_scan_id."""
+    if not checksums:
+        return []
+    res = await session.execute(
+        text(
+            """
+            SELECT DISTINCT ON (checksum) id, scan_id, filename, object_key, checksum, language, size, created_at
+            FROM files
+            WHERE checksum = ANY(CAST(:checksums AS text[])) AND scan_id <> :scan_id
+            ORDER BY checksum, id DESC
+            """
+        ),
+        {"checksums": list(checksums), "scan_id": exclude_scan_id},
+    )
+    return [dict(r) for r in res.mappings().all()]
+
+
 async def insert_alert(
     session: AsyncSession,
     *,
@@ -308,6 +649,17 @@ async def get_file_by_scan_and_name(session: AsyncSession, *, scan_id: str, file
     return dict(row) if row else None
 
 
+async def referenced_object_keys(session: AsyncSession, *, object_keys: Sequence[str]) -> Set[str]:
+    """The subset of object_keys still used by some files row (blob GC)."""
+    if not object_keys:
+        return set()
+    res = await session.execute(
+        text("SELECT DISTINCT object_key FROM files WHERE object_key = ANY(CAST(:keys AS text[]))"),
+        {"keys": list(object_keys)},
+    )
+    return set(res.scalars().all())
+
+
 async def list_results_pairs_for_scan(session: AsyncSession, *, scan_id: str, limit: int = 5000) -> List[Dict[str, Any]]:
     res = await session.execute(
         text(
@@ -330,30 +682,191 @@ async def list_results_pairs_for_scan(session: AsyncSession, *, scan_id: str, li
     return [dict(r) for r in res.mappings().all()]
 
 
+def _results_filter_sql(
+    *,
+    min_score: Optional[float],
+    label: Optional[str],
+    search: Optional[str],
+) -> Tuple[str, Dict[str, Any]]:
+    """Extra WHERE terms (over results r, files fa/fb) for the results filters."""
+    terms: List[str] = []
+    params: Dict[str, Any] = {}
+    if min_score is not None:
+        terms.append("r.score >= :min_score")
+        params["min_score"] = min_score
+    if label is not None:
+        lo, hi = LABEL_SCORE_RANGES[label]
+        if lo is not None:
+            terms.append("r.score > :label_lo")
+            params["label_lo"] = lo
+        if hi is not None:
+            terms.append("r.score <= :label_hi")
+            params["label_hi"] = hi
+    if search:
+        escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        terms.append("(fa.filename ILIKE :search OR fb.filename ILIKE :search)")
+        params["search"] = f"%{escaped}%"
+    return "".join(f" AND {t}" for t in terms), params
+
+
+async def list_results_page(
+    session: AsyncSession,
+    *,
+    scan_id: str,
+    min_score: Optional[float] = None,
+    label: Optional[str] = None,
+    search: Optional[str] = None,
+    after: Optional[Tuple[float, int]] = None,
+    limit: int = 100,
+) -> List[Dict[str, Any]]:
+    """One keyset page of results by (score, id) descending, strictly after ``after``."""
+    where, params = _results_filter_sql(min_score=min_score, label=label, search=search)
+    if after is not None:
+        where += " AND (r.score, r.id) < (:after_score, :after_id)"
+        params.update(after_score=after[0], after_id=after[1])
+    res = await session.execute(
+        text(
+            f"""
+            SELECT
+              r.id,
+              r.score,
+              r.details_json,
+              fa.filename AS file_a,
+              fb.filename AS file_b
+            FROM results r
+            JOIN files fa ON fa.id = r.file_a_id
+            JOIN files fb ON fb.id = r.file_b_id
+            WHERE r.scan_id = :scan_id{where}
+            ORDER BY r.score DESC, r.id DESC
+            LIMIT :lim
+            """
+        ),
+        {"scan_id": scan_id, "lim": limit, **params},
+    )
+    return [dict(r) for r in res.mappings().all()]
+
+
+async def iter_results_export(
+    session: AsyncSession,
+    *,
+    scan_id: str,
+    with_details: bool = False,
+    batch_size: int = 5000,
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """All results of a scan with both files' metadata, in batches from a server-side cursor."""
+    details = "r.details_json," if with_details else ""
+    result = await session.stream(
+        text(
+            f"""
+            SELECT
+              r.score,
+              {details}
+              fa.id AS file_a_id, fa.filename AS file_a, fa.language AS language_a,
+              fa.size AS size_a, fa.checksum AS checksum_a,
+              fb.id AS file_b_id, fb.filename AS file_b, fb.language AS language_b,
+              fb.size AS size_b, fb.checksum AS checksum_b
+            FROM results r
+            JOIN files fa ON fa.id = r.file_a_id
+            JOIN files fb ON fb.id = r.file_b_id
+            WHERE r.scan_id = :scan_id
+            ORDER BY r.score DESC, r.id DESC
+            """
+        ).execution_options(yield_per=batch_size),
+        {"scan_id": scan_id},
+    )
+    async for rows in result.mappings().partitions(batch_size):
+        yield [dict(r) for r in rows]
+
+
+async def results_stats(
+    session: AsyncSession,
+    *,
+    scan_id: str,
+    min_score: Optional[float] = None,
+    label: Optional[str] = None,
+    search: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Count, top/average score and per-label counts over the filtered results."""
+    where, params = _results_filter_sql(min_score=min_score, label=label, search=search)
+    # The file joins are only needed for filename search.
+    joins = "JOIN files fa ON fa.id = r.file_a_id JOIN files fb ON fb.id = r.file_b_id" if search else ""
+    res = await session.execute(
+        text(
+            f"""
+            SELECT
+              COUNT(*)::int AS n_pairs,
+              COALESCE(MAX(r.score), 0)::float8 AS top_similarity,
+              COALESCE(AVG(r.score), 0)::float8 AS avg_similarity,
+              COUNT(*) FILTER (WHERE r.score > :high)::int AS high,
+              COUNT(*) FILTER (WHERE r.score > :medium AND r.score <= :high)::int AS medium,
+              COUNT(*) FILTER (WHERE r.score <= :medium)::int AS low
+            FROM results r
+            {joins}
+            WHERE r.scan_id = :scan_id{where}
+            """
+        ),
+        {
+            "scan_id": scan_id,
+            "high": LABEL_SCORE_RANGES["high"][0],
+            "medium": LABEL_SCORE_RANGES["medium"][0],
+            **params,
+        },
+    )
+    row = dict(res.mappings().one())
+    return {
+        "n_pairs": row["n_pairs"],
+        "top_similarity": row["top_similarity"],
+        "avg_similarity": row["avg_similarity"],
+        "labels": {"high": row["high"], "medium": row["medium"], "low": row["low"]},
+    }
+
+
+async def score_histogram(session: AsyncSession, *, scan_id: str, buckets: int = 10) -> List[int]:
+    """Number of result pairs per equal-width score bucket (the last one includes 100)."""
+    res = await session.execute(
+        text(
+            """
+            SELECT LEAST(width_bucket(score, 0, 100, :buckets), :buckets) AS bucket, COUNT(*) AS n
+            FROM results
+            WHERE scan_id = :scan_id
+            GROUP BY 1
+            """
+        ),
+        {"scan_id": scan_id, "buckets": buckets},
+    )
+    counts = [0] * buckets
+    for r in res.mappings().all():
+        counts[max(1, int(r["bucket"])) - 1] += int(r["n"])
+    return counts
+
+
 async def list_scans_summary(session: AsyncSession, *, limit: int = 50) -> List[Dict[str, Any]]:
-        # Summary computed on read (keeps schema minimal).
+        # Newest summaries come from idx_scan_summaries_created_at; scans only adds status/progress.
         res = await session.execute(
                 text(
                         """
                         SELECT
-                            s.scan_id,
-                            s.created_at,
+                            ss.scan_id,
+                            ss.created_at,
                             s.status,
                             s.progress,
-                            COALESCE(NULLIF(s.params_json->>'runtime_ms','')::int, 0) AS runtime_ms,
-                            COUNT(DISTINCT f.id)::int AS file_count,
+                            ss.runtime_ms,
+                            ss.file_count,
                             COALESCE(
-                                NULLIF(s.params_json->>'total_pairs','')::int,
-                                ((COUNT(DISTINCT f.id) * GREATEST(COUNT(DISTINCT f.id) - 1, 0)) / 2)::int
+                                ss.pair_count,
+                                s.pairs_total,
+                                ((ss.file_count * GREATEST(ss.file_count - 1, 0)) / 2)::int
                             ) AS pair_count,
-                            COALESCE(MAX(r.score), 0)::float8 AS top_similarity,
-                            COALESCE(SUM(CASE WHEN r.score > 70 THEN 1 ELSE 0 END), 0)::int AS high_risk_count
-                        FROM scans s
-                        LEFT JOIN files f ON f.scan_id = s.scan_id
-                        LEFT JOIN results r ON r.scan_id = s.scan_id
-                        GROUP BY s.scan_id
-                        ORDER BY s.created_at DESC
-                        LIMIT :lim
+                            ss.top_similarity,
+                            ss.high_risk_count
+                        FROM (
+                            SELECT scan_id, created_at, file_count, pair_count, top_similarity, high_risk_count, runtime_ms
+                            FROM scan_summaries
+                            ORDER BY created_at DESC
+                            LIMIT :lim
+                        ) ss
+                        JOIN scans s ON s.scan_id = ss.scan_id
+                        ORDER BY ss.created_at DESC
                         """
                 ),
                 {"lim": limit},
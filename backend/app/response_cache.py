@@ -0,0 +1,141 @@
+"""Serialized responses of completed scans, cached in Redis with strong ETags.
+
+A finished scan's results and file contents never change, so their JSON is
+serialized once, stored (with a gzip copy when worth it) under
+``resp:{scan_id}:{name}`` and served as-is. Clients and proxies revalidate
+with ``If-None-Match`` and get a 304 without any Postgres/MinIO work. The
+gzip body is a different representation, so it carries its own strong ETag
+(``"<tag>-gz"``). Entries are never invalidated: they only exist for scans
+that can no longer change, and expire with their TTL.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import logging
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .redis_cache import response_key
+
+
+logger = logging.getLogger("plagcode.response_cache")
+
+# Below this size gzip saves too little to be worth a second copy.
+GZIP_MIN_BYTES = 1024
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    etag: str
+    body: bytes
+    gzip_body: Optional[bytes] = None
+
+
+def strong_etag(body: bytes) -> str:
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def build_cached(body: bytes, *, etag: Optional[str] = None) -> CachedResponse:
+    gz = gzip.compress(body, compresslevel=6, mtime=0) if len(body) >= GZIP_MIN_BYTES else None
+    if gz is not None and len(gz) >= len(body):
+        gz = None
+    return CachedResponse(etag=etag or strong_etag(body), body=body, gzip_body=gz)
+
+
+def gzip_etag(etag: str) -> str:
+    """ETag of the gzip-encoded representation of a body tagged ``etag``."""
+    return etag[:-1] + '-gz"'
+
+
+def accepts_gzip(request: Request) -> bool:
+    """Whether Accept-Encoding allows gzip (q-values honoured, gzip;q=0 refuses it)."""
+    wildcard = None
+    for item in request.headers.get("accept-encoding", "").split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return q > 0
+        if coding == "*":
+            wildcard = q > 0
+    return bool(wildcard)
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match names either representation of the body tagged ``etag``."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag in tags or gzip_etag(etag) in tags
+
+
+def held_etag(request: Request, etag: str) -> str:
+    """Which representation's tag to revalidate when the body is not at hand."""
+    tags = {tag.strip().removeprefix("W/") for tag in request.headers.get("if-none-match", "").split(",")}
+    return gzip_etag(etag) if gzip_etag(etag) in tags and accepts_gzip(request) else etag
+
+
+def _variant_headers(etag: str, cache_control: str) -> dict:
+    return {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+
+
+def not_modified(etag: str, cache_control: str) -> Response:
+    return Response(status_code=304, headers=_variant_headers(etag, cache_control))
+
+
+def to_response(request: Request, cached: CachedResponse, *, cache_control: str) -> Response:
+    gzipped = cached.gzip_body is not None and accepts_gzip(request)
+    etag = gzip_etag(cached.etag) if gzipped else cached.etag
+    if etag_matches(request, cached.etag):
+        return not_modified(etag, cache_control)
+    headers = _variant_headers(etag, cache_control)
+    body = cached.body
+    if gzipped:
+        body = cached.gzip_body
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+async def get_cached(redis_client, scan_id: str, name: str) -> Optional[CachedResponse]:
+    """The cached response, or None on a miss or when Redis is unavailable."""
+    try:
+        fields = await redis_client.hgetall(response_key(scan_id, name))
+    except Exception:
+        logger.warning("Response cache read failed for scan %s", scan_id, exc_info=True)
+        return None
+    if not fields or b"body" not in fields:
+        return None
+    return CachedResponse(
+        etag=fields[b"etag"].decode("ascii"),
+        body=fields[b"body"],
+        gzip_body=fields.get(b"gzip") or None,
+    )
+
+
+async def put_cached(redis_client, scan_id: str, name: str, cached: CachedResponse, *, ttl_s: int) -> None:
+    key = response_key(scan_id, name)
+    mapping = {"etag": cached.etag, "body": cached.body}
+    if cached.gzip_body is not None:
+        mapping["gzip"] = cached.gzip_body
+    try:
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=mapping)
+            pipe.expire(key, ttl_s)
+            await pipe.execute()
+    except Exception:
+        logger.warning("Response cache write failed for scan %s", scan_id, exc_info=True)
+
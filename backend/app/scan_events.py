@@ -0,0 +1,96 @@
+"""Fan-out of Postgres ``scan_events`` notifications to in-process subscribers.
+
+``trg_scans_notify`` NOTIFYs on every status/progress change of a scan and
+``trg_scan_logs_notify`` on every new scan_logs row. The API keeps one LISTEN connection per process and
+hands each notification to the queues of the SSE streams watching that scan,
+so watchers cost no database reads after their initial snapshot.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+
+import asyncpg
+
+
+logger = logging.getLogger("plagcode.scan_events")
+
+CHANNEL = "scan_events"
+
+
+class ScanEventHub:
+    def __init__(self, dsn: str, *, queue_size: int = 1000, reconnect_delay_s: float = 2.0) -> None:
+        self.dsn = dsn
+        self.queue_size = queue_size
+        self.reconnect_delay_s = reconnect_delay_s
+        self._subscribers: Dict[str, Set[asyncio.Queue]] = defaultdict(set)
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def subscribe(self, scan_id: str) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[scan_id].add(q)
+        return q
+
+    def unsubscribe(self, scan_id: str, q: asyncio.Queue) -> None:
+        subs = self._subscribers.get(scan_id)
+        if subs is None:
+            return
+        subs.discard(q)
+        if not subs:
+            del self._subscribers[scan_id]
+
+    def _dispatch(self, event: Dict[str, Any]) -> None:
+        for q in list(self._subscribers.get(str(event.get("scan_id")), ())):
+            try:
+                q.put_nowait(event)
+            except asyncio.QueueFull:
+                # A stalled client: drop its backlog and make it resume from its Last-Event-ID.
+                logger.warning("Dropping scan events for slow subscriber of %s", event.get("scan_id"))
+                while not q.empty():
+                    q.get_nowait()
+                q.put_nowait({"scan_id": event.get("scan_id"), "type": "reconnect"})
+
+    def _on_notify(self, _conn, _pid, _channel, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            logger.warning("Ignoring malformed scan event: %r", payload)
+            return
+        self._dispatch(event)
+
+    async def _run(self) -> None:
+        while True:
+            conn = None
+            try:
+                conn = await asyncpg.connect(self.dsn)
+                lost = asyncio.Event()
+                conn.add_termination_listener(lambda _c: lost.set())
+                await conn.add_listener(CHANNEL, self._on_notify)
+                logger.info("Listening for %s notifications", CHANNEL)
+                await lost.wait()
+                logger.warning("%s listener connection lost, reconnecting", CHANNEL)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("%s listener failed, retrying in %.1fs", CHANNEL, self.reconnect_delay_s)
+            finally:
+                if conn is not None and not conn.is_closed():
+                    await conn.close()
+            # Streams re-sync from their Last-Event-ID; tell them to reconnect.
+            for scan_id in list(self._subscribers):
+                self._dispatch({"scan_id": scan_id, "type": "reconnect"})
+            await asyncio.sleep(self.reconnect_delay_s)
@@ -1,7 +1,8 @@
 from __future__ import annotations
 
+import hashlib
 import re
-from typing import Iterable, List, Sequence, Set
+from typing import AbstractSet, Iterable, List, Sequence, Set
 
 
 _TOKEN_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|==|!=|<=|>=|->|\+\+|--|&&|\|\||[{}()\[\];,.:+\-*/%<>=]", re.M)
@@ -23,6 +24,11 @@ def tokenize(text: str) -> List[str]:
     return _TOKEN_RE.findall(text)
 
 
+def token_hash(token: str) -> int:
+    # Stable 64-bit token hash (Python's hash() is salted per process).
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
 def jaccard_percent(tokens_a: Sequence[str], tokens_b: Sequence[str]) -> float:
     if not tokens_a and not tokens_b:
         return 100.0
@@ -36,3 +42,20 @@ def jaccard_percent(tokens_a: Sequence[str], tokens_b: Sequence[str]) -> float:
     if uni == 0:
         return 0.0
     return (inter / uni) * 100.0
+
+
+def jaccard_percent_sets(set_a: AbstractSet, set_b: AbstractSet, *, empty_score: float = 100.0) -> float:
+    # Same result as jaccard_percent, for callers that already hold the sets.
+    # empty_score is what two empty sets score: 100 for token sets (two empty
+    # files are identical), 0 for fingerprints (a file shorter than k tokens
+    # has none, which is no evidence of copying).
+    if not set_a and not set_b:
+        return empty_score
+    if not set_a or not set_b:
+        return 0.0
+
+    inter = len(set_a & set_b)
+    uni = len(set_a) + len(set_b) - inter
+    if uni == 0:
+        return 0.0
+    return (inter / uni) * 100.0
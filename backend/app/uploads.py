@@ -0,0 +1,88 @@
+"""Bounded-memory upload handling for POST /api/scan.
+
+- ``UploadSizeLimitMiddleware`` rejects oversized requests from their
+  Content-Length, and stops reading a (chunked) body once it passes the limit
+- ``hash_file`` computes an uploaded part's SHA-256 chunk by chunk (it
+  names the content-addressed blob) while enforcing the per-file limit
+"""
+from __future__ import annotations
+
+import hashlib
+from typing import BinaryIO, Iterable, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+
+
+class FileTooLarge(Exception):
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(f"File exceeds {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class HashingReader:
+    """File-like ``read`` wrapper: sha256 and size of everything read through it."""
+
+    def __init__(self, raw: BinaryIO, *, max_bytes: int) -> None:
+        self._raw = raw
+        self._sha = hashlib.sha256()
+        self.max_bytes = max_bytes
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._raw.read(n)
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            raise FileTooLarge(self.max_bytes)
+        self._sha.update(data)
+        return data
+
+    def hexdigest(self) -> str:
+        return self._sha.hexdigest()
+
+
+def hash_file(raw: BinaryIO, *, max_bytes: int, chunk_size: int = 1 << 20) -> Tuple[str, int]:
+    """(sha256 hex, size) of a file object read to the end; raises FileTooLarge past max_bytes."""
+    reader = HashingReader(raw, max_bytes=max_bytes)
+    while reader.read(chunk_size):
+        pass
+    return reader.hexdigest(), reader.size
+
+
+def _too_large(max_bytes: int) -> str:
+    return f"Upload exceeds {max_bytes} bytes"
+
+
+class UploadSizeLimitMiddleware:
+    """Caps the request body size of the given POST paths (ASGI middleware)."""
+
+    def __init__(self, app, *, max_bytes: int, paths: Iterable[str]) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or ())
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            response = JSONResponse({"detail": _too_large(self.max_bytes)}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Raised inside body parsing; FastAPI re-raises HTTPExceptions as-is.
+                    raise HTTPException(status_code=413, detail=_too_large(self.max_bytes))
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -0,0 +1,104 @@
+"""Garbage collection of content-addressed upload blobs.
+
+Blobs under ``blobs/sha256/`` are shared by every files row with the same
+checksum, so they can only go once no row references them. An upload is
+written to MinIO before its files rows commit, and an upload that reuses a
+blob touches it first (refreshing last_modified): the grace period keeps
+both out of reach of the sweep. Since a listing can be older than such a
+touch, candidates are re-checked for references and re-stat'ed right before
+they are deleted.
+
+Runs periodically, or once with ``python -m app.workers.blob_gc --once``.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import sys
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List
+
+from ..config import get_settings
+from ..db import ensure_schema, make_engine, make_sessionmaker
+from ..logging_utils import configure_logging
+from ..minio_client import BLOB_PREFIX, AsyncMinio, MinioConfig, make_client
+from ..repository import referenced_object_keys
+
+logger = logging.getLogger("plagcode.blob_gc")
+
+
+async def _still_stale(storage, *, bucket: str, object_keys: List[str], cutoff: datetime) -> List[str]:
+    """Keys whose blob still exists and was not touched since the cutoff."""
+    modified = await asyncio.gather(
+        *(storage.last_modified(bucket=bucket, object_key=key) for key in object_keys)
+    )
+    return [key for key, m in zip(object_keys, modified) if m is not None and m < cutoff]
+
+
+async def collect_garbage(*, storage, SessionLocal, bucket: str, grace_s: int, batch_size: int) -> Dict[str, int]:
+    """Delete unreferenced blobs older than grace_s; returns scan statistics."""
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_s)
+    stats = {"scanned": 0, "deleted": 0, "skipped": 0, "failed": 0}
+    async for batch in storage.iter_object_batches(bucket=bucket, prefix=BLOB_PREFIX, batch_size=batch_size):
+        stats["scanned"] += len(batch)
+        old = [key for key, modified in batch if modified is not None and modified < cutoff]
+        if not old:
+            continue
+        async with SessionLocal() as session:
+            referenced = await referenced_object_keys(session, object_keys=old)
+        unreferenced = [key for key in old if key not in referenced]
+        # After the reference check: a blob reused since the listing was touched.
+        orphans = await _still_stale(storage, bucket=bucket, object_keys=unreferenced, cutoff=cutoff)
+        stats["skipped"] += len(unreferenced) - len(orphans)
+        failed = await storage.remove_objects(bucket=bucket, object_keys=orphans)
+        stats["deleted"] += len(orphans) - len(failed)
+        stats["failed"] += len(failed)
+        for key in failed:
+            logger.warning("Failed to delete orphaned blob %s", key)
+    return stats
+
+
+async def main() -> None:
+    settings = get_settings()
+    configure_logging(settings.plagcode_log_level)
+    once = "--once" in sys.argv[1:]
+
+    engine = make_engine(settings.postgres_dsn)
+    await ensure_schema(engine)
+    SessionLocal = make_sessionmaker(engine)
+
+    minio_cfg = MinioConfig(
+        endpoint=settings.minio_endpoint,
+        access_key=settings.minio_access_key,
+        secret_key=settings.minio_secret_key,
+        secure=settings.minio_secure,
+        bucket=settings.minio_bucket,
+        max_pool_connections=settings.minio_max_workers,
+    )
+    storage = AsyncMinio(make_client(minio_cfg), max_workers=settings.minio_max_workers)
+
+    logger.info("Blob GC started (grace %ss, interval %ss)", settings.blob_gc_grace_s, settings.blob_gc_interval_s)
+
+    try:
+        while True:
+            try:
+                stats = await collect_garbage(
+                    storage=storage,
+                    SessionLocal=SessionLocal,
+                    bucket=settings.minio_bucket,
+                    grace_s=settings.blob_gc_grace_s,
+                    batch_size=settings.blob_gc_batch_size,
+                )
+                logger.info("Blob GC pass: %s", stats)
+            except Exception:
+                logger.exception("Blob GC pass failed")
+            if once:
+                return
+            await asyncio.sleep(settings.blob_gc_interval_s)
+    finally:
+        await engine.dispose()
+        storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
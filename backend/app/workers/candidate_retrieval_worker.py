@@ -2,21 +2,39 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any, Dict, List
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Tuple
 
+from ..artifact import ARTIFACT_VERSION, read_artifact
 from ..config import get_settings
 from ..db import ensure_schema, make_engine, make_sessionmaker
-from ..kafka import make_consumer, make_envelope, make_producer, stable_sha256_hex
+from ..kafka import dumps, make_consumer, make_envelope, make_producer, send_many, stable_sha256_hex
+from ..live_results import publish_file_names, publish_new_results
+from ..fingerprinting import as_bigint
 from ..logging_utils import configure_logging
+from ..minhash import LSHIndex, signature_from_bytes
+from ..redis_cache import artifact_key, make_redis, minhash_key
 from ..repository import (
     append_scan_log,
-    count_files_normalized,
+    find_similar_checksums,
+    get_scan,
+    index_fingerprints,
+    latest_files_for_checksums,
     list_files_for_scan,
     mark_file_normalized,
     try_mark_pairs_generated,
     update_scan_status_progress,
+    upsert_results,
+)
+from .common import (
+    ScanLogBuffer,
+    class_representative,
+    complete_scan,
+    equivalence_classes,
+    handle_fatal,
+    parse_scan_options,
+    record_progress,
 )
-from .common import handle_fatal
 
 logger = logging.getLogger("plagcode.candidate_retrieval")
 
@@ -27,6 +45,459 @@ def _pairwise(file_rows: List[Dict[str, Any]]):
             yield file_rows[i], file_rows[j]
 
 
+def _class_size(f: Dict[str, Any]) -> int:
+    return len(f.get("members") or ()) or 1
+
+
+def _lsh_params(settings, options: Dict[str, Any], n_files: int) -> Optional[Tuple[int, int]]:
+    """(bands, rows) when this scan should use LSH banding, None for all pairs."""
+    strategy = options.get("candidate_strategy")
+    if strategy == "all_pairs":
+        return None
+    if strategy != "lsh" and n_files < settings.lsh_min_files:
+        return None
+    bands = int(options.get("lsh_bands") or settings.lsh_bands)
+    rows = int(options.get("lsh_rows") or settings.lsh_rows)
+    return bands, rows
+
+
+async def _lsh_pairs(
+    redis_client,
+    file_rows: List[Dict[str, Any]],
+    *,
+    bands: int,
+    rows: int,
+) -> Optional[List[Tuple[Dict[str, Any], Dict[str, Any]]]]:
+    """Pairs colliding in at least one band, or None if a signature is unusable."""
+    raw = await redis_client.mget([minhash_key(f["checksum"]) for f in file_rows])
+    index = LSHIndex(bands=bands, rows=rows)
+    for f, data in zip(file_rows, raw):
+        if data is None:
+            return None
+        sig = signature_from_bytes(data)
+        if len(sig) < bands * rows:
+            return None
+        index.insert(int(f["id"]), sig)
+
+    by_id = {int(f["id"]): f for f in file_rows}
+    return [(by_id[a], by_id[b]) for a, b in sorted(index.candidate_pairs())]
+
+
+async def _load_fingerprints(redis_client, checksums: List[str], settings) -> Dict[str, List[int]]:
+    """BIGINT fingerprint hashes per checksum (checksums without cached fingerprints are skipped)."""
+    checksums = list(dict.fromkeys(checksums))
+    raw = await redis_client.mget(
+        [artifact_key(c, ARTIFACT_VERSION, settings.winnow_k, settings.winnow_window) for c in checksums]
+    )
+    return {c: as_bigint(read_artifact(r).fp_hashes) for c, r in zip(checksums, raw) if r is not None}
+
+
+async def _historical_pairs(
+    *,
+    scan_id: str,
+    file_rows: List[Dict[str, Any]],
+    fingerprints: Dict[str, List[int]],
+    top_k: int,
+    settings,
+    redis_client,
+    session,
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Pair each file with its top-k matches among previously indexed submissions."""
+    matches = await find_similar_checksums(
+        session,
+        queries=fingerprints,
+        exclude_checksums=list(fingerprints),
+        max_df=settings.fingerprint_stop_df,
+        min_shared=settings.historical_min_shared,
+        top_k=top_k,
+    )
+    if not matches:
+        return []
+
+    hist_rows = await latest_files_for_checksums(
+        session,
+        checksums=sorted({m["checksum"] for m in matches}),
+        exclude_scan_id=scan_id,
+    )
+    # Only pair with historical files the scorer can still read from Redis.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        for r in hist_rows:
+            pipe.exists(artifact_key(r["checksum"], ARTIFACT_VERSION, settings.winnow_k, settings.winnow_window))
+        cached = await pipe.execute()
+    by_checksum = {
+        r["checksum"]: {**r, "historical_scan_id": str(r["scan_id"])}
+        for r, n in zip(hist_rows, cached)
+        if n
+    }
+
+    matches_by_query: Dict[str, List[str]] = {}
+    for m in matches:
+        matches_by_query.setdefault(m["query"], []).append(m["checksum"])
+
+    pairs = []
+    for f in file_rows:
+        for checksum in matches_by_query.get(f["checksum"], []):
+            hist = by_checksum.get(checksum)
+            if hist is not None:
+                pairs.append((f, hist))
+    return pairs
+
+
+def _use_scan_scoring(settings, options: Dict[str, Any], n_files: int) -> bool:
+    mode = options.get("scoring_mode") or settings.scoring_mode
+    if mode == "pair" or n_files > settings.scan_scoring_max_files:
+        return False
+    if mode == "scan":
+        return True
+    # auto: an explicit LSH request means the caller wants pruned pairs.
+    return options.get("candidate_strategy") != "lsh"
+
+
+def _pair_payload(fa: Dict[str, Any], fb: Dict[str, Any], *, scan_id: str, algorithm: str) -> Dict[str, Any]:
+    a_id = int(fa["id"])
+    b_id = int(fb["id"])
+    # Canonical ordering for idempotence + DB unique constraint.
+    if a_id > b_id:
+        a_id, b_id = b_id, a_id
+        fa, fb = fb, fa
+
+    payload = {
+        "scan_id": scan_id,
+        "pair_id": stable_sha256_hex(scan_id, str(a_id), str(b_id)),
+        "file_a_id": a_id,
+        "file_b_id": b_id,
+        "checksum_a": fa["checksum"],
+        "checksum_b": fb["checksum"],
+        "language_a": fa.get("language"),
+        "language_b": fb.get("language"),
+        "algorithm": algorithm,
+        "historical_scan_id": fa.get("historical_scan_id") or fb.get("historical_scan_id"),
+    }
+    if fa.get("members"):
+        payload["members_a"] = fa["members"]
+    if fb.get("members"):
+        payload["members_b"] = fb["members"]
+    return payload
+
+
+def _candidate_blocks(payloads: List[Dict[str, Any]], *, block_size: int, max_bytes: int):
+    """Split pair payloads into (pairs, class table) blocks.
+
+    A class's member list goes once into the block's table (keyed by the
+    representative's file id) instead of into every pair that involves it. A
+    block closes at block_size pairs, or before its JSON encoding would pass
+    max_bytes.
+    """
+    pairs: List[Dict[str, Any]] = []
+    classes: Dict[str, List[int]] = {}
+    size = 0
+    for p in payloads:
+        pair = {k: v for k, v in p.items() if k not in ("members_a", "members_b")}
+        pair_size = len(dumps(pair))
+        needed = {str(p[f"file_{side}_id"]): p[f"members_{side}"] for side in ("a", "b") if p.get(f"members_{side}")}
+        new = {k: m for k, m in needed.items() if k not in classes}
+        added = pair_size + sum(len(k) + len(dumps(m)) + 4 for k, m in new.items())
+        if pairs and (len(pairs) >= block_size or size + added > max_bytes):
+            yield pairs, classes
+            pairs, classes, size = [], {}, 0
+            new = needed
+            added = pair_size + sum(len(k) + len(dumps(m)) + 4 for k, m in new.items())
+        pairs.append(pair)
+        classes.update(new)
+        size += added
+    if pairs:
+        yield pairs, classes
+
+
+def _candidate_messages(
+    *,
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    algorithm: str,
+    scan_id: str,
+    correlation_id: str,
+    block_size: int,
+    block_max_bytes: int,
+):
+    """(key, envelope) per code.candidates event, or per block of pairs.
+
+    Pair ids and block boundaries only depend on the (ordered) pair list, so a
+    re-run emits the same idempotency keys; the scorer's upsert dedupes pairs.
+    """
+    payloads = [_pair_payload(fa, fb, scan_id=scan_id, algorithm=algorithm) for fa, fb in pairs]
+
+    if block_size <= 1:
+        for p in payloads:
+            idem = stable_sha256_hex("code.candidates", p["pair_id"])
+            yield idem, make_envelope(
+                event_type="code.candidates",
+                scan_id=scan_id,
+                correlation_id=correlation_id,
+                idempotency_key=idem,
+                payload=p,
+            )
+        return
+
+    for block, classes in _candidate_blocks(payloads, block_size=block_size, max_bytes=block_max_bytes):
+        idem = stable_sha256_hex("code.candidates.block", *(p["pair_id"] for p in block))
+        payload: Dict[str, Any] = {"scan_id": scan_id, "algorithm": algorithm, "pairs": block}
+        if classes:
+            payload["classes"] = classes
+        yield idem, make_envelope(
+            event_type="code.candidates.block",
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            idempotency_key=idem,
+            payload=payload,
+        )
+
+
+async def _emit_pairs(
+    *,
+    pairs: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    algorithm: str,
+    scan_id: str,
+    correlation_id: str,
+    settings,
+    producer,
+) -> None:
+    await send_many(
+        producer,
+        settings.topic_candidates,
+        _candidate_messages(
+            pairs=pairs,
+            algorithm=algorithm,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            block_size=settings.candidate_block_size,
+            block_max_bytes=settings.candidate_block_max_bytes,
+        ),
+        max_in_flight=settings.kafka_max_in_flight,
+    )
+
+
+async def _emit_scan(
+    *,
+    file_rows: List[Dict[str, Any]],
+    algorithm: str,
+    min_score: float,
+    scan_id: str,
+    correlation_id: str,
+    settings,
+    producer,
+) -> None:
+    # One event for the whole scan: the scoring worker scores every pair at once.
+    idem = stable_sha256_hex("code.candidates.scan", scan_id)
+    payload: Dict[str, Any] = {"scan_id": scan_id, "algorithm": algorithm, "min_score": min_score}
+    # Larger scans (thresholded joins) would not fit one message: the scorer lists their files itself.
+    if len(file_rows) <= settings.scan_scoring_max_files:
+        payload["files"] = [
+            {"file_id": int(f["id"]), "checksum": f["checksum"], "members": f.get("members")} for f in file_rows
+        ]
+    out = make_envelope(
+        event_type="code.candidates.scan",
+        scan_id=scan_id,
+        correlation_id=correlation_id,
+        idempotency_key=idem,
+        payload=payload,
+    )
+    await producer.send_and_wait(settings.topic_candidates, key=idem, value=out)
+
+
+async def generate_candidates(
+    *,
+    scan_id: str,
+    correlation_id: str,
+    normalized: int,
+    total: int,
+    settings,
+    producer,
+    redis_client,
+    session,
+) -> Tuple[List[Tuple[int, int, float]], Dict[str, List[int]]]:
+    """Generate (and emit) a scan's candidates.
+
+    Returns the new rows written directly, and the fingerprints to add to the
+    cross-scan index once this transaction has committed.
+    """
+    file_rows = await list_files_for_scan(session, scan_id=scan_id)
+    scan = await get_scan(session, scan_id)
+    options = parse_scan_options(((scan or {}).get("params_json") or {}).get("options"))
+    all_pairs = (len(file_rows) * (len(file_rows) - 1)) // 2
+    algorithm = options.get("algorithm") or settings.scoring_algorithm
+
+    # Only one representative per equivalence class is paired and scored.
+    classes = equivalence_classes(file_rows, dedup=settings.dedup_equivalent_files)
+    reps = [class_representative(c) for c in classes]
+    identical = [pair for c in classes for pair in combinations([int(m["id"]) for m in c], 2)]
+
+    min_score = float(options.get("min_score", settings.min_score) or 0)
+    # A thresholded join needs every set at once, so it always scores scan-level.
+    scan_scoring = min_score > 0 or _use_scan_scoring(settings, options, len(reps))
+    pairs = None
+    if not scan_scoring:
+        lsh = _lsh_params(settings, options, len(reps))
+        if lsh is not None:
+            pairs = await _lsh_pairs(redis_client, reps, bands=lsh[0], rows=lsh[1])
+            if pairs is None:
+                await append_scan_log(
+                    session,
+                    scan_id=scan_id,
+                    message="Candidate retrieval: MinHash signatures unavailable, using all pairs",
+                )
+        if pairs is None:
+            pairs = list(_pairwise(reps))
+
+    fingerprints = await _load_fingerprints(redis_client, [f["checksum"] for f in file_rows], settings)
+    top_k = int(options.get("historical_top_k", settings.historical_top_k) or 0)
+    historical = []
+    if top_k > 0:
+        historical = await _historical_pairs(
+            scan_id=scan_id,
+            file_rows=file_rows,
+            fingerprints=fingerprints,
+            top_k=top_k,
+            settings=settings,
+            redis_client=redis_client,
+            session=session,
+        )
+    if scan_scoring:
+        cross_pairs = all_pairs - len(identical)
+    else:
+        cross_pairs = sum(_class_size(fa) * _class_size(fb) for fa, fb in pairs)
+    # Counted in result rows: a representative pair stands for |A| * |B| of them.
+    total_pairs = len(identical) + cross_pairs + len(historical)
+
+    if not await try_mark_pairs_generated(session, scan_id=scan_id, total_pairs=total_pairs):
+        return [], {}
+
+    # Filenames for the live results view (historical matches included).
+    names = {int(f["id"]): f["filename"] for f in file_rows}
+    names.update({int(f["id"]): f["filename"] for pair in historical for f in pair})
+    await publish_file_names(redis_client, scan_id, names, ttl_s=settings.live_results_ttl_s)
+
+    await update_scan_status_progress(
+        session,
+        scan_id=scan_id,
+        status="SCORING",
+        progress=5,
+        params_patch={"normalized_files": normalized, "total_files": total},
+    )
+
+    if total_pairs == 0:
+        # Nothing to score: the scoring worker will never see this scan.
+        await complete_scan(
+            session=session,
+            producer=producer,
+            topic_scored=settings.topic_scored,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            total_pairs=0,
+            message="No candidate pairs (DONE)",
+            keep_log_lines=settings.scan_log_max_lines,
+        )
+        return [], fingerprints
+
+    inserted: List[Tuple[int, int, float]] = []
+
+    if identical:
+        await append_scan_log(
+            session,
+            scan_id=scan_id,
+            message=f"{len(identical)} pair(s) of files identical after normalization, {len(reps)} distinct file(s)",
+        )
+        rows = [
+            (a_id, b_id, 100.0, {"pair_id": stable_sha256_hex(scan_id, str(a_id), str(b_id)), "algorithm": algorithm})
+            for a_id, b_id in identical
+        ]
+        inserted = await upsert_results(session, scan_id=scan_id, rows=rows)
+        await record_progress(
+            session=session,
+            producer=producer,
+            settings=settings,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            inserted=len(inserted),
+        )
+
+    if scan_scoring:
+        if cross_pairs:
+            message = f"Scan-level scoring of {cross_pairs} pair(s)"
+            if min_score > 0:
+                message += f", keeping scores >= {min_score:g}%"
+            await append_scan_log(session, scan_id=scan_id, message=message)
+            await _emit_scan(
+                file_rows=reps,
+                algorithm=algorithm,
+                min_score=min_score,
+                scan_id=scan_id,
+                correlation_id=correlation_id,
+                settings=settings,
+                producer=producer,
+            )
+    else:
+        await append_scan_log(
+            session,
+            scan_id=scan_id,
+            message=f"Generating {len(pairs)} candidate pair(s) ({cross_pairs} file pair(s)) out of {all_pairs}",
+        )
+        await _emit_pairs(
+            pairs=pairs,
+            algorithm=algorithm,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            settings=settings,
+            producer=producer,
+        )
+
+    if historical:
+        await append_scan_log(
+            session,
+            scan_id=scan_id,
+            message=f"Pairing with {len(historical)} historical submission(s)",
+        )
+        await _emit_pairs(
+            pairs=historical,
+            algorithm=algorithm,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            settings=settings,
+            producer=producer,
+        )
+
+    await append_scan_log(session, scan_id=scan_id, message="Candidate retrieval: emitted code.candidates")
+    return inserted, fingerprints
+
+
+async def _index_scan_fingerprints(SessionLocal, *, scan_id: str, fingerprints: Dict[str, List[int]], settings) -> None:
+    """Add a scan's files to the cross-scan index in a short transaction of its own.
+
+    Runs after the candidate commit (the scan already queried the index, so
+    only later scans match against these files) and never fails the scan: a
+    lost indexing pass only means these files are not offered as historical
+    matches.
+    """
+    try:
+        async with SessionLocal() as session:
+            indexed = await index_fingerprints(
+                session,
+                fingerprints=fingerprints,
+                max_postings=settings.fingerprint_max_postings,
+            )
+            await session.commit()
+        logger.info("Indexed %d new checksum(s) of scan %s", indexed, scan_id)
+    except Exception:
+        logger.exception("Fingerprint indexing failed for scan %s", scan_id)
+
+
+async def _flush_idle_logs(SessionLocal, log_buffer: ScanLogBuffer) -> None:
+    try:
+        async with SessionLocal() as session:
+            await log_buffer.flush(session)
+            await session.commit()
+    except Exception:
+        logger.exception("Failed to flush buffered scan log lines")
+
+
 async def main() -> None:
     settings = get_settings()
     configure_logging(settings.plagcode_log_level)
@@ -35,7 +506,12 @@ async def main() -> None:
     await ensure_schema(engine)
     SessionLocal = make_sessionmaker(engine)
 
-    producer = await make_producer(settings.kafka_bootstrap_servers, settings.kafka_client_id)
+    producer = await make_producer(
+        settings.kafka_bootstrap_servers,
+        settings.kafka_client_id,
+        compression_type=settings.kafka_compression_type,
+        envelope_format=settings.kafka_envelope_format,
+    )
     consumer = await make_consumer(
         topic=settings.topic_normalized,
         bootstrap_servers=settings.kafka_bootstrap_servers,
@@ -43,10 +519,31 @@ async def main() -> None:
         client_id=settings.kafka_client_id,
     )
 
+    redis_client = make_redis(settings.redis_url)
+    # Per-file lines are batched; they never gate progress, so losing a
+    # buffered tail on a crash is acceptable.
+    log_buffer = ScanLogBuffer(
+        max_lines=settings.scan_log_flush_lines,
+        max_age_s=settings.scan_log_flush_interval_s,
+    )
+
     logger.info("Candidate-retrieval worker started")
 
     try:
-        async for msg in consumer:
+        while True:
+            # One record per poll (each is committed on its own); an empty
+            # poll flushes the lines an idle worker would otherwise hold.
+            batches = await consumer.getmany(
+                timeout_ms=int(settings.scan_log_flush_interval_s * 1000),
+                max_records=1,
+            )
+            records = [r for partition_records in batches.values() for r in partition_records]
+            if not records:
+                if log_buffer.due():
+                    await _flush_idle_logs(SessionLocal, log_buffer)
+                continue
+
+            msg = records[0]
             event = msg.value
             scan_id = event.get("scan_id")
             correlation_id = event.get("correlation_id") or ""
@@ -55,60 +552,47 @@ async def main() -> None:
             async with SessionLocal() as session:
                 try:
                     file_id = int(payload["file_id"])
-                    await mark_file_normalized(session, file_id=file_id)
-                    await append_scan_log(session, scan_id=scan_id, message=f"Candidate retrieval: file {file_id} normalized")
-
-                    total, normalized = await count_files_normalized(session, scan_id=scan_id)
+                    total, normalized = await mark_file_normalized(
+                        session,
+                        scan_id=scan_id,
+                        file_id=file_id,
+                        norm_checksum=payload.get("norm_checksum"),
+                    )
+                    log_buffer.add(scan_id, f"Candidate retrieval: file {file_id} normalized")
 
                     # Generate candidates only once, when all files are normalized.
-                    if total > 1 and normalized == total:
-                        file_rows = await list_files_for_scan(session, scan_id=scan_id)
-                        total_pairs = (len(file_rows) * (len(file_rows) - 1)) // 2
-
-                        ok = await try_mark_pairs_generated(session, scan_id=scan_id, total_pairs=total_pairs)
-                        if ok:
-                            await update_scan_status_progress(
-                                session,
-                                scan_id=scan_id,
-                                status="SCORING",
-                                progress=5,
-                                params_patch={"normalized_files": normalized, "total_files": total},
-                            )
-                            await append_scan_log(session, scan_id=scan_id, message=f"Generating {total_pairs} candidate pair(s)")
-
-                            for fa, fb in _pairwise(file_rows):
-                                a_id = int(fa["id"])
-                                b_id = int(fb["id"])
-                                # Canonical ordering for idempotence + DB unique constraint.
-                                if a_id > b_id:
-                                    a_id, b_id = b_id, a_id
-                                    fa, fb = fb, fa
-
-                                pair_id = stable_sha256_hex(scan_id, str(a_id), str(b_id))
-                                idem = stable_sha256_hex("code.candidates", pair_id)
-
-                                out = make_envelope(
-                                    event_type="code.candidates",
-                                    scan_id=scan_id,
-                                    correlation_id=correlation_id,
-                                    idempotency_key=idem,
-                                    payload={
-                                        "scan_id": scan_id,
-                                        "pair_id": pair_id,
-                                        "file_a_id": a_id,
-                                        "file_b_id": b_id,
-                                        "checksum_a": fa["checksum"],
-                                        "checksum_b": fb["checksum"],
-                                        "language_a": fa.get("language"),
-                                        "language_b": fb.get("language"),
-                                    },
-                                )
-                                await producer.send_and_wait(settings.topic_candidates, key=idem, value=out)
-
-                            await append_scan_log(session, scan_id=scan_id, message="Candidate retrieval: emitted code.candidates")
+                    identical_rows = []
+                    to_index: Dict[str, List[int]] = {}
+                    generate = total > 1 and normalized == total
+                    if generate or log_buffer.due():
+                        await log_buffer.flush(session)
+                    if generate:
+                        identical_rows, to_index = await generate_candidates(
+                            scan_id=scan_id,
+                            correlation_id=correlation_id,
+                            normalized=normalized,
+                            total=total,
+                            settings=settings,
+                            producer=producer,
+                            redis_client=redis_client,
+                            session=session,
+                        )
 
                     await session.commit()
                     await consumer.commit()
+                    await publish_new_results(
+                        redis_client,
+                        {scan_id: identical_rows},
+                        top_k=settings.live_results_top_k,
+                        ttl_s=settings.live_results_ttl_s,
+                    )
+                    if to_index:
+                        await _index_scan_fingerprints(
+                            SessionLocal,
+                            scan_id=scan_id,
+                            fingerprints=to_index,
+                            settings=settings,
+                        )
                 except Exception as e:
                     await session.rollback()
                     async with SessionLocal() as s2:
@@ -124,6 +608,7 @@ async def main() -> None:
                             original_event=event,
                             record=msg,
                             error_code="CANDIDATE_FAILED",
+                            keep_log_lines=settings.scan_log_max_lines,
                         )
                         await s2.commit()
                     await consumer.commit()
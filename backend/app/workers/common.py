@@ -1,17 +1,147 @@
 from __future__ import annotations
 
 import logging
+import time
 import traceback
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
+import orjson
 from aiokafka.structs import ConsumerRecord
 
 from ..kafka import make_envelope, stable_sha256_hex
-from ..repository import append_scan_log, insert_alert, update_scan_status_progress
+from ..repository import (
+    add_scored_pairs,
+    append_scan_log,
+    append_scan_logs,
+    finalize_scan_summary,
+    insert_alert,
+    prune_scan_logs,
+    try_mark_done_emitted,
+    update_scan_status_progress,
+)
 
 logger = logging.getLogger("plagcode.worker")
 
 
+def parse_scan_options(raw: Any) -> Dict[str, Any]:
+    """Scan options arrive from the upload form as a JSON string (or not at all)."""
+    if isinstance(raw, dict):
+        return raw
+    if not raw:
+        return {}
+    try:
+        parsed = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        logger.warning("Ignoring malformed scan options: %r", raw)
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def equivalence_classes(file_rows: List[Dict[str, Any]], *, dedup: bool) -> List[List[Dict[str, Any]]]:
+    """Files grouped by normalized text (raw checksum when unknown), in id order."""
+    if not dedup:
+        return [[f] for f in file_rows]
+    classes: Dict[str, List[Dict[str, Any]]] = {}
+    for f in file_rows:
+        classes.setdefault(f.get("norm_checksum") or f["checksum"], []).append(f)
+    return list(classes.values())
+
+
+def class_representative(members: List[Dict[str, Any]]) -> Dict[str, Any]:
+    # Lowest id stands for the class; the scorer fans its scores out to "members".
+    if len(members) == 1:
+        return members[0]
+    return {**members[0], "members": [int(m["id"]) for m in members]}
+
+
+class ScanLogBuffer:
+    """Collects per-event log lines and writes them with one INSERT.
+
+    Workers add a line per record and flush when ``due()`` (or before logging
+    something that must follow them), inside the transaction being committed.
+    An idle worker flushes what is left when a poll returns nothing.
+    """
+
+    def __init__(self, *, max_lines: int, max_age_s: float) -> None:
+        self.max_lines = max_lines
+        self.max_age_s = max_age_s
+        self._entries: List[Tuple[str, str]] = []
+        self._first_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, scan_id: str, message: str) -> None:
+        if not self._entries:
+            self._first_at = time.monotonic()
+        self._entries.append((scan_id, message))
+
+    def due(self) -> bool:
+        if not self._entries:
+            return False
+        return len(self._entries) >= self.max_lines or time.monotonic() - self._first_at >= self.max_age_s
+
+    async def flush(self, session) -> None:
+        entries, self._entries = self._entries, []
+        await append_scan_logs(session, entries=entries)
+
+
+async def complete_scan(
+    *,
+    session,
+    producer,
+    topic_scored: str,
+    scan_id: str,
+    correlation_id: str,
+    total_pairs: Optional[int],
+    message: str = "Scoring complete (DONE)",
+    keep_log_lines: int = 0,
+) -> None:
+    """Mark a scan DONE and emit code.scored exactly once.
+
+    With keep_log_lines > 0 only that many of the scan's newest log lines are kept.
+    """
+    await update_scan_status_progress(session, scan_id=scan_id, status="DONE", progress=100, params_patch={})
+    await append_scan_log(session, scan_id=scan_id, message=message)
+    if keep_log_lines > 0:
+        await prune_scan_logs(session, scan_id=scan_id, keep=keep_log_lines)
+    await finalize_scan_summary(session, scan_id=scan_id)
+
+    if await try_mark_done_emitted(session, scan_id=scan_id):
+        idem = stable_sha256_hex("code.scored", scan_id)
+        out = make_envelope(
+            event_type="code.scored",
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            idempotency_key=idem,
+            payload={
+                "scan_id": scan_id,
+                "completed_at_ms": int(time.time() * 1000),
+                "total_pairs": total_pairs,
+            },
+        )
+        await producer.send_and_wait(topic_scored, key=idem, value=out)
+
+
+async def record_progress(*, session, producer, settings, scan_id: str, correlation_id: str, inserted: int) -> None:
+    """Count newly scored pairs and complete the scan when the last one is in."""
+    scored, total_pairs = await add_scored_pairs(session, scan_id=scan_id, n=inserted)
+    if total_pairs is None:
+        return
+
+    # Only the transaction that crosses the total completes the scan.
+    if scored >= total_pairs and scored - inserted < total_pairs:
+        await complete_scan(
+            session=session,
+            producer=producer,
+            topic_scored=settings.topic_scored,
+            scan_id=scan_id,
+            correlation_id=correlation_id,
+            total_pairs=total_pairs,
+            keep_log_lines=settings.scan_log_max_lines,
+        )
+
+
 async def handle_fatal(
     *,
     service: str,
@@ -25,7 +155,13 @@ async def handle_fatal(
     original_event: Dict[str, Any],
     record: Optional[ConsumerRecord] = None,
     error_code: str = "UNHANDLED",
+    keep_log_lines: int = 0,
 ) -> None:
+    """Record a fatal error: alert, FAILED status and a code.deadletter event.
+
+    With keep_log_lines > 0 the failed scan's log is pruned as complete_scan
+    prunes a finished one.
+    """
     tb = traceback.format_exc(limit=50)
     payload = {
         "original_topic": original_topic,
@@ -48,6 +184,9 @@ async def handle_fatal(
         await append_scan_log(session, scan_id=scan_id, message=f"{service} fatal: {error_code}: {err}")
         # Make failure visible to the UI (Postgres is the source of truth).
         await update_scan_status_progress(session, scan_id=scan_id, status="FAILED", progress=100, params_patch={})
+        if keep_log_lines > 0:
+            await prune_scan_logs(session, scan_id=scan_id, keep=keep_log_lines)
+        await finalize_scan_summary(session, scan_id=scan_id)
 
     idempotency_key = stable_sha256_hex("code.deadletter", service, scan_id or "", correlation_id, error_code)
     envelope = make_envelope(
@@ -1,26 +1,63 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import logging
 from typing import Any, Dict
 
-import orjson
-
+from ..artifact import ARTIFACT_VERSION, build_artifact, read_artifact
 from ..config import get_settings
 from ..db import ensure_schema, make_engine, make_sessionmaker
-from ..kafka import make_consumer, make_envelope, make_producer, stable_sha256_hex
+from ..kafka import make_consumer, make_envelope, make_producer, send_many, stable_sha256_hex
 from ..logging_utils import configure_logging
-from ..minio_client import MinioConfig, get_bytes, make_client
-from ..redis_cache import make_redis, norm_key, tokens_key
+from ..minhash import minhash_signature_from_hashes, signature_to_bytes
+from ..minio_client import AsyncMinio, MinioConfig, make_client
+from ..redis_cache import artifact_key, make_redis, minhash_key, norm_checksum_key
 from ..repository import append_scan_log
 from ..repository import update_scan_status_progress
-from ..similarity import normalize_code, tokenize
+from ..similarity import normalize_code
 from .common import handle_fatal
 
 logger = logging.getLogger("plagcode.normalizer")
 
 
-async def process_event(*, event: Dict[str, Any], settings, producer, minio_client, redis_client, session) -> None:
+def _cache_keys(checksum: str, settings) -> Dict[str, str]:
+    # The normalized text itself is not cached: every reader works from the artifact.
+    return {
+        "norm_checksum": norm_checksum_key(checksum),
+        "artifact": artifact_key(checksum, ARTIFACT_VERSION, settings.winnow_k, settings.winnow_window),
+        "minhash": minhash_key(checksum),
+    }
+
+
+async def _normalize_into_cache(raw: bytes, keys: Dict[str, str], *, settings, redis_client) -> str:
+    """Normalize one file into the Redis cache and return the sha256 of its normalized text."""
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError:
+        text = raw.decode("latin-1", errors="replace")
+
+    norm = normalize_code(text)
+    norm_checksum = hashlib.sha256(norm.encode("utf-8")).hexdigest()
+    artifact = build_artifact(norm, k=settings.winnow_k, window=settings.winnow_window)
+    signature = minhash_signature_from_hashes(read_artifact(artifact).unique_hashes, settings.minhash_num_perm)
+
+    # Store bytes to keep redis small-ish and fast.
+    async with redis_client.pipeline(transaction=False) as pipe:
+        pipe.set(keys["norm_checksum"], norm_checksum.encode("ascii"))
+        pipe.set(keys["artifact"], artifact)
+        pipe.set(keys["minhash"], signature_to_bytes(signature))
+        await pipe.execute()
+    return norm_checksum
+
+
+async def process_event(*, event: Dict[str, Any], settings, producer, session) -> None:
+    """Fan a code.submitted scan out into one code.normalize task per file.
+
+    Tasks are keyed by checksum: they spread over the topic's partitions (and
+    so over normalizer replicas), while identical files land on the same
+    partition and hit the checksum cache instead of racing on it.
+    """
     scan_id = event["scan_id"]
     correlation_id = event.get("correlation_id") or event.get("payload", {}).get("correlation_id") or ""
     payload = event.get("payload") or {}
@@ -31,50 +68,110 @@ async def process_event(*, event: Dict[str, Any], settings, producer, minio_clie
     await update_scan_status_progress(session, scan_id=scan_id, status="NORMALIZING", progress=1, params_patch={})
     await append_scan_log(session, scan_id=scan_id, message=f"Normalizer: received {len(files)} file(s)")
 
-    for f in files:
-        file_id = int(f["file_id"])
-        object_key = f["object_key"]
-        checksum = f["checksum"]
-        language = f.get("language")
-
-        nkey = norm_key(checksum)
-        tkey = tokens_key(checksum)
-
-        cache_hit = await redis_client.exists(nkey) and await redis_client.exists(tkey)
-        if not cache_hit:
-            raw = get_bytes(client=minio_client, bucket=bucket, object_key=object_key)
-            try:
-                text = raw.decode("utf-8")
-            except UnicodeDecodeError:
-                text = raw.decode("latin-1", errors="replace")
-
-            norm = normalize_code(text)
-            toks = tokenize(norm)
-
-            # Store bytes to keep redis small-ish and fast.
-            await redis_client.set(nkey, norm.encode("utf-8"))
-            await redis_client.set(tkey, orjson.dumps(toks))
-
-        idempotency_key = stable_sha256_hex("code.normalized", scan_id, str(file_id), checksum)
-        out = make_envelope(
-            event_type="code.normalized",
-            scan_id=scan_id,
-            correlation_id=correlation_id,
-            idempotency_key=idempotency_key,
-            payload={
-                "scan_id": scan_id,
-                "file_id": file_id,
-                "object_bucket": bucket,
-                "object_key": object_key,
-                "checksum": checksum,
-                "language": language,
-                "cache_hit": bool(cache_hit),
-                "normalized_ref": {"redis_norm_key": nkey, "redis_tokens_key": tkey},
-            },
-        )
-        await producer.send_and_wait(settings.topic_normalized, key=idempotency_key, value=out)
-
-    await append_scan_log(session, scan_id=scan_id, message="Normalizer: emitted code.normalized")
+    def _tasks():
+        for f in files:
+            file_id = int(f["file_id"])
+            idempotency_key = stable_sha256_hex("code.normalize", scan_id, str(file_id), f["checksum"])
+            yield f["checksum"], make_envelope(
+                event_type="code.normalize",
+                scan_id=scan_id,
+                correlation_id=correlation_id,
+                idempotency_key=idempotency_key,
+                payload={
+                    "scan_id": scan_id,
+                    "file_id": file_id,
+                    "object_bucket": bucket,
+                    "object_key": f["object_key"],
+                    "checksum": f["checksum"],
+                    "language": f.get("language"),
+                },
+            )
+
+    # Pipelined: every task is acknowledged before the submit record commits.
+    await send_many(producer, settings.topic_normalize, _tasks(), max_in_flight=settings.kafka_max_in_flight)
+
+    await append_scan_log(session, scan_id=scan_id, message=f"Normalizer: dispatched {len(files)} file task(s)")
+
+
+async def process_file_event(*, event: Dict[str, Any], settings, producer, storage, redis_client) -> None:
+    """Normalize one file (unless its checksum is cached) and emit code.normalized."""
+    scan_id = event["scan_id"]
+    correlation_id = event.get("correlation_id") or ""
+    payload = event.get("payload") or {}
+
+    file_id = int(payload["file_id"])
+    bucket = payload.get("object_bucket") or settings.minio_bucket
+    object_key = payload["object_key"]
+    checksum = payload["checksum"]
+
+    keys = _cache_keys(checksum, settings)
+    norm_checksum = None
+    if await redis_client.exists(*keys.values()) == len(keys):
+        norm_checksum = await redis_client.get(keys["norm_checksum"])
+    cache_hit = norm_checksum is not None
+    if cache_hit:
+        norm_checksum = norm_checksum.decode("ascii")
+    else:
+        raw = await storage.get_bytes(bucket=bucket, object_key=object_key)
+        norm_checksum = await _normalize_into_cache(raw, keys, settings=settings, redis_client=redis_client)
+
+    idempotency_key = stable_sha256_hex("code.normalized", scan_id, str(file_id), checksum)
+    out = make_envelope(
+        event_type="code.normalized",
+        scan_id=scan_id,
+        correlation_id=correlation_id,
+        idempotency_key=idempotency_key,
+        payload={
+            "scan_id": scan_id,
+            "file_id": file_id,
+            "object_bucket": bucket,
+            "object_key": object_key,
+            "checksum": checksum,
+            "norm_checksum": norm_checksum,
+            "language": payload.get("language"),
+            "cache_hit": bool(cache_hit),
+            "normalized_ref": {f"redis_{name}_key": key for name, key in keys.items()},
+        },
+    )
+    await producer.send_and_wait(settings.topic_normalized, key=idempotency_key, value=out)
+
+
+async def process_record(*, msg, settings, producer, storage, redis_client, SessionLocal) -> None:
+    event = msg.value
+    scan_id = event.get("scan_id")
+    correlation_id = event.get("correlation_id") or ""
+    async with SessionLocal() as session:
+        try:
+            if event.get("event_type") == "code.normalize":
+                await process_file_event(
+                    event=event,
+                    settings=settings,
+                    producer=producer,
+                    storage=storage,
+                    redis_client=redis_client,
+                )
+            else:
+                await process_event(event=event, settings=settings, producer=producer, session=session)
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            # DLQ + alert; the offset is still committed to avoid poison pill loops.
+            async with SessionLocal() as s2:
+                await handle_fatal(
+                    service="normalizer-worker",
+                    scan_id=scan_id,
+                    correlation_id=correlation_id,
+                    topic_deadletter=settings.topic_deadletter,
+                    producer=producer,
+                    session=s2,
+                    err=e,
+                    original_topic=msg.topic,
+                    original_event=event,
+                    record=msg,
+                    error_code="NORMALIZE_FAILED",
+                    keep_log_lines=settings.scan_log_max_lines,
+                )
+                await s2.commit()
 
 
 async def main() -> None:
@@ -85,9 +182,14 @@ async def main() -> None:
     await ensure_schema(engine)
     SessionLocal = make_sessionmaker(engine)
 
-    producer = await make_producer(settings.kafka_bootstrap_servers, settings.kafka_client_id)
+    producer = await make_producer(
+        settings.kafka_bootstrap_servers,
+        settings.kafka_client_id,
+        compression_type=settings.kafka_compression_type,
+        envelope_format=settings.kafka_envelope_format,
+    )
     consumer = await make_consumer(
-        topic=settings.topic_submitted,
+        topic=[settings.topic_submitted, settings.topic_normalize],
         bootstrap_servers=settings.kafka_bootstrap_servers,
         group_id=settings.worker_group_id,
         client_id=settings.kafka_client_id,
@@ -101,51 +203,39 @@ async def main() -> None:
         secret_key=settings.minio_secret_key,
         secure=settings.minio_secure,
         bucket=settings.minio_bucket,
+        max_pool_connections=settings.minio_max_workers,
     )
-    minio_client = make_client(minio_cfg)
+    storage = AsyncMinio(make_client(minio_cfg), max_workers=settings.minio_max_workers)
 
     logger.info("Normalizer worker started")
 
     try:
-        async for msg in consumer:
-            event = msg.value
-            scan_id = event.get("scan_id")
-            correlation_id = event.get("correlation_id") or ""
-            async with SessionLocal() as session:
-                try:
-                    await process_event(
-                        event=event,
+        while True:
+            batches = await consumer.getmany(timeout_ms=200, max_records=settings.minio_transfer_concurrency)
+            records = [r for partition_records in batches.values() for r in partition_records]
+            if not records:
+                continue
+
+            # Records of one poll are independent tasks: run them concurrently.
+            await asyncio.gather(
+                *(
+                    process_record(
+                        msg=msg,
                         settings=settings,
                         producer=producer,
-                        minio_client=minio_client,
+                        storage=storage,
                         redis_client=redis_client,
-                        session=session,
+                        SessionLocal=SessionLocal,
                     )
-                    await session.commit()
-                    await consumer.commit()
-                except Exception as e:
-                    await session.rollback()
-                    # DLQ + alert then commit offset to avoid poison pill loops.
-                    async with SessionLocal() as s2:
-                        await handle_fatal(
-                            service="normalizer-worker",
-                            scan_id=scan_id,
-                            correlation_id=correlation_id,
-                            topic_deadletter=settings.topic_deadletter,
-                            producer=producer,
-                            session=s2,
-                            err=e,
-                            original_topic=settings.topic_submitted,
-                            original_event=event,
-                            record=msg,
-                            error_code="NORMALIZE_FAILED",
-                        )
-                        await s2.commit()
-                    await consumer.commit()
+                    for msg in records
+                )
+            )
+            await consumer.commit()
     finally:
         await consumer.stop()
         await producer.stop()
         await engine.dispose()
+        storage.close()
 
 
 if __name__ == "__main__":
@@ -3,28 +3,353 @@ from __future__ import annotations
 import asyncio
 import logging
 import time
-from typing import Any, Dict
-
-import orjson
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
 
+from ..artifact import ARTIFACT_VERSION, read_artifact
 from ..config import get_settings
 from ..db import ensure_schema, make_engine, make_sessionmaker
-from ..kafka import make_consumer, make_envelope, make_producer, stable_sha256_hex
+from ..feature_cache import FeatureCache
+from ..kafka import make_consumer, make_producer, stable_sha256_hex
+from ..live_results import publish_new_results
 from ..logging_utils import configure_logging
-from ..redis_cache import make_redis, tokens_key
-from ..repository import (
-    append_scan_log,
-    count_results,
-    get_total_pairs,
-    try_mark_done_emitted,
-    update_scan_status_progress,
-    upsert_result,
-)
-from ..similarity import jaccard_percent
-from .common import handle_fatal
+from ..matrix_scoring import jaccard_matrix_percent, upper_triangle_pairs
+from ..ppjoin import threshold_join
+from ..redis_cache import artifact_key, make_redis
+from ..repository import append_scan_log, list_files_for_scan, try_record_threshold_join, upsert_results
+from ..similarity import jaccard_percent_sets
+from .common import class_representative, equivalence_classes, handle_fatal, record_progress
 
 logger = logging.getLogger("plagcode.scoring")
 
+ALGORITHMS = ("jaccard", "winnowing")
+# Score of two files with empty feature sets. Empty token sets are identical
+# files; files shorter than winnow_k tokens have no fingerprints at all.
+EMPTY_SCORES = {"jaccard": 100.0, "winnowing": 0.0}
+
+
+async def load_features(
+    redis_client,
+    checksums: Iterable[str],
+    *,
+    algorithm: str,
+    settings,
+    feature_cache: Optional[FeatureCache] = None,
+) -> Dict[str, FrozenSet[Any]]:
+    """Per-checksum feature sets an algorithm compares.
+
+    jaccard compares distinct-token hash sets, winnowing compares k-gram
+    fingerprint hashes; both are read straight out of the normalized artifact.
+    Checksums missing from the in-process cache are fetched with one MGET.
+    """
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown scoring algorithm: {algorithm!r}")
+
+    out: Dict[str, FrozenSet[Any]] = {}
+    missing: List[str] = []
+    for c in dict.fromkeys(checksums):
+        cached = feature_cache.get((algorithm, c)) if feature_cache is not None else None
+        if cached is None:
+            missing.append(c)
+        else:
+            out[c] = cached
+    if not missing:
+        return out
+
+    raw = await redis_client.mget(
+        [artifact_key(c, ARTIFACT_VERSION, settings.winnow_k, settings.winnow_window) for c in missing]
+    )
+    if any(r is None for r in raw):
+        raise RuntimeError("Missing normalized artifact in Redis (normalizer cache miss).")
+
+    for c, r in zip(missing, raw):
+        artifact = read_artifact(r)
+        hashes = artifact.fp_hashes if algorithm == "winnowing" else artifact.unique_hashes
+        features = frozenset(hashes.tolist())
+        out[c] = features
+        if feature_cache is not None:
+            feature_cache.put((algorithm, c), features)
+    return out
+
+
+def class_pairs(
+    a_id: int, b_id: int, members_a: Optional[List[int]], members_b: Optional[List[int]]
+) -> List[Tuple[int, int]]:
+    """Canonical (a < b) file pairs a pair of equivalence-class representatives stands for."""
+    if not members_a and not members_b:
+        return [(a_id, b_id) if a_id < b_id else (b_id, a_id)]
+    return [(x, y) if x < y else (y, x) for x in members_a or [a_id] for y in members_b or [b_id]]
+
+
+def iter_candidate_pairs(events: List[Dict[str, Any]]):
+    """(event, pair payload) for code.candidates and code.candidates.block events."""
+    for event in events:
+        payload = event.get("payload") or {}
+        if event.get("event_type") == "code.candidates.block":
+            # Member lists of equivalence classes are sent once per block.
+            classes = payload.get("classes") or {}
+            for pair in payload.get("pairs") or []:
+                if classes:
+                    pair = {
+                        **pair,
+                        "members_a": classes.get(str(pair["file_a_id"])),
+                        "members_b": classes.get(str(pair["file_b_id"])),
+                    }
+                yield event, pair
+        else:
+            yield event, payload
+
+
+async def score_pairs(
+    *,
+    events: List[Dict[str, Any]],
+    settings,
+    producer,
+    redis_client,
+    session,
+    feature_cache: Optional[FeatureCache] = None,
+) -> Dict[str, List[Tuple[int, int, float]]]:
+    """Score a batch of code.candidates / code.candidates.block events.
+
+    Features for every checksum in the batch are fetched with one MGET per
+    algorithm, results are written with one bulk upsert per scan and progress
+    is updated once per scan. Returns the new (a, b, score) rows per scan.
+    """
+    wanted: Dict[str, set] = {}
+    for _, payload in iter_candidate_pairs(events):
+        algorithm = payload.get("algorithm") or settings.scoring_algorithm
+        wanted.setdefault(algorithm, set()).update((payload["checksum_a"], payload["checksum_b"]))
+
+    features: Dict[Tuple[str, str], FrozenSet[Any]] = {}
+    for algorithm, checksums in wanted.items():
+        loaded = await load_features(
+            redis_client, checksums, algorithm=algorithm, settings=settings, feature_cache=feature_cache
+        )
+        features.update({(algorithm, c): v for c, v in loaded.items()})
+
+    # Keyed by pair: redelivered duplicates in one batch must not hit the same row twice.
+    rows_by_scan: Dict[str, Dict[Tuple[int, int], Tuple[int, int, float, Dict[str, Any]]]] = {}
+    correlation_by_scan: Dict[str, str] = {}
+    for event, payload in iter_candidate_pairs(events):
+        scan_id = event["scan_id"]
+
+        algorithm = payload.get("algorithm") or settings.scoring_algorithm
+        score = float(
+            jaccard_percent_sets(
+                features[(algorithm, payload["checksum_a"])],
+                features[(algorithm, payload["checksum_b"])],
+                empty_score=EMPTY_SCORES[algorithm],
+            )
+        )
+
+        # Fan the representative pair's score out to every member pair.
+        scan_rows = rows_by_scan.setdefault(scan_id, {})
+        for a_id, b_id in class_pairs(
+            int(payload["file_a_id"]), int(payload["file_b_id"]), payload.get("members_a"), payload.get("members_b")
+        ):
+            details = {"pair_id": stable_sha256_hex(scan_id, str(a_id), str(b_id)), "algorithm": algorithm}
+            if payload.get("historical_scan_id"):
+                details["historical_scan_id"] = payload["historical_scan_id"]
+            scan_rows[(a_id, b_id)] = (a_id, b_id, score, details)
+        correlation_by_scan.setdefault(scan_id, event.get("correlation_id") or "")
+
+    new_rows: Dict[str, List[Tuple[int, int, float]]] = {}
+    for scan_id, rows in rows_by_scan.items():
+        new_rows[scan_id] = await upsert_results(session, scan_id=scan_id, rows=list(rows.values()))
+        await record_progress(
+            session=session,
+            producer=producer,
+            settings=settings,
+            scan_id=scan_id,
+            correlation_id=correlation_by_scan[scan_id],
+            inserted=len(new_rows[scan_id]),
+        )
+    return new_rows
+
+
+async def score_scan(
+    *,
+    event: Dict[str, Any],
+    settings,
+    producer,
+    redis_client,
+    session,
+    feature_cache: Optional[FeatureCache] = None,
+) -> Dict[str, List[Tuple[int, int, float]]]:
+    """Score every pair of a scan at once, then write in bulk.
+
+    Without min_score all pairs come from one sparse matrix product; with it,
+    a thresholded join only computes pairs that can reach min_score and the
+    others are recorded as aggregate counts.
+    """
+    scan_id = event["scan_id"]
+    correlation_id = event.get("correlation_id") or ""
+    payload = event.get("payload") or {}
+
+    files = payload.get("files")
+    if files is None:
+        file_rows = await list_files_for_scan(session, scan_id=scan_id)
+        files = [
+            {"file_id": int(f["id"]), "checksum": f["checksum"], "members": f.get("members")}
+            for f in map(class_representative, equivalence_classes(file_rows, dedup=settings.dedup_equivalent_files))
+        ]
+    files = sorted(files, key=lambda f: int(f["file_id"]))
+    algorithm = payload.get("algorithm") or settings.scoring_algorithm
+    min_score = float(payload.get("min_score") or 0)
+    features = await load_features(
+        redis_client,
+        (f["checksum"] for f in files),
+        algorithm=algorithm,
+        settings=settings,
+        feature_cache=feature_cache,
+    )
+
+    started = time.perf_counter()
+    sets = [features[f["checksum"]] for f in files]
+    if min_score > 0:
+        scored, verified = threshold_join(sets, min_score, empty_score=EMPTY_SCORES[algorithm])
+    else:
+        scored = upper_triangle_pairs(jaccard_matrix_percent(sets, empty_score=EMPTY_SCORES[algorithm]))
+    rows = []
+    for i, j, score in scored:
+        for a_id, b_id in class_pairs(
+            int(files[i]["file_id"]), int(files[j]["file_id"]), files[i].get("members"), files[j].get("members")
+        ):
+            pair_id = stable_sha256_hex(scan_id, str(a_id), str(b_id))
+            rows.append((a_id, b_id, score, {"pair_id": pair_id, "algorithm": algorithm}))
+    elapsed_ms = int((time.perf_counter() - started) * 1000)
+
+    inserted = await upsert_results(session, scan_id=scan_id, rows=rows)
+    counted = len(inserted)
+    message = f"Scan-level scoring: {len(rows)} pair(s) from {len(files)} file(s) in {elapsed_ms} ms"
+    if min_score > 0:
+        sizes = [len(f.get("members") or ()) or 1 for f in files]
+        n = sum(sizes)
+        evaluated = n * (n - 1) // 2 - sum(m * (m - 1) // 2 for m in sizes)
+        stats = {
+            "min_score": min_score,
+            "pairs_evaluated": evaluated,
+            "pairs_above": len(rows),
+            "pairs_below": evaluated - len(rows),
+            "pairs_verified": verified,
+        }
+        # Below-threshold pairs have no result row: count the whole join once.
+        counted = evaluated if await try_record_threshold_join(session, scan_id=scan_id, stats=stats) else 0
+        message += f", {stats['pairs_below']} below {min_score:g}% ({verified} verified)"
+
+    await append_scan_log(session, scan_id=scan_id, message=message)
+    # Historical (cross-scan) pairs of the same scan may still arrive as per-pair events.
+    await record_progress(
+        session=session,
+        producer=producer,
+        settings=settings,
+        scan_id=scan_id,
+        correlation_id=correlation_id,
+        inserted=counted,
+    )
+    return {scan_id: inserted}
+
+
+async def process_record(
+    *,
+    msg,
+    settings,
+    producer,
+    redis_client,
+    SessionLocal,
+    feature_cache: Optional[FeatureCache] = None,
+) -> None:
+    """Handle a single record in its own transaction; failures go to the dead-letter topic."""
+    event = msg.value
+    scan_id = event.get("scan_id")
+    correlation_id = event.get("correlation_id") or ""
+
+    async with SessionLocal() as session:
+        try:
+            if event.get("event_type") == "code.candidates.scan":
+                new_rows = await score_scan(
+                    event=event,
+                    settings=settings,
+                    producer=producer,
+                    redis_client=redis_client,
+                    session=session,
+                    feature_cache=feature_cache,
+                )
+            else:
+                new_rows = await score_pairs(
+                    events=[event],
+                    settings=settings,
+                    producer=producer,
+                    redis_client=redis_client,
+                    session=session,
+                    feature_cache=feature_cache,
+                )
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            async with SessionLocal() as s2:
+                await handle_fatal(
+                    service="scoring-worker",
+                    scan_id=scan_id,
+                    correlation_id=correlation_id,
+                    topic_deadletter=settings.topic_deadletter,
+                    producer=producer,
+                    session=s2,
+                    err=e,
+                    original_topic=settings.topic_candidates,
+                    original_event=event,
+                    record=msg,
+                    error_code="SCORING_FAILED",
+                    keep_log_lines=settings.scan_log_max_lines,
+                )
+                await s2.commit()
+        else:
+            await publish_new_results(
+                redis_client, new_rows, top_k=settings.live_results_top_k, ttl_s=settings.live_results_ttl_s
+            )
+
+
+async def process_batch(
+    *,
+    records: List[Any],
+    settings,
+    producer,
+    redis_client,
+    SessionLocal,
+    feature_cache: Optional[FeatureCache] = None,
+) -> None:
+    pair_records = [r for r in records if r.value.get("event_type") != "code.candidates.scan"]
+    scan_records = [r for r in records if r.value.get("event_type") == "code.candidates.scan"]
+
+    if len(pair_records) > 1:
+        try:
+            async with SessionLocal() as session:
+                new_rows = await score_pairs(
+                    events=[r.value for r in pair_records],
+                    settings=settings,
+                    producer=producer,
+                    redis_client=redis_client,
+                    session=session,
+                    feature_cache=feature_cache,
+                )
+                await session.commit()
+            pair_records = []
+            await publish_new_results(
+                redis_client, new_rows, top_k=settings.live_results_top_k, ttl_s=settings.live_results_ttl_s
+            )
+        except Exception:
+            # Isolate the poison pill(s): retry one record per transaction.
+            logger.exception("Batch of %d candidate(s) failed, retrying one by one", len(pair_records))
+
+    for msg in pair_records + scan_records:
+        await process_record(
+            msg=msg,
+            settings=settings,
+            producer=producer,
+            redis_client=redis_client,
+            SessionLocal=SessionLocal,
+            feature_cache=feature_cache,
+        )
+
 
 async def main() -> None:
     settings = get_settings()
@@ -34,7 +359,12 @@ async def main() -> None:
     await ensure_schema(engine)
     SessionLocal = make_sessionmaker(engine)
 
-    producer = await make_producer(settings.kafka_bootstrap_servers, settings.kafka_client_id)
+    producer = await make_producer(
+        settings.kafka_bootstrap_servers,
+        settings.kafka_client_id,
+        compression_type=settings.kafka_compression_type,
+        envelope_format=settings.kafka_envelope_format,
+    )
     consumer = await make_consumer(
         topic=settings.topic_candidates,
         bootstrap_servers=settings.kafka_bootstrap_servers,
@@ -43,108 +373,36 @@ async def main() -> None:
     )
 
     redis_client = make_redis(settings.redis_url)
+    feature_cache = FeatureCache(settings.feature_cache_max_mb * 1024 * 1024)
+    stats_logged_at = time.monotonic()
 
     logger.info("Scoring worker started")
 
     try:
-        async for msg in consumer:
-            event = msg.value
-            scan_id = event.get("scan_id")
-            correlation_id = event.get("correlation_id") or ""
-            payload = event.get("payload") or {}
+        while True:
+            batches = await consumer.getmany(
+                timeout_ms=settings.scoring_batch_max_wait_ms,
+                max_records=settings.scoring_batch_max_records,
+            )
+            records = [r for partition_records in batches.values() for r in partition_records]
 
-            async with SessionLocal() as session:
-                try:
-                    a_id = int(payload["file_a_id"])
-                    b_id = int(payload["file_b_id"])
-                    # Canonical ordering to match DB unique key.
-                    if a_id > b_id:
-                        a_id, b_id = b_id, a_id
-
-                    checksum_a = payload["checksum_a"]
-                    checksum_b = payload["checksum_b"]
-
-                    ta = await redis_client.get(tokens_key(checksum_a))
-                    tb = await redis_client.get(tokens_key(checksum_b))
-                    if ta is None or tb is None:
-                        raise RuntimeError("Missing tokens in Redis (normalizer cache miss).")
-
-                    tokens_a = orjson.loads(ta)
-                    tokens_b = orjson.loads(tb)
-
-                    score = float(jaccard_percent(tokens_a, tokens_b))
-
-                    await upsert_result(
-                        session,
-                        scan_id=scan_id,
-                        file_a_id=a_id,
-                        file_b_id=b_id,
-                        score=score,
-                        details={"pair_id": payload.get("pair_id")},
-                    )
-
-                    total_pairs = await get_total_pairs(session, scan_id=scan_id)
-                    done = False
-                    progress = None
-                    if total_pairs and total_pairs > 0:
-                        processed = await count_results(session, scan_id=scan_id)
-                        progress = int(min(99, round((processed / total_pairs) * 100)))
-                        done = processed >= total_pairs
-
-                    if progress is not None:
-                        await update_scan_status_progress(
-                            session,
-                            scan_id=scan_id,
-                            status=None,
-                            progress=progress,
-                            params_patch={},
-                        )
-
-                    if done:
-                        await update_scan_status_progress(
-                            session,
-                            scan_id=scan_id,
-                            status="DONE",
-                            progress=100,
-                            params_patch={},
-                        )
-                        await append_scan_log(session, scan_id=scan_id, message="Scoring complete (DONE)")
-
-                        if await try_mark_done_emitted(session, scan_id=scan_id):
-                            idem = stable_sha256_hex("code.scored", scan_id)
-                            out = make_envelope(
-                                event_type="code.scored",
-                                scan_id=scan_id,
-                                correlation_id=correlation_id,
-                                idempotency_key=idem,
-                                payload={
-                                    "scan_id": scan_id,
-                                    "completed_at_ms": int(time.time() * 1000),
-                                    "total_pairs": total_pairs,
-                                },
-                            )
-                            await producer.send_and_wait(settings.topic_scored, key=idem, value=out)
-
-                    await session.commit()
-                    await consumer.commit()
-                except Exception as e:
-                    await session.rollback()
-                    async with SessionLocal() as s2:
-                        await handle_fatal(
-                            service="scoring-worker",
-                            scan_id=scan_id,
-                            correlation_id=correlation_id,
-                            topic_deadletter=settings.topic_deadletter,
-                            producer=producer,
-                            session=s2,
-                            err=e,
-                            original_topic=settings.topic_candidates,
-                            original_event=event,
-                            record=msg,
-                            error_code="SCORING_FAILED",
-                        )
-                        await s2.commit()
-                    await consumer.commit()
+            if time.monotonic() - stats_logged_at >= settings.feature_cache_stats_interval_s:
+                stats_logged_at = time.monotonic()
+                logger.info("Feature cache %s", feature_cache.stats())
+
+            if not records:
+                continue
+
+            await process_batch(
+                records=records,
+                settings=settings,
+                producer=producer,
+                redis_client=redis_client,
+                SessionLocal=SessionLocal,
+                feature_cache=feature_cache,
+            )
+            # One offset commit per batch (failed records were dead-lettered).
+            await consumer.commit()
     finally:
         await consumer.stop()
         await producer.stop()
@@ -0,0 +1,27 @@
+-- 002: persistent cross-scan inverted fingerprint index
+-- fingerprint hash -> posting list of file checksums, plus document frequency
+-- (number of distinct checksums containing the hash) for the stop-list.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '002_fingerprint_index') THEN
+
+    CREATE TABLE IF NOT EXISTS fingerprint_df (
+      hash BIGINT PRIMARY KEY,
+      df INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS fingerprint_postings (
+      hash BIGINT NOT NULL,
+      checksum TEXT NOT NULL,
+      PRIMARY KEY (hash, checksum)
+    );
+
+    CREATE TABLE IF NOT EXISTS fingerprint_indexed (
+      checksum TEXT PRIMARY KEY,
+      indexed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+    );
+
+    INSERT INTO schema_migrations(version) VALUES ('002_fingerprint_index');
+  END IF;
+END $$;
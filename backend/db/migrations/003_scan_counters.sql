@@ -0,0 +1,24 @@
+-- 003: atomic per-scan progress counters
+-- Replaces COUNT(*) over files/results on every pipeline event.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '003_scan_counters') THEN
+
+    ALTER TABLE scans ADD COLUMN IF NOT EXISTS files_total INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE scans ADD COLUMN IF NOT EXISTS files_normalized INTEGER NOT NULL DEFAULT 0;
+    ALTER TABLE scans ADD COLUMN IF NOT EXISTS pairs_total INTEGER;
+    ALTER TABLE scans ADD COLUMN IF NOT EXISTS pairs_scored INTEGER NOT NULL DEFAULT 0;
+
+    UPDATE scans s
+    SET
+      files_total = (SELECT COUNT(*) FROM files f WHERE f.scan_id = s.scan_id),
+      files_normalized = (
+        SELECT COUNT(*) FROM files f WHERE f.scan_id = s.scan_id AND f.normalized_at IS NOT NULL
+      ),
+      pairs_total = NULLIF(s.params_json->>'total_pairs','')::int,
+      pairs_scored = (SELECT COUNT(*) FROM results r WHERE r.scan_id = s.scan_id);
+
+    INSERT INTO schema_migrations(version) VALUES ('003_scan_counters');
+  END IF;
+END $$;
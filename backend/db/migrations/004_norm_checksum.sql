@@ -0,0 +1,12 @@
+-- 004: normalized-text checksum per file
+-- Files with the same norm_checksum form one equivalence class and are scored once.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '004_norm_checksum') THEN
+
+    ALTER TABLE files ADD COLUMN IF NOT EXISTS norm_checksum TEXT;
+
+    INSERT INTO schema_migrations(version) VALUES ('004_norm_checksum');
+  END IF;
+END $$;
@@ -0,0 +1,38 @@
+-- 005: scan status/log change notifications
+-- The API LISTENs on "scan_events" and pushes changes to SSE clients.
+-- NOTIFY is transactional: nothing is sent for rolled-back updates.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '005_scan_events') THEN
+
+    CREATE OR REPLACE FUNCTION notify_scan_event() RETURNS trigger AS $fn$
+    DECLARE
+      old_n INTEGER := COALESCE(jsonb_array_length(OLD.params_json->'logs'), 0);
+      new_n INTEGER := COALESCE(jsonb_array_length(NEW.params_json->'logs'), 0);
+      i INTEGER;
+    BEGIN
+      IF NEW.status IS DISTINCT FROM OLD.status OR NEW.progress IS DISTINCT FROM OLD.progress THEN
+        PERFORM pg_notify('scan_events', json_build_object(
+          'scan_id', NEW.scan_id, 'type', 'status', 'status', NEW.status, 'progress', NEW.progress
+        )::text);
+      END IF;
+      -- One notification per new log line; its 1-based index is the SSE event id.
+      FOR i IN old_n .. new_n - 1 LOOP
+        PERFORM pg_notify('scan_events', json_build_object(
+          'scan_id', NEW.scan_id, 'type', 'log', 'id', i + 1,
+          'time', NEW.params_json->'logs'->i->>'time',
+          'message', left(NEW.params_json->'logs'->i->>'message', 2000)
+        )::text);
+      END LOOP;
+      RETURN NEW;
+    END
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER trg_scans_notify
+    AFTER UPDATE ON scans
+    FOR EACH ROW EXECUTE FUNCTION notify_scan_event();
+
+    INSERT INTO schema_migrations(version) VALUES ('005_scan_events');
+  END IF;
+END $$;
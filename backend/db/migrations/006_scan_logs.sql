@@ -0,0 +1,56 @@
+-- 006: append-only scan_logs table
+-- Log lines no longer rewrite scans.params_json; each one is a row, read by
+-- cursor (id) and pruned per scan. Notifications move to a scan_logs trigger.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '006_scan_logs') THEN
+
+    CREATE TABLE IF NOT EXISTS scan_logs (
+      id BIGSERIAL PRIMARY KEY,
+      scan_id UUID NOT NULL REFERENCES scans(scan_id) ON DELETE CASCADE,
+      created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+      message TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_scan_logs_scan_id_id ON scan_logs(scan_id, id);
+
+    CREATE OR REPLACE FUNCTION notify_scan_event() RETURNS trigger AS $fn$
+    BEGIN
+      IF NEW.status IS DISTINCT FROM OLD.status OR NEW.progress IS DISTINCT FROM OLD.progress THEN
+        PERFORM pg_notify('scan_events', json_build_object(
+          'scan_id', NEW.scan_id, 'type', 'status', 'status', NEW.status, 'progress', NEW.progress
+        )::text);
+      END IF;
+      RETURN NEW;
+    END
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE FUNCTION notify_scan_log() RETURNS trigger AS $fn$
+    BEGIN
+      PERFORM pg_notify('scan_events', json_build_object(
+        'scan_id', NEW.scan_id, 'type', 'log', 'id', NEW.id,
+        'time', to_char(NEW.created_at, 'HH24:MI:SS'),
+        'message', left(NEW.message, 2000)
+      )::text);
+      RETURN NEW;
+    END
+    $fn$ LANGUAGE plpgsql;
+
+    CREATE OR REPLACE TRIGGER trg_scan_logs_notify
+    AFTER INSERT ON scan_logs
+    FOR EACH ROW EXECUTE FUNCTION notify_scan_log();
+
+    -- Old entries only kept HH24:MI:SS: date them on the scan's creation day.
+    INSERT INTO scan_logs(scan_id, created_at, message)
+    SELECT s.scan_id, s.created_at::date + (l.entry->>'time')::time, l.entry->>'message'
+    FROM scans s
+    CROSS JOIN LATERAL jsonb_array_elements(
+      CASE WHEN jsonb_typeof(s.params_json->'logs') = 'array' THEN s.params_json->'logs' ELSE '[]'::jsonb END
+    ) WITH ORDINALITY AS l(entry, n)
+    ORDER BY s.scan_id, l.n;
+
+    UPDATE scans SET params_json = params_json - 'logs' WHERE params_json->'logs' IS NOT NULL;
+
+    INSERT INTO schema_migrations(version) VALUES ('006_scan_logs');
+  END IF;
+END $$;
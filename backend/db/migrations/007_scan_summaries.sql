@@ -0,0 +1,44 @@
+-- 007: per-scan summary rows for the history list
+-- /api/scans used to aggregate files x results for every listed scan; the
+-- counts now live in scan_summaries, bumped as results are inserted and
+-- recomputed once when the scan completes.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '007_scan_summaries') THEN
+
+    CREATE TABLE IF NOT EXISTS scan_summaries (
+      scan_id UUID PRIMARY KEY REFERENCES scans(scan_id) ON DELETE CASCADE,
+      created_at TIMESTAMPTZ NOT NULL,
+      file_count INTEGER NOT NULL DEFAULT 0,
+      pair_count INTEGER,
+      top_similarity DOUBLE PRECISION NOT NULL DEFAULT 0,
+      high_risk_count INTEGER NOT NULL DEFAULT 0,
+      runtime_ms INTEGER NOT NULL DEFAULT 0,
+      finalized_at TIMESTAMPTZ
+    );
+    CREATE INDEX IF NOT EXISTS idx_scan_summaries_created_at ON scan_summaries(created_at DESC)
+    INCLUDE (scan_id, file_count, pair_count, top_similarity, high_risk_count, runtime_ms);
+
+    INSERT INTO scan_summaries(
+      scan_id, created_at, file_count, pair_count, top_similarity, high_risk_count, runtime_ms, finalized_at
+    )
+    SELECT
+      s.scan_id,
+      s.created_at,
+      s.files_total,
+      s.pairs_total,
+      COALESCE(r.top_similarity, 0),
+      COALESCE(r.high_risk_count, 0),
+      COALESCE(NULLIF(s.params_json->>'runtime_ms','')::int, 0),
+      CASE WHEN s.status IN ('DONE', 'FAILED') THEN NOW() END
+    FROM scans s
+    LEFT JOIN LATERAL (
+      SELECT MAX(score) AS top_similarity, COUNT(*) FILTER (WHERE score > 70) AS high_risk_count
+      FROM results WHERE scan_id = s.scan_id
+    ) r ON TRUE
+    ON CONFLICT (scan_id) DO NOTHING;
+
+    INSERT INTO schema_migrations(version) VALUES ('007_scan_summaries');
+  END IF;
+END $$;
@@ -0,0 +1,12 @@
+-- 008: keyset pagination of results by (score, id)
+-- Serves /api/scan/{id}/pairs pages and the NDJSON stream in index order.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '008_results_keyset') THEN
+
+    CREATE INDEX IF NOT EXISTS idx_results_scan_score_id ON results(scan_id, score DESC, id DESC);
+
+    INSERT INTO schema_migrations(version) VALUES ('008_results_keyset');
+  END IF;
+END $$;
@@ -0,0 +1,13 @@
+-- 009: content-addressed uploads
+-- Uploads are stored once under blobs/sha256/<xx>/<checksum> and shared by
+-- every files row with that checksum; the blob GC looks rows up by key.
+
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM schema_migrations WHERE version = '009_content_addressed_blobs') THEN
+
+    CREATE INDEX IF NOT EXISTS idx_files_object_key ON files(object_key);
+
+    INSERT INTO schema_migrations(version) VALUES ('009_content_addressed_blobs');
+  END IF;
+END $$;
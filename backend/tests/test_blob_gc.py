@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.minio_client import blob_object_key
+from app.workers import blob_gc
+
+GRACE_S = 3600
+
+
+class FakeStorage:
+    """In-memory bucket: object key -> last_modified."""
+
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.removed = []
+
+    async def iter_object_batches(self, *, bucket, prefix, batch_size=1000):
+        # The listing is a snapshot: later touches do not change it.
+        yield [(k, m) for k, m in self.objects.items() if k.startswith(prefix)]
+
+    async def last_modified(self, *, bucket, object_key):
+        return self.objects.get(object_key)
+
+    async def touch(self, *, bucket, object_key):
+        if object_key not in self.objects:
+            return False
+        self.objects[object_key] = datetime.now(timezone.utc)
+        return True
+
+    async def remove_objects(self, *, bucket, object_keys):
+        for key in object_keys:
+            self.objects.pop(key)
+            self.removed.append(key)
+        return []
+
+
+class FakeSession:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+def _run_gc(monkeypatch, storage, referenced, before_reference_check=None):
+    async def fake_referenced(session, *, object_keys):
+        if before_reference_check is not None:
+            await before_reference_check()
+        return {k for k in object_keys if k in referenced}
+
+    monkeypatch.setattr(blob_gc, "referenced_object_keys", fake_referenced)
+    return asyncio.run(
+        blob_gc.collect_garbage(
+            storage=storage, SessionLocal=FakeSession, bucket="b", grace_s=GRACE_S, batch_size=100
+        )
+    )
+
+
+def _old():
+    return datetime.now(timezone.utc) - timedelta(seconds=2 * GRACE_S)
+
+
+def test_deletes_only_old_unreferenced_blobs(monkeypatch):
+    orphan, used, fresh = (blob_object_key(c * 64) for c in "abc")
+    storage = FakeStorage({orphan: _old(), used: _old(), fresh: datetime.now(timezone.utc)})
+
+    stats = _run_gc(monkeypatch, storage, referenced={used})
+
+    assert storage.removed == [orphan]
+    assert stats["deleted"] == 1
+
+
+def test_blob_reused_after_listing_is_kept(monkeypatch):
+    reused, orphan = blob_object_key("d" * 64), blob_object_key("e" * 64)
+    storage = FakeStorage({reused: _old(), orphan: _old()})
+
+    async def upload_reuses_blob():
+        # An upload touches the old orphan after GC listed it; its files rows
+        # have not committed yet, so the reference check still misses it.
+        assert await storage.touch(bucket="b", object_key=reused)
+
+    stats = _run_gc(monkeypatch, storage, referenced=set(), before_reference_check=upload_reuses_blob)
+
+    assert storage.removed == [orphan]
+    assert reused in storage.objects
+    assert stats["skipped"] == 1
+
+
+def test_blob_referenced_after_listing_is_kept(monkeypatch):
+    reused = blob_object_key("f" * 64)
+    storage = FakeStorage({reused: _old()})
+    referenced = set()
+
+    async def upload_commits():
+        referenced.add(reused)
+
+    _run_gc(monkeypatch, storage, referenced=referenced, before_reference_check=upload_commits)
+
+    assert storage.removed == []
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from app.fingerprinting import _BASE, kgram_hashes, token_ids, winnow_hashes
+from app.similarity import token_hash, tokenize
+
+SOURCE = """
+def fib(n):
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+print(fib(10), fib(10), fib(20))
+"""
+
+
+def _kgrams(ids, k):
+    mask = (1 << 64) - 1
+    return [
+        sum(ids[i + j] * pow(_BASE, k - 1 - j, 1 << 64) for j in range(k)) & mask
+        for i in range(len(ids) - k + 1)
+    ]
+
+
+def _winnow(values, w):
+    # Legacy semantics: rightmost minimum per window, recorded when it moves.
+    positions, last = [], -1
+    for start in range(len(values) - w + 1):
+        window = values[start : start + w]
+        low = min(window)
+        pos = start + max(i for i, v in enumerate(window) if v == low)
+        if pos != last:
+            positions.append(pos)
+            last = pos
+    return positions
+
+
+def test_token_ids():
+    tokens = tokenize(SOURCE)
+    assert token_ids(tokens).tolist() == [token_hash(t) for t in tokens]
+
+
+@pytest.mark.parametrize("k", [1, 2, 5, 13])
+def test_kgram_hashes_match_brute_force(k):
+    ids = token_ids(tokenize(SOURCE))
+    assert kgram_hashes(ids, k).tolist() == _kgrams(ids.tolist(), k)
+
+
+def test_shorter_than_k_has_no_kgrams():
+    ids = token_ids(tokenize("x = 1"))
+    assert len(kgram_hashes(ids, len(ids) + 1)) == 0
+    assert len(kgram_hashes(token_ids([]), 5)) == 0
+    positions, hashes = winnow_hashes(kgram_hashes(ids, len(ids) + 1), 4)
+    assert len(positions) == len(hashes) == 0
+
+
+@pytest.mark.parametrize("w", [1, 2, 4, 8])
+def test_winnow_matches_brute_force(w):
+    hashes = kgram_hashes(token_ids(tokenize(SOURCE)), 3)
+    positions, selected = winnow_hashes(hashes, w)
+    expected = _winnow(hashes.tolist(), w)
+    assert positions.tolist() == expected
+    assert selected.tolist() == [hashes.tolist()[p] for p in expected]
+
+
+def test_winnow_ties_pick_rightmost():
+    hashes = np.array([5, 1, 1, 1, 7, 1], dtype=np.uint64)
+    assert winnow_hashes(hashes, 3)[0].tolist() == _winnow(hashes.tolist(), 3) == [2, 3, 5]
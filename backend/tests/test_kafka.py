@@ -0,0 +1,24 @@
+import pytest
+
+from app import kafka
+
+
+def test_producer_compression_none():
+    assert kafka.producer_compression(None) is None
+    assert kafka.producer_compression(" None ") is None
+
+
+def test_producer_compression_unknown():
+    with pytest.raises(ValueError):
+        kafka.producer_compression("brotli")
+
+
+def test_producer_compression_missing_library(monkeypatch):
+    monkeypatch.setitem(kafka._COMPRESSION_CODECS, "lz4", lambda: False)
+    with pytest.raises(RuntimeError):
+        kafka.producer_compression("lz4")
+
+
+def test_producer_compression_available(monkeypatch):
+    monkeypatch.setitem(kafka._COMPRESSION_CODECS, "lz4", lambda: True)
+    assert kafka.producer_compression("LZ4") == "lz4"
@@ -0,0 +1,27 @@
+import random
+
+from app.matrix_scoring import jaccard_matrix_percent, upper_triangle_pairs
+from app.similarity import jaccard_percent
+
+
+def _corpus(seed, n=30):
+    rng = random.Random(seed)
+    vocab = [f"t{i}" for i in range(40)]
+    files = [[rng.choice(vocab) for _ in range(rng.randint(1, 60))] for _ in range(n)]
+    return files + [[], [], ["t1"], ["t1", "t1"]]
+
+
+def test_matches_jaccard_percent():
+    files = _corpus(1)
+    scores = jaccard_matrix_percent(files)
+    for i, a in enumerate(files):
+        for j, b in enumerate(files):
+            assert scores[i, j] == jaccard_percent(a, b)
+
+
+def test_upper_triangle_pairs():
+    files = _corpus(2, n=5)
+    pairs = upper_triangle_pairs(jaccard_matrix_percent(files))
+    n = len(files)
+    assert [(i, j) for i, j, _ in pairs] == [(i, j) for i in range(n) for j in range(i + 1, n)]
+    assert all(s == jaccard_percent(files[i], files[j]) for i, j, s in pairs)
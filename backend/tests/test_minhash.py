@@ -0,0 +1,47 @@
+import random
+from itertools import combinations
+
+import numpy as np
+
+from app.minhash import LSHIndex, _permutations, minhash_signature_from_hashes
+from app.similarity import token_hash
+
+
+def _signature(hashes, num_perm):
+    prime, mask = (1 << 61) - 1, (1 << 32) - 1
+    a, b = (p.tolist() for p in _permutations(num_perm))
+    if not hashes:
+        return [mask] * num_perm
+    return [min(((h & mask) * a[p] + b[p]) % prime & mask for h in hashes) for p in range(num_perm)]
+
+
+def test_signature_matches_brute_force():
+    hashes = sorted({token_hash(f"tok{i}") for i in range(50)})
+    sig = minhash_signature_from_hashes(np.array(hashes, dtype=np.uint64), num_perm=64)
+    assert sig.dtype == np.uint32
+    assert sig.tolist() == _signature(hashes, 64)
+
+
+def test_empty_signature():
+    sig = minhash_signature_from_hashes(np.zeros(0, dtype=np.uint64), num_perm=16)
+    assert sig.tolist() == _signature([], 16)
+
+
+def test_lsh_candidates_match_brute_force():
+    rng = random.Random(4)
+    bands, rows = 6, 2
+    sigs = {key: np.array([rng.randint(0, 3) for _ in range(bands * rows + 4)], dtype=np.uint32) for key in range(40)}
+
+    index = LSHIndex(bands=bands, rows=rows)
+    for key, sig in sigs.items():
+        index.insert(key, sig)
+
+    expected = {
+        (x, y)
+        for x, y in combinations(sorted(sigs), 2)
+        if any(
+            sigs[x][band * rows : (band + 1) * rows].tolist() == sigs[y][band * rows : (band + 1) * rows].tolist()
+            for band in range(bands)
+        )
+    }
+    assert index.candidate_pairs() == expected
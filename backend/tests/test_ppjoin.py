@@ -0,0 +1,57 @@
+import random
+from itertools import combinations
+
+import pytest
+
+from app.ppjoin import threshold_join
+from app.similarity import jaccard_percent_sets
+
+
+def _brute_force(sets, min_score, empty_score=100.0):
+    pairs = []
+    for i, j in combinations(range(len(sets)), 2):
+        score = jaccard_percent_sets(sets[i], sets[j], empty_score=empty_score)
+        if score >= min_score:
+            pairs.append((i, j, score))
+    return pairs
+
+
+def _corpus(seed, n=60):
+    rng = random.Random(seed)
+    base = [frozenset(rng.sample(range(200), rng.randint(1, 40))) for _ in range(n // 2)]
+    # Near-duplicates so every threshold has matches.
+    near = [frozenset(list(s)[: max(1, len(s) - rng.randint(0, 5))]) | {rng.randint(0, 400)} for s in base]
+    return base + near + [frozenset(), frozenset()]
+
+
+@pytest.mark.parametrize("min_score", [10.0, 33.0, 50.0, 70.0, 90.0, 100.0])
+def test_matches_brute_force(min_score):
+    sets = _corpus(3)
+    assert threshold_join(sets, min_score)[0] == _brute_force(sets, min_score)
+
+
+def test_exact_threshold_pairs():
+    sets = [
+        frozenset({1, 2}),
+        frozenset({1, 2, 3, 4}),  # 2/4 with the first
+        frozenset({5, 6, 7}),
+        frozenset({5, 6, 7, 8, 9}),  # 3/5 with the third
+        frozenset({10, 11, 12, 13, 14, 15, 16}),
+        frozenset({10, 11, 12, 13, 14, 15, 16, 17, 18, 19}),  # 7/10
+    ]
+    for i, j in [(0, 1), (2, 3), (4, 5)]:
+        score = jaccard_percent_sets(sets[i], sets[j])
+        matches, _ = threshold_join(sets, score)
+        assert (i, j, score) in matches
+        assert matches == _brute_force(sets, score)
+
+
+def test_empty_sets():
+    sets = [frozenset(), frozenset({1}), frozenset()]
+    assert threshold_join(sets, 100.0)[0] == [(0, 2, 100.0)]
+    assert threshold_join(sets, 1.0, empty_score=0.0)[0] == []
+
+
+def test_rejects_non_positive_threshold():
+    with pytest.raises(ValueError):
+        threshold_join([frozenset({1})], 0.0)
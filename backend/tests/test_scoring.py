@@ -0,0 +1,43 @@
+from app.artifact import build_artifact, read_artifact
+from app.matrix_scoring import jaccard_matrix_percent
+from app.ppjoin import threshold_join
+from app.similarity import jaccard_percent, jaccard_percent_sets, normalize_code, tokenize
+from app.workers.scoring_worker import EMPTY_SCORES
+
+SHORT_A = "def add(a,b): return a+b"
+SHORT_B = "import os; print(os.getcwd())"
+
+
+def _features(source, algorithm):
+    artifact = read_artifact(build_artifact(normalize_code(source), k=25, window=4))
+    hashes = artifact.fp_hashes if algorithm == "winnowing" else artifact.unique_hashes
+    return frozenset(hashes.tolist())
+
+
+def test_short_files_have_no_fingerprints():
+    assert _features(SHORT_A, "winnowing") == frozenset()
+    assert _features(SHORT_B, "winnowing") == frozenset()
+
+
+def test_winnowing_short_files_score_zero_in_every_scorer():
+    a, b = _features(SHORT_A, "winnowing"), _features(SHORT_B, "winnowing")
+    empty = EMPTY_SCORES["winnowing"]
+
+    assert jaccard_percent_sets(a, b, empty_score=empty) == 0.0
+    assert jaccard_matrix_percent([a, b], empty_score=empty)[0, 1] == 0.0
+    assert threshold_join([a, b], 1.0, empty_score=empty) == ([], 0)
+
+
+def test_jaccard_short_files_use_tokens():
+    a, b = _features(SHORT_A, "jaccard"), _features(SHORT_B, "jaccard")
+    expected = jaccard_percent(tokenize(SHORT_A), tokenize(SHORT_B))
+
+    assert 0 < expected < 40
+    assert jaccard_percent_sets(a, b, empty_score=EMPTY_SCORES["jaccard"]) == expected
+
+
+def test_empty_token_sets_are_identical():
+    empty = EMPTY_SCORES["jaccard"]
+    assert jaccard_percent_sets(frozenset(), frozenset(), empty_score=empty) == 100.0
+    assert jaccard_matrix_percent([frozenset(), frozenset()], empty_score=empty)[0, 1] == 100.0
+    assert threshold_join([frozenset(), frozenset()], 50.0, empty_score=empty)[0] == [(0, 1, 100.0)]
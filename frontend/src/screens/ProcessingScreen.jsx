@@ -50,44 +50,77 @@ export default function ProcessingScreen() {
     useEffect(() => {
         if (isCancelled || !scanId) return
 
+        let finished = false
+        let source = null
+        let interval = null
+
+        const finish = async () => {
+            if (finished) return
+            finished = true
+            setIsComplete(true)
+
+            // Fetch results
+            const resResponse = await fetch(`/api/scan/${scanId}/results`)
+            const results = await resResponse.json()
+
+            setAppState(prev => ({
+                ...prev,
+                results: results
+            }))
+
+            if (source) source.close()
+
+            // Navigate
+            setTimeout(() => {
+                navigate('/results')
+            }, 1000)
+        }
+
+        let cursor = null
         const pollStatus = async () => {
             try {
-                const response = await fetch(`/api/scan/${scanId}/status`)
+                const query = cursor === null ? '' : `?after=${cursor}`
+                const response = await fetch(`/api/scan/${scanId}/status${query}`)
                 if (!response.ok) return
 
                 const status = await response.json()
 
                 setProgress(status.progress)
-                setLogs(status.logs.map(l => ({ ...l, type: 'info' })))
-
-                if (status.complete) {
-                    setIsComplete(true)
-
-                    // Fetch results
-                    const resResponse = await fetch(`/api/scan/${scanId}/results`)
-                    const results = await resResponse.json()
-
-                    setAppState(prev => ({
-                        ...prev,
-                        results: results
-                    }))
-
-                    // Navigate
-                    setTimeout(() => {
-                        navigate('/results')
-                    }, 1000)
+                // Only lines after the cursor come back: append them.
+                if (status.logs.length) {
+                    setLogs(prev => [...prev, ...status.logs.map(l => ({ ...l, type: 'info' }))])
                 }
+                cursor = status.cursor ?? cursor
+
+                if (status.complete) await finish()
             } catch (error) {
                 console.error("Polling error", error)
             }
         }
 
-        const interval = setInterval(pollStatus, 1000)
+        if (typeof EventSource !== 'undefined') {
+            // Pushed updates; the browser resumes from Last-Event-ID after a drop.
+            source = new EventSource(`/api/scan/${scanId}/events`)
+            source.addEventListener('status', (e) => {
+                const status = JSON.parse(e.data)
+                setProgress(status.progress)
+                if (status.complete) finish().catch(error => console.error("Results error", error))
+            })
+            source.addEventListener('log', (e) => {
+                const entry = JSON.parse(e.data)
+                setLogs(prev => [...prev, { ...entry, type: 'info' }])
+            })
+        } else {
+            interval = setInterval(pollStatus, 1000)
 
-        // Initial poll
-        pollStatus()
+            // Initial poll
+            pollStatus()
+        }
 
-        return () => clearInterval(interval)
+        return () => {
+            if (source) source.close()
+            if (interval) clearInterval(interval)
+        }
     }, [scanId, isCancelled, navigate, setAppState])
 
     const handleCancel = () => {
@@ -116,10 +116,13 @@ export default function ResultsScreen() {
         currentPage * itemsPerPage
     )
 
-    // Stats
-    const highRiskCount = results.pairs.filter(p => p.label === 'high').length
-    const topSimilarity = Math.max(...results.pairs.map(p => p.similarity))
-    const avgSimilarity = results.pairs.reduce((sum, p) => sum + p.similarity, 0) / results.pairs.length
+    // Stats: server-side aggregates over every pair when available, else the loaded ones
+    const stats = results.meta.stats
+    const highRiskCount = stats ? stats.labels.high : results.pairs.filter(p => p.label === 'high').length
+    const topSimilarity = stats ? stats.top_similarity : Math.max(...results.pairs.map(p => p.similarity))
+    const avgSimilarity = stats
+        ? stats.avg_similarity
+        : results.pairs.reduce((sum, p) => sum + p.similarity, 0) / results.pairs.length
 
     const handleSort = (field) => {
         if (sortField === field) {
@@ -131,14 +134,11 @@ export default function ResultsScreen() {
     }
 
     const handleExport = (format) => {
-        // ===== BACKEND INTEGRATION POINT =====
-        // Replace with actual export API call:
-        // const response = await fetch('/api/export', {
-        //   method: 'POST',
-        //   body: JSON.stringify({ format, results })
-        // })
-        // const blob = await response.blob()
-        // saveAs(blob, `plagcode-report.${format}`)
+        // Stored scans: the server streams every pair (not just the loaded top-k)
+        if (runId && ['csv', 'ndjson', 'parquet'].includes(format)) {
+            window.location.href = `/api/scan/${runId}/export?format=${format}`
+            return
+        }
 
         const data = format === 'json'
             ? JSON.stringify(results, null, 2)
@@ -261,6 +261,12 @@ export default function ResultsScreen() {
                     <FileJson className="w-4 h-4" />
                     Export JSON
                 </button>
+                {runId && (
+                    <button className="btn btn-secondary" onClick={() => handleExport('csv')}>
+                        <Download className="w-4 h-4" />
+                        Export CSV
+                    </button>
+                )}
                 <button className="btn btn-primary" onClick={() => handleExport('pdf')}>
                     <FileText className="w-4 h-4" />
                     Export PDF
@@ -32,6 +32,16 @@ const SUPPORTED_EXTENSIONS = [
     { ext: '.swift', name: 'Swift', color: '#fa7343' },
 ]
 
+// A single archive is expanded server-side into its supported source files.
+const ARCHIVE_EXTENSIONS = ['.zip', '.tar', '.tar.gz', '.tgz']
+
+const isArchive = (file) => ARCHIVE_EXTENSIONS.some(ext => file.name.toLowerCase().endsWith(ext))
+
+const isAccepted = (file) => {
+    const ext = '.' + file.name.split('.').pop().toLowerCase()
+    return isArchive(file) || SUPPORTED_EXTENSIONS.some(s => s.ext === ext)
+}
+
 export default function UploadScreen() {
     const navigate = useNavigate()
     const { appState, setAppState } = useContext(AppStateContext)
@@ -58,19 +68,13 @@ export default function UploadScreen() {
         e.preventDefault()
         setIsDragging(false)
 
-        const droppedFiles = Array.from(e.dataTransfer.files).filter(file => {
-            const ext = '.' + file.name.split('.').pop().toLowerCase()
-            return SUPPORTED_EXTENSIONS.some(s => s.ext === ext)
-        })
+        const droppedFiles = Array.from(e.dataTransfer.files).filter(isAccepted)
 
         setFiles(prev => [...prev, ...droppedFiles])
     }, [])
 
     const handleFileInput = (e) => {
-        const selectedFiles = Array.from(e.target.files).filter(file => {
-            const ext = '.' + file.name.split('.').pop().toLowerCase()
-            return SUPPORTED_EXTENSIONS.some(s => s.ext === ext)
-        })
+        const selectedFiles = Array.from(e.target.files).filter(isAccepted)
         setFiles(prev => [...prev, ...selectedFiles])
     }
 
@@ -78,8 +82,10 @@ export default function UploadScreen() {
         setFiles(prev => prev.filter((_, i) => i !== index))
     }
 
+    const canStart = files.length >= 2 || files.some(isArchive)
+
     const handleStartScan = async () => {
-        if (files.length < 2) {
+        if (!canStart) {
             alert('Please upload at least 2 files to compare')
             return
         }
@@ -214,7 +220,7 @@ export default function UploadScreen() {
                         id="file-input"
                         type="file"
                         multiple
-                        accept={SUPPORTED_EXTENSIONS.map(s => s.ext).join(',')}
+                        accept={[...SUPPORTED_EXTENSIONS.map(s => s.ext), ...ARCHIVE_EXTENSIONS].join(',')}
                         onChange={handleFileInput}
                         className="hidden"
                     />
@@ -426,7 +432,7 @@ export default function UploadScreen() {
                 <motion.button
                     className="btn btn-primary px-8"
                     onClick={handleStartScan}
-                    disabled={files.length < 2}
+                    disabled={!canStart}
                     whileHover={{ scale: 1.02 }}
                     whileTap={{ scale: 0.98 }}
                 >
@@ -435,7 +441,7 @@ export default function UploadScreen() {
                 </motion.button>
             </motion.div>
 
-            {files.length === 1 && (
+            {files.length === 1 && !canStart && (
                 <motion.p
                     initial={{ opacity: 0 }}
                     animate={{ opacity: 1 }}